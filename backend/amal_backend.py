@@ -7,24 +7,35 @@ Flow:
    - Out of context → polite rejection message
    - Harm → crisis intervention with 3033 hotline
    - Exact fact → RAG scientific backend
-   - Looking for support → Support model (in development)
+   - Looking for support → Support model, served by a separate worker process
+     (model_support/support_worker.py) when SUPPORT_WORKER_SOCKET is set
 """
 
+import os
 import sys
-import re
+import time
+import importlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, Tuple, Optional
+from typing import Callable, Dict, Iterator, List, Tuple, Optional
 
 # Add parent directories to path for imports
 ROOT_DIR = Path(__file__).parent.parent
 sys.path.insert(0, str(ROOT_DIR / "intent_model"))
 sys.path.insert(0, str(ROOT_DIR / "rag_scientific"))
+sys.path.insert(0, str(ROOT_DIR / "model_support"))
 
 # Load environment variables from rag_scientific/.env
 from dotenv import load_dotenv
 load_dotenv(ROOT_DIR / "rag_scientific" / ".env")
 
+from executors import StageOverloaded
 from intent_backend import IntentBackend
+from intent_batcher import IntentBatcher
+from intent_cache import IntentCache
+from support_client import SupportClient, SupportWorkerError
+from text_normalizer import NormalizedText, normalize, normalize_batch
 
 
 class AmalBackend:
@@ -83,51 +94,274 @@ You are not alone. There are people who want to help you."""
         "en": "I understand you're looking for support. The psychological support system is currently under development. In the meantime, you can call the helpline {crisis_line} to speak with a specialist."
     }
 
-    def __init__(self, load_rag: bool = True):
+    # Fallback if the support worker is unreachable, overloaded or fails
+    SUPPORT_UNAVAILABLE_RESPONSES = {
+        "ar": "عذراً، نظام الدعم النفسي غير متاح حالياً. يمكنك الاتصال بخط المساعدة {crisis_line} للتحدث مع متخصص.",
+        "fr": "Désolé, le système de soutien psychologique n'est pas disponible pour le moment. Vous pouvez appeler la ligne d'aide {crisis_line} pour parler à un spécialiste.",
+        "dz": "سمحلي، نظام الدعم النفسي ماشي متوفر دوك. تقدر تعيط لخط المساعدة {crisis_line} باش تهدر مع متخصص.",
+        "en": "Sorry, the psychological support system is not available at the moment. You can call the helpline {crisis_line} to speak with a specialist."
+    }
+
+    # Common French words used to tell French from English
+    FRENCH_WORDS = frozenset([
+        'je', 'tu', 'il', 'elle', 'nous', 'vous', 'est', 'sont',
+        'le', 'la', 'les', 'un', 'une', 'des', 'pour', 'avec',
+        'dans', 'sur', 'que', 'qui', 'comment', 'pourquoi'
+    ])
+    
+    # Fallback if RAG not loaded
+    RAG_UNAVAILABLE_RESPONSES = {
+        "ar": "عذراً، نظام المعلومات العلمية غير متاح حالياً. يرجى المحاولة لاحقاً.",
+        "fr": "Désolé, le système d'information scientifique n'est pas disponible actuellement. Veuillez réessayer plus tard.",
+        "dz": "سمحلي، نظام المعلومات العلمية ماشي متوفر دوك. عاود حاول من بعد.",
+        "en": "Sorry, the scientific information system is not available at the moment. Please try again later."
+    }
+
+    def __init__(
+        self,
+        load_rag: bool = True,
+        intent_batch_window_ms: Optional[float] = None,
+        intent_max_batch_size: Optional[int] = None,
+        preload_for_fork: bool = False,
+        lazy: bool = False,
+        support_worker_socket: Optional[str] = None
+    ):
         """
         Initialize the Amal Backend.
         
         Args:
             load_rag: Whether to load RAG backend (requires ChromaDB + embeddings).
+            intent_batch_window_ms: Micro-batching window for intent classification.
+                Defaults to env INTENT_BATCH_WINDOW_MS; 0 disables batching.
+            intent_max_batch_size: Max texts per batched intent pass.
+                Defaults to env INTENT_MAX_BATCH_SIZE.
+            preload_for_fork: Load models for sharing with forked workers: weights
+                are moved to shared memory, the OOD detector is memory-mapped, and
+                thread/connection setup is deferred to ``after_fork()``.
+            lazy: Only record configuration; call ``load()`` or ``start_loading()``
+                later. Heavy imports (torch, transformers, chromadb) happen then.
+            support_worker_socket: Unix socket of the support-model worker. Defaults
+                to env SUPPORT_WORKER_SOCKET; unset keeps the fixed support reply.
         """
+        self.load_rag = load_rag
+        self.preload_for_fork = preload_for_fork
+        
+        # Batch concurrent requests into one model pass (optional)
+        if intent_batch_window_ms is None:
+            intent_batch_window_ms = float(os.getenv(
+                "INTENT_BATCH_WINDOW_MS", IntentBatcher.DEFAULT_WINDOW_MS
+            ))
+        if intent_max_batch_size is None:
+            intent_max_batch_size = int(os.getenv(
+                "INTENT_MAX_BATCH_SIZE", IntentBatcher.DEFAULT_MAX_BATCH_SIZE
+            ))
+        self.intent_batch_window_ms = intent_batch_window_ms
+        self.intent_max_batch_size = intent_max_batch_size
+        self.support_worker_socket = support_worker_socket or os.getenv("SUPPORT_WORKER_SOCKET") or None
+        
+        self.intent_backend = None
+        self.intent_batcher = None
+        self.rag_backend = None
+        self.support_client = None
+        
+        # Per-component readiness, reported by /health
+        self.components: Dict[str, Dict] = {
+            name: {"status": "pending", "import_seconds": None, "load_seconds": None, "error": None}
+            for name in ("intent_model", "rag_model", "support_model")
+        }
+        if not load_rag:
+            self.components["rag_model"]["status"] = "skipped"
+        if not self.support_worker_socket:
+            self.components["support_model"]["status"] = "skipped"
+        
+        if not lazy:
+            self.load()
+    
+    def load(self):
+        """Load the intent classifier and RAG backend and connect the support worker concurrently (blocking)."""
         print("=" * 60)
         print("Initializing Amal Backend")
         print("=" * 60)
         
-        # Load intent classifier
-        print("\n[1/2] Loading Intent Classifier...")
-        self.intent_backend = IntentBackend()
+        with ThreadPoolExecutor(max_workers=3) as pool:
+            jobs = [pool.submit(self._load_intent)]
+            if self.load_rag:
+                jobs.append(pool.submit(self._load_rag))
+            else:
+                print("\n[2/3] RAG Backend skipped (load_rag=False)")
+            if self.support_worker_socket:
+                jobs.append(pool.submit(self._load_support))
+            else:
+                print("\n[3/3] Support worker skipped (SUPPORT_WORKER_SOCKET not set)")
+            for job in jobs:
+                job.result()
         
-        # Load RAG backend (optional)
-        self.rag_backend = None
-        if load_rag:
-            print("\n[2/2] Loading RAG Backend...")
-            try:
-                from rag_backend import RAGBackend
-                # Use correct path to database
-                db_path = str(ROOT_DIR / "rag_scientific" / "full_database")
-                self.rag_backend = RAGBackend(persist_dir=db_path)
-            except Exception as e:
-                print(f"⚠ RAG Backend not loaded: {e}")
-                print("  Exact fact queries will return a fallback message.")
-        else:
-            print("\n[2/2] RAG Backend skipped (load_rag=False)")
+        if self.preload_for_fork:
+            self.share_memory()
         
         print("\n" + "=" * 60)
         print("✓ Amal Backend initialized")
         print("=" * 60)
-
-    def detect_language(self, text: str) -> str:
+    
+    def start_loading(self) -> threading.Thread:
+        """Load models in a background thread so the API can serve meanwhile."""
+        def run():
+            try:
+                self.load()
+            except Exception as e:
+                # Already recorded in self.components
+                print(f"⚠ Backend loading failed: {e}")
+        
+        thread = threading.Thread(target=run, name="amal-backend-loader", daemon=True)
+        thread.start()
+        return thread
+    
+    def is_ready(self, component: str) -> bool:
+        """Whether a component ('intent_model', 'rag_model', 'support_model') finished loading."""
+        return self.components[component]["status"] == "ready"
+    
+    def _timed_load(self, component: str, modules: List[str], factory: Callable):
+        """Import ``modules`` then call ``factory``, recording both durations."""
+        status = self.components[component]
+        status["status"] = "loading"
+        try:
+            start = time.perf_counter()
+            for module in modules:
+                importlib.import_module(module)
+            status["import_seconds"] = round(time.perf_counter() - start, 3)
+            
+            start = time.perf_counter()
+            result = factory()
+            status["load_seconds"] = round(time.perf_counter() - start, 3)
+            return result
+        except Exception as e:
+            status["status"] = "failed"
+            status["error"] = str(e)
+            raise
+    
+    def _load_intent(self):
+        """Load the intent classifier and start batching."""
+        print("\n[1/3] Loading Intent Classifier...")
+        engine = os.getenv("INTENT_ENGINE", "torch")
+        modules = ["torch", "transformers"] if engine == "torch" else ["onnxruntime", "transformers"]
+        
+        # INTENT_ENGINE selects PyTorch or ONNX Runtime ('onnx', 'onnx-int8') inference;
+        # INTENT_CACHE_SIZE=0 disables the result cache; INTENT_MODEL_DIR swaps the model files
+        self.intent_backend = self._timed_load("intent_model", modules, lambda: IntentBackend(
+            base_dir=os.getenv("INTENT_MODEL_DIR"),
+            engine=engine,
+            cache_max_entries=int(os.getenv("INTENT_CACHE_SIZE", IntentCache.DEFAULT_MAX_ENTRIES)),
+            cache_ttl=float(os.getenv("INTENT_CACHE_TTL", IntentCache.DEFAULT_TTL_SECONDS)),
+            mmap_ood=self.preload_for_fork
+        ))
+        
+        if not self.preload_for_fork:
+            # Threads do not survive fork(); preloaded backends start it in after_fork()
+            self._start_intent_batcher()
+        self.components["intent_model"]["status"] = "ready"
+    
+    def _load_rag(self):
+        """Load the RAG backend; failures fall back to a fixed message."""
+        print("\n[2/3] Loading RAG Backend...")
+        try:
+            from rag_backend import RAGBackend
+            # Use correct path to database
+            db_path = str(ROOT_DIR / "rag_scientific" / "full_database")
+            # The memory-mapped index (RAG_VECTOR_STORE=mmap) does not need chromadb
+            modules = ["sentence_transformers", "google.generativeai"]
+            if os.getenv("RAG_VECTOR_STORE", "chroma") == "chroma":
+                modules.append("chromadb")
+            self.rag_backend = self._timed_load(
+                "rag_model", modules, lambda: RAGBackend(persist_dir=db_path)
+            )
+            self.components["rag_model"]["status"] = "ready"
+        except Exception as e:
+            self.components["rag_model"].update(status="failed", error=str(e))
+            print(f"⚠ RAG Backend not loaded: {e}")
+            print("  Exact fact queries will return a fallback message.")
+    
+    def _load_support(self):
+        """
+        Connect to the support-model worker (support_worker.py), which holds the model.
+        
+        The client is kept even if the worker is not up yet: each request opens
+        its own connection, and replies fall back to a fixed message meanwhile.
+        """
+        print("\n[3/3] Connecting to Support Worker...")
+        start = time.perf_counter()
+        self.support_client = SupportClient(self.support_worker_socket)
+        if self.support_client.ping():
+            self.components["support_model"]["load_seconds"] = round(time.perf_counter() - start, 3)
+            self._set_support_status(None)
+            print(f"✓ Support worker connected ({self.support_worker_socket})")
+        else:
+            self._set_support_status(f"Support worker not reachable at {self.support_worker_socket}")
+            print(f"⚠ Support worker not reachable at {self.support_worker_socket}")
+            print("  Support queries will return a fallback message until it is up.")
+    
+    def _set_support_status(self, error: Optional[str]):
+        """Track worker reachability in ``components`` (it can start after the API)."""
+        status = "failed" if error else "ready"
+        self.components["support_model"].update(status=status, error=error)
+    
+    def _start_intent_batcher(self):
+        """Start the micro-batching thread if a batching window is configured."""
+        if self.intent_batch_window_ms <= 0:
+            return
+        self.intent_batcher = IntentBatcher(
+            self.intent_backend,
+            window_ms=self.intent_batch_window_ms,
+            max_batch_size=self.intent_max_batch_size
+        )
+        print(f"✓ Intent micro-batching enabled "
+              f"(window={self.intent_batch_window_ms:g}ms, max_batch={self.intent_max_batch_size})")
+    
+    def share_memory(self):
+        """Move model weights to shared memory so forked workers reuse the same pages."""
+        self.intent_backend.share_memory()
+        if self.rag_backend:
+            self.rag_backend.share_memory()
+        print("✓ Model weights moved to shared memory")
+    
+    def after_fork(self):
+        """
+        Per-worker setup for a backend preloaded in the parent process.
+        
+        Starts the worker's own batching thread and re-opens ChromaDB/Gemini
+        clients, which must not be shared across processes.
+        """
+        self._start_intent_batcher()
+        if self.rag_backend:
+            try:
+                self.rag_backend.reconnect()
+            except Exception as e:
+                print(f"⚠ RAG Backend reconnect failed: {e}")
+                self.rag_backend = None
+    
+    def close(self):
+        """Stop background threads and persist caches before shutdown."""
+        if self.intent_batcher:
+            self.intent_batcher.close()
+        if self.rag_backend:
+            self.rag_backend.save_answer_cache()
+    
+    def detect_language(self, text: str, normalized: Optional[NormalizedText] = None) -> str:
         """
         Detect the primary language of the text.
         
+        Args:
+            text: Input text.
+            normalized: Precomputed ``normalize(text)`` output (script counts are reused).
+        
         Returns:
             'ar' for Arabic, 'fr' for French, 'dz' for Darija, 'en' for English
         """
-        # Count Arabic characters
-        arabic_chars = len(re.findall(r'[\u0600-\u06FF]', text))
-        # Count Latin characters
-        latin_chars = len(re.findall(r'[a-zA-Z]', text))
+        if normalized is None:
+            normalized = normalize(text)
+        
+        # Arabic vs Latin character counts
+        arabic_chars = normalized.arabic_chars
+        latin_chars = normalized.latin_chars
         
         total = arabic_chars + latin_chars
         if total == 0:
@@ -140,12 +374,8 @@ You are not alone. There are people who want to help you."""
             return "ar"
         # Mostly Latin script
         elif arabic_ratio < 0.3:
-            # Check for French indicators
-            french_words = ['je', 'tu', 'il', 'elle', 'nous', 'vous', 'est', 'sont', 
-                          'le', 'la', 'les', 'un', 'une', 'des', 'pour', 'avec',
-                          'dans', 'sur', 'que', 'qui', 'comment', 'pourquoi']
-            text_lower = text.lower()
-            french_count = sum(1 for w in french_words if f' {w} ' in f' {text_lower} ')
+            # Check for French indicators (space-delimited words)
+            french_count = len(self.FRENCH_WORDS.intersection(normalized.lowered.split(' ')))
             
             if french_count >= 2:
                 return "fr"
@@ -154,6 +384,23 @@ You are not alone. There are people who want to help you."""
         else:
             return "dz"
     
+    async def get_metrics(self) -> Dict:
+        """
+        Collect runtime counters from the loaded components for monitoring.
+        
+        Async because the support worker's stats are a socket round trip,
+        which must not block the API's event loop if the worker stalls.
+        """
+        return {
+            "intent_cache": self.intent_backend.get_cache_stats() if self.intent_backend else None,
+            "intent_batcher": self.intent_batcher.get_stats() if self.intent_batcher else None,
+            "rag_llm": self.rag_backend.async_llm.get_stats() if self.rag_backend else None,
+            "rag_answer_cache": self.rag_backend.get_cache_stats() if self.rag_backend else None,
+            "rag_embeddings": self.rag_backend.get_embedding_stats() if self.rag_backend else None,
+            "rag_context": self.rag_backend.get_context_stats() if self.rag_backend else None,
+            "support_worker": await self.support_client.get_stats_async() if self.support_client else None
+        }
+    
     def get_response(self, text: str, lang: str, response_dict: Dict[str, str]) -> str:
         """Get response in appropriate language with crisis line substitution."""
         response = response_dict.get(lang, response_dict["en"])
@@ -174,47 +421,228 @@ You are not alone. There are people who want to help you."""
                 - language: detected language
                 - source: which backend generated the response
         """
+        language, intent_label, confidence = self.classify_query(query)
+        return self.respond(query, language, intent_label, confidence)
+    
+    def classify_query(self, query: str) -> Tuple[str, str, Dict]:
+        """
+        CPU-bound half of the pipeline: language detection and intent classification.
+        
+        Returns:
+            Tuple of (language, intent_label, confidence_dict)
+        """
+        # Normalize once for language detection and intent classification
+        normalized = normalize(query)
+        
         # Step 1: Detect language
-        language = self.detect_language(query)
+        language = self.detect_language(query, normalized)
         
-        # Step 2: Classify intent
-        intent_label, confidence = self.intent_backend.predict_intent(query)
+        # Step 2: Classify intent (batched across concurrent requests if enabled)
+        classifier = self.intent_batcher or self.intent_backend
+        intent_label, confidence = classifier.predict_intent(query, normalized=normalized)
         
+        return language, intent_label, confidence
+    
+    def needs_llm(self, intent_label: str) -> bool:
+        """Whether responding to this intent calls an external LLM or the support worker (I/O-bound)."""
+        if intent_label == IntentBackend.INTENT_EXACT_FACT:
+            return self.rag_backend is not None
+        if intent_label == IntentBackend.INTENT_LOOKING_FOR_SUPPORT:
+            return self.support_client is not None
+        return False
+    
+    def respond(self, query: str, language: str, intent_label: str, confidence: Dict) -> Dict:
+        """
+        Second half of the pipeline: route a classified query and build the result.
+        
+        Returns:
+            Result dict (see ``process_query``).
+        """
         # Step 3: Route based on intent
-        response = ""
-        source = ""
+        response, source = self._route(query, language, intent_label)
+        
+        return self._result(intent_label, confidence, response, language, source)
+
+    async def respond_async(
+        self,
+        query: str,
+        language: str,
+        intent_label: str,
+        confidence: Dict,
+        session_id: Optional[str] = None,
+        executor=None
+    ) -> Dict:
+        """
+        Async ``respond``: "Exact fact" answers use the RAG backend's async
+        pipeline (deadlines, non-blocking retries, hedging); "Looking for
+        support" replies are awaited from the support worker; other routes are
+        answered inline.
+        
+        Args:
+            session_id: Conversation key; the support worker keeps its history.
+            executor: Bounded executor (``async run(fn, *args)``) for the RAG
+                embedding and retrieval work; a full one raises ``StageOverloaded``.
+        
+        Returns:
+            Result dict (see ``process_query``).
+        """
+        if intent_label == IntentBackend.INTENT_EXACT_FACT and self.rag_backend:
+            try:
+                response = await self.rag_backend.generate_response_async(
+                    query, language=language, executor=executor
+                )
+                return self._result(intent_label, confidence, response, language, "rag_scientific")
+            except StageOverloaded:
+                raise
+            except Exception as e:
+                return self._result(intent_label, confidence, f"Error generating response: {e}", language, "rag_error")
+        
+        if intent_label == IntentBackend.INTENT_LOOKING_FOR_SUPPORT and self.support_client:
+            try:
+                response = await self.support_client.generate(query, session_id=session_id)
+                self._set_support_status(None)
+                return self._result(intent_label, confidence, response, language, "support_model")
+            except SupportWorkerError as e:
+                response, source = self._support_unavailable(query, language, e)
+                return self._result(intent_label, confidence, response, language, source)
+        
+        return self.respond(query, language, intent_label, confidence)
+    
+    def respond_stream(
+        self,
+        query: str,
+        language: str,
+        intent_label: str,
+        session_id: Optional[str] = None
+    ) -> Tuple[Iterator[str], str]:
+        """
+        Streaming counterpart of ``respond`` for LLM-backed routes (see ``needs_llm``).
+        
+        Args:
+            session_id: Conversation key; the support worker keeps its history.
+    
+        Returns:
+            Tuple of (iterator over response text chunks, source)
+        """
+        if intent_label == IntentBackend.INTENT_EXACT_FACT and self.rag_backend:
+            return self.rag_backend.generate_response_stream(query, language=language), "rag_scientific"
+        
+        if intent_label == IntentBackend.INTENT_LOOKING_FOR_SUPPORT and self.support_client:
+            return self._support_stream(query, language, session_id), "support_model"
+    
+        # Fixed replies arrive as one chunk
+        response, source = self._route(query, language, intent_label)
+        return iter([response]), source
+    
+    def process_queries(
+        self,
+        queries: List[str],
+        batch_size: int = IntentBackend.DEFAULT_BATCH_SIZE
+    ) -> List[Dict]:
+        """
+        Process many queries at once (backfills, re-scoring, evaluation).
+        
+        Intent classification runs in chunks of ``batch_size`` and queries are
+        grouped by route, so all "Exact fact" items share one retrieval pass.
+        Results match calling ``process_query`` on every item.
         
+        Args:
+            queries: User input texts.
+            batch_size: Number of texts per intent model pass.
+            
+        Returns:
+            List of result dicts (see ``process_query``), in the order of ``queries``.
+        """
+        normalized = normalize_batch(queries)
+        languages = [self.detect_language(query, n) for query, n in zip(queries, normalized)]
+        predictions = self.intent_backend.predict_intents(
+            queries, batch_size=batch_size, normalized=normalized
+        )
+        
+        # Group query indices by route
+        routes: Dict[str, List[int]] = {}
+        for i, (intent_label, _) in enumerate(predictions):
+            routes.setdefault(intent_label, []).append(i)
+        
+        responses: List[Optional[Tuple[str, str]]] = [None] * len(queries)
+        for intent_label, indices in routes.items():
+            if intent_label == IntentBackend.INTENT_EXACT_FACT and self.rag_backend:
+                try:
+                    answers = self.rag_backend.generate_responses(
+                        [queries[i] for i in indices],
+                        [languages[i] for i in indices]
+                    )
+                    for i, answer in zip(indices, answers):
+                        responses[i] = (answer, "rag_scientific")
+                except Exception as e:
+                    for i in indices:
+                        responses[i] = (f"Error generating response: {e}", "rag_error")
+            else:
+                for i in indices:
+                    responses[i] = self._route(queries[i], languages[i], intent_label)
+        
+        return [
+            self._result(intent_label, confidence, response, language, source)
+            for (intent_label, confidence), (response, source), language
+            in zip(predictions, responses, languages)
+        ]
+    
+    def _route(self, query: str, language: str, intent_label: str) -> Tuple[str, str]:
+        """Produce (response, source) for a classified query."""
         if intent_label == "Out of context":
-            response = self.get_response(query, language, self.OUT_OF_CONTEXT_RESPONSES)
-            source = "out_of_context_handler"
+            return self.get_response(query, language, self.OUT_OF_CONTEXT_RESPONSES), "out_of_context_handler"
             
         elif intent_label == "Harm":
-            response = self.get_response(query, language, self.HARM_RESPONSES)
-            source = "harm_crisis_handler"
+            return self.get_response(query, language, self.HARM_RESPONSES), "harm_crisis_handler"
             
         elif intent_label == "Exact fact":
             if self.rag_backend:
                 try:
-                    response = self.rag_backend.generate_response(query, language=language)
-                    source = "rag_scientific"
+                    return self.rag_backend.generate_response(query, language=language), "rag_scientific"
                 except Exception as e:
-                    response = f"Error generating response: {e}"
-                    source = "rag_error"
-            else:
-                # Fallback if RAG not loaded
-                fallback = {
-                    "ar": "عذراً، نظام المعلومات العلمية غير متاح حالياً. يرجى المحاولة لاحقاً.",
-                    "fr": "Désolé, le système d'information scientifique n'est pas disponible actuellement. Veuillez réessayer plus tard.",
-                    "dz": "سمحلي، نظام المعلومات العلمية ماشي متوفر دوك. عاود حاول من بعد.",
-                    "en": "Sorry, the scientific information system is not available at the moment. Please try again later."
-                }
-                response = fallback.get(language, fallback["en"])
-                source = "rag_unavailable"
+                    return f"Error generating response: {e}", "rag_error"
+            # Fallback if RAG not loaded
+            return self.get_response(query, language, self.RAG_UNAVAILABLE_RESPONSES), "rag_unavailable"
                 
         elif intent_label == "Looking for support":
-            response = self.get_response(query, language, self.SUPPORT_IN_DEV_RESPONSES)
-            source = "support_in_development"
+            if self.support_client:
+                try:
+                    response = "".join(self.support_client.stream_sync(query)).strip()
+                    self._set_support_status(None)
+                    return response, "support_model"
+                except SupportWorkerError as e:
+                    return self._support_unavailable(query, language, e)
+            # No support worker configured
+            return self.get_response(query, language, self.SUPPORT_IN_DEV_RESPONSES), "support_in_development"
         
+        return "", ""
+    
+    def _support_stream(self, query: str, language: str, session_id: Optional[str]) -> Iterator[str]:
+        """Relay the worker's token stream; failing before the first token yields the fallback message."""
+        chunks = self.support_client.stream_sync(query, session_id=session_id)
+        started = False
+        try:
+            for text in chunks:
+                started = True
+                yield text
+            self._set_support_status(None)
+        except SupportWorkerError as e:
+            if started:
+                raise
+            yield self._support_unavailable(query, language, e)[0]
+        finally:
+            # Closing the connection cancels the job in the worker
+            chunks.close()
+    
+    def _support_unavailable(self, query: str, language: str, error: SupportWorkerError) -> Tuple[str, str]:
+        """Fallback (response, source) when the support worker cannot answer."""
+        if error.unreachable:
+            self._set_support_status(str(error))
+        return self.get_response(query, language, self.SUPPORT_UNAVAILABLE_RESPONSES), "support_unavailable"
+    
+    @staticmethod
+    def _result(intent_label: str, confidence: Dict, response: str, language: str, source: str) -> Dict:
+        """Assemble the response dict returned to the API layer."""
         return {
             "intent": intent_label,
             "confidence": confidence,
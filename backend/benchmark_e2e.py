@@ -0,0 +1,296 @@
+"""
+End-to-end load test of server.py with local stand-ins for the models and Gemini.
+
+Builds tiny random-weight models and a synthetic knowledge base (load_fakes.py),
+starts a fake LLM server (rag_scientific/fake_llm_server.py), launches the API
+with them in a subprocess, and replays a seeded multilingual traffic mix. It
+reports throughput and p50/p95/p99 latency per route: /chat by routed intent,
+and /auth/*.
+
+Results are written as JSON, so runs on different commits can be compared.
+
+Usage:
+    python benchmark_e2e.py --requests 2000 --concurrency 32 --out e2e.json
+    python benchmark_e2e.py --mix rag --llm-latency-ms 800 --llm-error-rate 0.02
+    python benchmark_e2e.py --out new.json --baseline e2e.json    # flag regressions
+    python benchmark_e2e.py --url http://localhost:8000 --mix auth  # existing server, real models
+"""
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from load_fakes import MIXES, ROOT_DIR, pick_operations, prepare
+
+BACKEND_DIR = Path(__file__).parent
+DEFAULT_WORK_DIR = BACKEND_DIR / ".loadtest"
+
+# A route regresses when p95 is both this much slower and this many ms slower,
+# or its throughput drops below this fraction of the baseline
+REGRESSION_RATIO = 1.25
+REGRESSION_MIN_MS = 5.0
+THROUGHPUT_MIN_RATIO = 0.8
+
+AUTH_PASSWORD = "loadtest-password"
+
+
+def request_json(url: str, payload: Optional[Dict] = None, token: Optional[str] = None,
+                 timeout: float = 60.0) -> Tuple[int, Optional[Dict]]:
+    """GET (no payload) or POST JSON; returns (status, decoded body or None)."""
+    headers = {"Content-Type": "application/json"}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    data = json.dumps(payload).encode() if payload is not None else None
+    request = urllib.request.Request(url, data=data, headers=headers)
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status, json.loads(response.read() or b"null")
+    except urllib.error.HTTPError as e:
+        return e.code, None
+    except (urllib.error.URLError, OSError):
+        return 0, None
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q / 100.0 * len(ordered)))]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(env: Dict[str, str], port: int) -> subprocess.Popen:
+    cmd = [sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1",
+           "--port", str(port), "--log-level", "warning"]
+    return subprocess.Popen(cmd, cwd=BACKEND_DIR, env={**os.environ, **env})
+
+
+def wait_until_healthy(base_url: str, timeout: float) -> Dict:
+    """Poll /health until every component is ready; raise if one fails."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status, health = request_json(f"{base_url}/health", timeout=5.0)
+        if status == 200 and health["status"] == "healthy":
+            return health
+        if status == 200 and health["status"] == "degraded":
+            raise RuntimeError(f"Server degraded: {health['components']}")
+        time.sleep(0.5)
+    raise TimeoutError(f"Server not healthy after {timeout:.0f}s")
+
+
+def create_users(base_url: str, n: int) -> List[Dict]:
+    """Sign up ``n`` users; returns their credentials and tokens."""
+    users = []
+    run_id = int(time.time())
+    for i in range(n):
+        email = f"loadtest-{run_id}-{i}@example.com"
+        _, body = request_json(f"{base_url}/auth/signup", {"email": email, "password": AUTH_PASSWORD})
+        if not body or not body.get("success"):
+            raise RuntimeError(f"Signup failed: {body}")
+        users.append({"email": email, "access": body["access_token"], "refresh": body["refresh_token"]})
+    return users
+
+
+def run_plan(base_url: str, plan: List[Tuple], users: List[Dict], concurrency: int) -> Tuple[Dict, float, int]:
+    """
+    Replay ``plan`` with ``concurrency`` client threads.
+
+    Returns:
+        Tuple of (route -> list of (latency_ms, ok)), wall-clock seconds, misrouted chat count.
+    """
+    samples: Dict[str, List[Tuple[float, bool]]] = defaultdict(list)
+    lock = threading.Lock()
+    cursor = iter(enumerate(plan))
+    misrouted = 0
+
+    def one(i: int, operation: str, intent: Optional[str], message: Optional[str]):
+        nonlocal misrouted
+        user = users[i % len(users)]
+        start = time.perf_counter()
+        if operation == "chat":
+            status, body = request_json(f"{base_url}/chat", {"message": message})
+            route = f"/chat [{body['intent'] if status == 200 else intent}]"
+        elif operation == "auth:login":
+            status, body = request_json(f"{base_url}/auth/login", {"email": user["email"], "password": AUTH_PASSWORD})
+            route = "/auth/login"
+        elif operation == "auth:me":
+            status, body = request_json(f"{base_url}/auth/me", token=user["access"])
+            route = "/auth/me"
+        else:
+            status, body = request_json(f"{base_url}/auth/refresh", {"refresh_token": user["refresh"]})
+            route = "/auth/refresh"
+        latency_ms = (time.perf_counter() - start) * 1000.0
+        with lock:
+            samples[route].append((latency_ms, status == 200))
+            if operation == "chat" and status == 200 and body["intent"] != intent:
+                misrouted += 1
+
+    def client():
+        while True:
+            with lock:
+                item = next(cursor, None)
+            if item is None:
+                return
+            i, (operation, intent, message) = item
+            one(i, operation, intent, message)
+
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return samples, time.perf_counter() - start, misrouted
+
+
+def summarize(samples: Dict[str, List[Tuple[float, bool]]], elapsed: float) -> Dict[str, Dict]:
+    """Per-route count, error rate, throughput and latency percentiles (all requests)."""
+    routes = {}
+    everything = [sample for route_samples in samples.values() for sample in route_samples]
+    for route, route_samples in sorted(samples.items()) + [("total", everything)]:
+        latencies = [latency for latency, _ in route_samples]
+        routes[route] = {
+            "count": len(route_samples),
+            "error_rate": round(sum(not ok for _, ok in route_samples) / len(route_samples), 4),
+            "throughput_rps": round(len(route_samples) / elapsed, 2),
+            "p50_ms": round(percentile(latencies, 50), 2),
+            "p95_ms": round(percentile(latencies, 95), 2),
+            "p99_ms": round(percentile(latencies, 99), 2),
+        }
+    return routes
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report: Dict, baseline: Dict) -> List[str]:
+    """Print per-route deltas against a baseline report; return regressed routes."""
+    regressions = []
+    print(f"\nvs baseline {baseline.get('commit') or '?'}:")
+    print(f"{'route':<34}{'p95 ms':>16}{'req/s':>16}")
+    for route, current in report["routes"].items():
+        before = baseline["routes"].get(route)
+        if before is None:
+            continue
+        slower = (current["p95_ms"] > before["p95_ms"] * REGRESSION_RATIO
+                  and current["p95_ms"] - before["p95_ms"] > REGRESSION_MIN_MS)
+        fewer = current["throughput_rps"] < before["throughput_rps"] * THROUGHPUT_MIN_RATIO
+        flag = "  ⚠ regression" if slower or fewer else ""
+        if flag:
+            regressions.append(route)
+        print(f"{route:<34}{before['p95_ms']:>7.1f} → {current['p95_ms']:<7.1f}"
+              f"{before['throughput_rps']:>7.1f} → {current['throughput_rps']:<7.1f}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mix", choices=sorted(MIXES), default="default")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--warmup", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--url", help="Benchmark an already-running server instead of starting one")
+    parser.add_argument("--work-dir", default=str(DEFAULT_WORK_DIR), help="Where stand-in models are cached")
+    parser.add_argument("--kb-chunks", type=int, default=2000)
+    parser.add_argument("--llm-latency-ms", type=float, default=400.0)
+    parser.add_argument("--llm-jitter-ms", type=float, default=100.0)
+    parser.add_argument("--llm-slow-rate", type=float, default=0.02)
+    parser.add_argument("--llm-slow-ms", type=float, default=3000.0)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--caches", action="store_true",
+                        help="Keep intent/embedding/answer caches on (off: every request does full work)")
+    parser.add_argument("--out", help="Write the JSON report here")
+    parser.add_argument("--baseline", help="Earlier JSON report to compare against (exit 1 on regression)")
+    args = parser.parse_args()
+
+    config = {key: value for key, value in vars(args).items() if key not in ("out", "baseline", "work_dir")}
+    server = llm = None
+    base_url = args.url
+    try:
+        if base_url is None:
+            sys.path.insert(0, str(ROOT_DIR / "rag_scientific"))
+            from fake_llm_server import FakeLLMConfig, start_fake_llm
+
+            env = prepare(Path(args.work_dir), args.seed, args.kb_chunks)
+            llm = start_fake_llm(FakeLLMConfig(
+                latency_ms=args.llm_latency_ms, jitter_ms=args.llm_jitter_ms, slow_rate=args.llm_slow_rate,
+                slow_ms=args.llm_slow_ms, error_rate=args.llm_error_rate, seed=args.seed
+            ))
+            env["RAG_LLM_URL"] = f"http://127.0.0.1:{llm.server_port}/generate"
+            if not args.caches:
+                env.update(INTENT_CACHE_SIZE="0", RAG_EMBED_CACHE_SIZE="0", RAG_CACHE_SIZE="0")
+
+            port = free_port()
+            base_url = f"http://127.0.0.1:{port}"
+            start = time.perf_counter()
+            server = start_server(env, port)
+            wait_until_healthy(base_url, timeout=300.0)
+            print(f"✓ Server healthy in {time.perf_counter() - start:.1f}s")
+
+        users = create_users(base_url, args.users)
+        run_plan(base_url, pick_operations(args.mix, args.warmup, args.seed + 1), users, args.concurrency)
+        plan = pick_operations(args.mix, args.requests, args.seed)
+        samples, elapsed, misrouted = run_plan(base_url, plan, users, args.concurrency)
+        _, server_metrics = request_json(f"{base_url}/metrics")
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+        if llm is not None:
+            llm.shutdown()
+
+    chat_requests = sum(1 for operation, _, _ in plan if operation == "chat")
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": config,
+        "elapsed_seconds": round(elapsed, 2),
+        "routes": summarize(samples, elapsed),
+        "misrouted_chat": round(misrouted / chat_requests, 4) if chat_requests else 0.0,
+        "server_metrics": server_metrics,
+    }
+
+    print("\n" + "=" * 78)
+    print(f"End-to-end load test (mix={args.mix}, {args.requests} requests, "
+          f"{args.concurrency} clients, {'real server' if args.url else 'stand-ins'})")
+    print("=" * 78)
+    print(f"{'route':<34}{'count':>7}{'req/s':>8}{'err %':>7}{'p50 ms':>8}{'p95 ms':>8}{'p99 ms':>8}")
+    for route, stats in report["routes"].items():
+        print(f"{route:<34}{stats['count']:>7}{stats['throughput_rps']:>8.1f}{stats['error_rate'] * 100:>7.1f}"
+              f"{stats['p50_ms']:>8.1f}{stats['p95_ms']:>8.1f}{stats['p99_ms']:>8.1f}")
+    print(f"\nChat messages routed to a different intent than planned: {report['misrouted_chat'] * 100:.1f}%")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"✓ Report written to {args.out}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f))
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
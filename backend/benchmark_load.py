@@ -0,0 +1,99 @@
+"""
+Load test: /auth/* latency while /chat is saturated.
+
+Measures /auth/login latency alone, then again while many clients hammer
+/chat. With inference and LLM calls off the event loop, the two runs should
+be close; /chat overload shows up as fast 503s instead of growing latency.
+
+Usage:
+    python server.py &                                # start the API first
+    python benchmark_load.py --url http://localhost:8000 --chat-clients 64
+"""
+
+import argparse
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from typing import Dict, List
+
+CHAT_MESSAGES = [
+    "ما هي أعراض انسحاب الكوكايين؟",
+    "حاب نبرا من لادروك عاونوني",
+    "win kayen centre d'addictologie f dzayer?",
+    "كيفاش راهي حالة الطقس في وهران؟",
+]
+
+
+def post(url: str, payload: Dict, timeout: float = 60.0) -> int:
+    """POST JSON and return the HTTP status code."""
+    request = urllib.request.Request(
+        url, data=json.dumps(payload).encode(), headers={"Content-Type": "application/json"}
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q / 100.0 * len(ordered)))]
+
+
+def measure_auth(base_url: str, requests: int) -> Dict:
+    """Sequential /auth/login calls; returns latency percentiles in ms."""
+    email = f"loadtest-{int(time.time())}@example.com"
+    post(f"{base_url}/auth/signup", {"email": email, "password": "loadtest-password"})
+
+    latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        post(f"{base_url}/auth/login", {"email": email, "password": "loadtest-password"})
+        latencies.append((time.perf_counter() - start) * 1000.0)
+    return {"p50": percentile(latencies, 50), "p99": percentile(latencies, 99)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--chat-clients", type=int, default=64)
+    parser.add_argument("--auth-requests", type=int, default=200)
+    args = parser.parse_args()
+
+    print("\n" + "=" * 60)
+    print("Auth latency under /chat saturation")
+    print("=" * 60)
+
+    idle = measure_auth(args.url, args.auth_requests)
+
+    stop = threading.Event()
+    statuses: Counter = Counter()
+    lock = threading.Lock()
+
+    def chat_client(i: int):
+        while not stop.is_set():
+            status = post(f"{args.url}/chat", {"message": CHAT_MESSAGES[i % len(CHAT_MESSAGES)]})
+            with lock:
+                statuses[status] += 1
+
+    threads = [threading.Thread(target=chat_client, args=(i,), daemon=True) for i in range(args.chat_clients)]
+    for t in threads:
+        t.start()
+    time.sleep(2.0)  # let /chat queues fill up
+
+    loaded = measure_auth(args.url, args.auth_requests)
+    stop.set()
+
+    print(f"{'':<22}{'p50 ms':>10}{'p99 ms':>10}")
+    print(f"{'/auth/login idle':<22}{idle['p50']:>10.1f}{idle['p99']:>10.1f}")
+    print(f"{'/auth/login loaded':<22}{loaded['p50']:>10.1f}{loaded['p99']:>10.1f}")
+    print(f"\n/chat responses during run: {dict(statuses)}")
+
+
+if __name__ == "__main__":
+    main()
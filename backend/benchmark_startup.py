@@ -0,0 +1,139 @@
+"""
+Cold-start benchmark: import time vs model-load time.
+
+Each measurement runs in a fresh interpreter so nothing is already cached in
+sys.modules. Reports how long `import server` takes (what /auth/* waits for),
+how long the heavy ML libraries take to import, and how long each component
+takes to load its weights.
+
+Usage:
+    python benchmark_startup.py
+    python benchmark_startup.py --json > startup.json      # save a baseline
+    python benchmark_startup.py --baseline startup.json    # flag regressions
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+HEAVY_MODULES = ["torch", "transformers", "chromadb", "sentence_transformers", "google.generativeai"]
+
+# A timing is a regression when it is both this much slower and this many seconds slower
+REGRESSION_RATIO = 1.25
+REGRESSION_MIN_SECONDS = 0.2
+
+
+def _measure_in_subprocess(mode: str, extra: List[str]) -> Dict:
+    """Run this script's hidden 'measure' command in a fresh interpreter."""
+    cmd = [sys.executable, __file__, "--measure", mode] + extra
+    output = subprocess.run(
+        cmd, check=True, capture_output=True, text=True, cwd=Path(__file__).parent
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def measure(mode: str, load_rag: bool) -> Dict:
+    """Time one startup phase inside this (fresh) process."""
+    if mode == "server":
+        start = time.perf_counter()
+        import server  # noqa: F401
+        return {"import server": round(time.perf_counter() - start, 3)}
+
+    if mode == "heavy":
+        timings = {}
+        for module in HEAVY_MODULES:
+            start = time.perf_counter()
+            try:
+                __import__(module)
+                timings[f"import {module}"] = round(time.perf_counter() - start, 3)
+            except ImportError:
+                timings[f"import {module}"] = None
+        return timings
+
+    # mode == "load": full backend load, import and load seconds per component
+    from amal_backend import AmalBackend
+
+    start = time.perf_counter()
+    backend = AmalBackend(load_rag=load_rag)
+    timings = {"backend total": round(time.perf_counter() - start, 3)}
+    for name, component in backend.components.items():
+        timings[f"{name} import"] = component["import_seconds"]
+        timings[f"{name} load"] = component["load_seconds"]
+    return timings
+
+
+def run(load_rag: bool) -> Dict:
+    """Collect all startup timings, each phase in its own process."""
+    extra = [] if load_rag else ["--no-rag"]
+    timings: Dict = {}
+    for mode in ("server", "heavy", "load"):
+        timings.update(_measure_in_subprocess(mode, extra))
+    return timings
+
+
+def find_regressions(timings: Dict, baseline: Dict) -> List[str]:
+    """Names of timings that got meaningfully slower than the baseline."""
+    regressions = []
+    for name, seconds in timings.items():
+        before = baseline.get(name)
+        if seconds is None or before is None:
+            continue
+        if seconds > before * REGRESSION_RATIO and seconds - before > REGRESSION_MIN_SECONDS:
+            regressions.append(name)
+    return regressions
+
+
+def print_report(timings: Dict, baseline: Optional[Dict]):
+    print("\n" + "=" * 60)
+    print("Startup timings (seconds)")
+    print("=" * 60)
+    header = f"{'phase':<36}{'now':>10}"
+    if baseline:
+        header += f"{'baseline':>10}"
+    print(header)
+
+    for name, seconds in timings.items():
+        row = f"{name:<36}{'-' if seconds is None else f'{seconds:.3f}':>10}"
+        if baseline:
+            before = baseline.get(name)
+            row += f"{'-' if before is None else f'{before:.3f}':>10}"
+        print(row)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--no-rag", action="store_true", help="Skip the RAG backend")
+    parser.add_argument("--json", action="store_true", help="Print timings as JSON")
+    parser.add_argument("--baseline", help="JSON file from a previous --json run")
+    parser.add_argument("--measure", choices=["server", "heavy", "load"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(args.measure, load_rag=not args.no_rag)))
+        return
+
+    timings = run(load_rag=not args.no_rag)
+    if args.json:
+        print(json.dumps(timings, indent=2))
+        return
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+    print_report(timings, baseline)
+
+    if baseline:
+        regressions = find_regressions(timings, baseline)
+        if regressions:
+            print(f"\n⚠ Slower than baseline: {', '.join(regressions)}")
+            sys.exit(1)
+        print("\n✓ No startup regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Bounded executors that keep blocking work off the asyncio event loop.
+Each pipeline stage (CPU-bound inference, I/O-bound LLM calls) gets its own
+thread pool and an admission limit, so overload is rejected instead of queued.
+"""
+
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict
+
+
+class StageOverloaded(Exception):
+    """Raised when a stage already has ``max_workers + max_queue`` jobs in flight."""
+
+    def __init__(self, stage: str):
+        super().__init__(f"{stage} stage is at capacity")
+        self.stage = stage
+
+
+class StageExecutor:
+    """Thread pool with an in-flight limit for one pipeline stage."""
+
+    def __init__(self, name: str, max_workers: int, max_queue: int):
+        """
+        Initialize the stage.
+
+        Args:
+            name: Stage name (used in thread names, errors and stats).
+            max_workers: Threads running jobs concurrently.
+            max_queue: Jobs allowed to wait for a thread before rejecting.
+        """
+        if max_workers < 1 or max_queue < 0:
+            raise ValueError("max_workers must be >= 1 and max_queue >= 0")
+
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"amal-{name}")
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._stats = {"completed": 0, "failed": 0, "rejected": 0}
+
+    @classmethod
+    def from_env(cls, name: str, default_workers: int, default_queue: int) -> "StageExecutor":
+        """Build a stage sized by ``<NAME>_WORKERS`` / ``<NAME>_QUEUE`` env variables."""
+        prefix = f"CHAT_{name.upper()}"
+        return cls(
+            name,
+            max_workers=int(os.getenv(f"{prefix}_WORKERS", default_workers)),
+            max_queue=int(os.getenv(f"{prefix}_QUEUE", default_queue))
+        )
+
+    async def run(self, fn: Callable, *args: Any) -> Any:
+        """
+        Run ``fn(*args)`` in the stage's pool and await the result.
+
+        Raises:
+            StageOverloaded: If the stage is already at capacity.
+        """
+        return await self.submit(fn, *args)
+
+    def submit(self, fn: Callable, *args: Any) -> "asyncio.Future":
+        """
+        Admit ``fn(*args)`` now and return an awaitable for its result.
+
+        Unlike ``run``, rejection happens before the caller awaits anything, so
+        endpoints can turn it into a 503 before they start streaming a response.
+
+        Raises:
+            StageOverloaded: If the stage is already at capacity.
+        """
+        with self._lock:
+            if self._in_flight >= self.max_workers + self.max_queue:
+                self._stats["rejected"] += 1
+                raise StageOverloaded(self.name)
+            self._in_flight += 1
+
+        future = self._executor.submit(fn, *args)
+        # Release the slot when the job really finishes, even if the caller disconnects
+        future.add_done_callback(self._release)
+        return asyncio.wrap_future(future)
+
+    @contextmanager
+    def admit(self):
+        """
+        Count async (non-threaded) work against the stage's in-flight limit.
+
+        Usage: ``with stage.admit(): await coroutine()``
+
+        Raises:
+            StageOverloaded: If the stage is already at capacity.
+        """
+        with self._lock:
+            if self._in_flight >= self.max_workers + self.max_queue:
+                self._stats["rejected"] += 1
+                raise StageOverloaded(self.name)
+            self._in_flight += 1
+
+        failed = True
+        try:
+            yield
+            failed = False
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+                self._stats["failed" if failed else "completed"] += 1
+
+    def _release(self, future):
+        with self._lock:
+            self._in_flight -= 1
+            if future.cancelled() or future.exception() is not None:
+                self._stats["failed"] += 1
+            else:
+                self._stats["completed"] += 1
+
+    def get_stats(self) -> Dict:
+        """Return capacity, current load and job counters."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_flight"] = self._in_flight
+        stats["max_workers"] = self.max_workers
+        stats["max_queue"] = self.max_queue
+        return stats
+
+    def shutdown(self):
+        """Stop accepting work and wait for running jobs."""
+        self._executor.shutdown(wait=True)
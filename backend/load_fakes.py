@@ -0,0 +1,304 @@
+"""
+Local stand-ins for the ML models, plus seeded traffic, for benchmark_e2e.py.
+
+The stand-ins keep the real code paths (tokenizer, padding, batching, OOD +
+MarBERT stages, mmap retrieval), but the models are tiny and randomly
+initialised, so no real weights or API keys are needed:
+
+- Intent model: a 2-layer MarBERT-shaped BERT that uses the real MarBERT
+  tokenizer and label mapping. It is fitted for a few steps on the traffic
+  messages so each message is routed to the intent the mix intends.
+- OOD detector: a character n-gram TF-IDF + logistic regression pipeline that
+  separates the "Out of context" messages from the rest.
+- Embedding model: a 1-layer BERT with mean pooling, saved as a
+  SentenceTransformer directory.
+- Knowledge base: synthetic multilingual chunks exported as a memory-mapped
+  vector index (rag_scientific/vector_index.py).
+
+Gemini is replaced by rag_scientific/fake_llm_server.py.
+"""
+
+import json
+import random
+import shutil
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+ROOT_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT_DIR / "intent_model"))
+sys.path.insert(0, str(ROOT_DIR / "rag_scientific"))
+
+REAL_INTENT_DIR = ROOT_DIR / "intent_model" / "incontext_marbret_approach" / "marbret_intent_classifier"
+
+# Bump when the artifacts below change, so cached stand-ins are rebuilt
+FAKES_VERSION = 1
+
+# Messages per intent and language
+MESSAGES: Dict[str, Dict[str, List[str]]] = {
+    "Exact fact": {
+        "ar": [
+            "ما هي أعراض انسحاب الكوكايين؟",
+            "ما هي معدلات استخدام القنب في شمال أفريقيا؟",
+            "كم تدوم أعراض الانسحاب من الهيروين؟",
+            "ما هي أضرار الترامادول على الكبد؟",
+        ],
+        "fr": [
+            "Quels sont les effets du cannabis sur le cerveau?",
+            "Combien de temps dure le sevrage aux opioïdes?",
+            "Quels sont les risques de la prégabaline?",
+        ],
+        "dz": [
+            "win kayen centre d'addictologie f dzayer?",
+            "واش هي الأضرار تاع الحبوب المهلوسة؟",
+            "chhal ydoum el sevrage ta3 el kif?",
+        ],
+        "en": [
+            "What are the long-term effects of heroin use?",
+            "How common is tramadol misuse among young adults?",
+            "What are the withdrawal symptoms of benzodiazepines?",
+        ],
+    },
+    "Looking for support": {
+        "ar": [
+            "حاب نبرا من لادروك عاونوني",
+            "راني تعبت نفسيا من هاد الإدمان",
+            "أشعر بالوحدة ولا أستطيع التوقف عن التعاطي",
+        ],
+        "fr": [
+            "J'ai besoin d'aide pour arrêter, je n'y arrive pas seul",
+            "Je me sens perdu depuis que j'ai rechuté",
+        ],
+        "dz": [
+            "rani 3yit mel kif, habit nhbes bsah ma9dertch",
+            "خويا راهو يتعاطى وما نعرفش كيفاش نعاونو",
+        ],
+        "en": [
+            "I relapsed again and I feel like giving up on recovery",
+            "I want to quit but I'm scared of withdrawal, please help me",
+        ],
+    },
+    "Harm": {
+        "ar": [
+            "راني حاب نشرب قاع الدوا لي عندي باش نرقد وما نوضش",
+            "لم أعد أريد العيش بعد الآن",
+        ],
+        "fr": [
+            "je veux me faire du mal",
+            "je pense à en finir ce soir",
+        ],
+        "dz": [
+            "ma b9itch habb n3ich, habb nkmmel 3la rouhi",
+        ],
+        "en": [
+            "I want to overdose on purpose tonight",
+            "I'm thinking about ending my life",
+        ],
+    },
+    "Out of context": {
+        "ar": [
+            "كيفاش راهي حالة الطقس في وهران؟",
+            "ما هي عاصمة اليابان؟",
+        ],
+        "fr": [
+            "Quelle est la meilleure recette de couscous?",
+            "Qui a gagné la coupe d'Afrique?",
+        ],
+        "dz": [
+            "match l'algérie lyoum wa9tach?",
+            "chkoun y3ref garage mli7 f blida?",
+        ],
+        "en": [
+            "What's the best phone to buy this year?",
+            "Can you recommend a good movie?",
+        ],
+    },
+}
+
+# Operation weights per traffic mix; 'chat:<intent>' posts a message of that intent
+MIXES: Dict[str, Dict[str, float]] = {
+    "default": {
+        "chat:Exact fact": 0.35, "chat:Looking for support": 0.20, "chat:Out of context": 0.15,
+        "chat:Harm": 0.05, "auth:login": 0.15, "auth:me": 0.07, "auth:refresh": 0.03,
+    },
+    "chat": {
+        "chat:Exact fact": 0.45, "chat:Looking for support": 0.25,
+        "chat:Out of context": 0.20, "chat:Harm": 0.10,
+    },
+    "rag": {
+        "chat:Exact fact": 0.85, "chat:Looking for support": 0.05,
+        "chat:Out of context": 0.05, "chat:Harm": 0.05,
+    },
+    "auth": {"auth:login": 0.6, "auth:me": 0.3, "auth:refresh": 0.1},
+}
+
+# Vocabulary of the synthetic knowledge base
+_KB_TOPICS = {
+    "en": (["cannabis", "heroin", "cocaine", "tramadol", "pregabalin", "alcohol", "benzodiazepines"],
+           ["withdrawal lasts several days", "use is rising among young adults", "treatment combines therapy and medication",
+            "long-term use damages the liver", "relapse rates drop with follow-up care", "overdose risk increases with mixing"]),
+    "fr": (["cannabis", "héroïne", "cocaïne", "tramadol", "prégabaline", "alcool"],
+           ["le sevrage dure plusieurs jours", "la consommation augmente chez les jeunes", "le traitement associe thérapie et médicaments",
+            "l'usage prolongé abîme le foie", "le suivi réduit les rechutes"]),
+    "ar": (["القنب", "الهيروين", "الكوكايين", "الترامادول", "البريغابالين", "الكحول"],
+           ["تستمر أعراض الانسحاب عدة أيام", "يرتفع الاستهلاك بين الشباب", "يجمع العلاج بين الدعم النفسي والأدوية",
+            "الاستخدام الطويل يضر الكبد", "المتابعة تقلل من الانتكاس"]),
+}
+_KB_PLACES = ["algeria", "north_africa", "global"]
+_KB_CATEGORIES = ["treatment", "statistics", "effects", "prevention"]
+
+
+def pick_operations(mix: str, n: int, seed: int) -> List[Tuple[str, Optional[str], Optional[str]]]:
+    """
+    Seeded request plan.
+
+    Returns:
+        List of (operation, intent, message); intent and message are None for auth operations.
+    """
+    rng = random.Random(seed)
+    operations, weights = zip(*MIXES[mix].items())
+    plan = []
+    for operation in rng.choices(operations, weights=weights, k=n):
+        if operation.startswith("chat:"):
+            intent = operation.split(":", 1)[1]
+            language = rng.choice(sorted(MESSAGES[intent]))
+            plan.append(("chat", intent, rng.choice(MESSAGES[intent][language])))
+        else:
+            plan.append((operation, None, None))
+    return plan
+
+
+def _labelled_messages() -> List[Tuple[str, str]]:
+    return [(text, intent) for intent, by_language in MESSAGES.items()
+            for texts in by_language.values() for text in texts]
+
+
+def _tiny_bert_config(num_layers: int, **overrides):
+    from transformers import BertConfig
+
+    return BertConfig.from_pretrained(
+        str(REAL_INTENT_DIR), hidden_size=64, num_hidden_layers=num_layers,
+        num_attention_heads=2, intermediate_size=128, **overrides
+    )
+
+
+def build_intent_model(base_dir: Path, seed: int, steps: int = 60):
+    """Write a MarBERT-shaped classifier + OOD detector laid out like incontext_marbret_approach/."""
+    import joblib
+    import torch
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.pipeline import make_pipeline
+    from transformers import AutoTokenizer, BertForSequenceClassification
+    from text_normalizer import normalize
+
+    model_dir = base_dir / "marbret_intent_classifier"
+    model_dir.mkdir(parents=True, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(str(REAL_INTENT_DIR))
+    tokenizer.save_pretrained(str(model_dir))
+    shutil.copy(REAL_INTENT_DIR / "label_mapping.json", model_dir / "label_mapping.json")
+    with open(REAL_INTENT_DIR / "label_mapping.json", encoding="utf-8") as f:
+        label_to_id = json.load(f)["label_to_id"]
+
+    labelled = _labelled_messages()
+
+    # OOD stage: same input as IntentBackend (cleaned text), classes include 'out_of_domain'
+    detector = make_pipeline(
+        TfidfVectorizer(analyzer="char_wb", ngram_range=(2, 4)),
+        LogisticRegression(C=100.0, max_iter=1000)
+    )
+    detector.fit(
+        [normalize(text).cleaned for text, _ in labelled],
+        ["out_of_domain" if intent == "Out of context" else "in_domain" for _, intent in labelled]
+    )
+    (base_dir / "ood_detector").mkdir(parents=True, exist_ok=True)
+    joblib.dump(detector, base_dir / "ood_detector" / "detector_pipeline.joblib")
+
+    # Intent stage: random init, then a few steps so routing follows the traffic mix
+    torch.manual_seed(seed)
+    model = BertForSequenceClassification(_tiny_bert_config(2, num_labels=len(label_to_id)))
+    in_domain = [(text, label_to_id[intent]) for text, intent in labelled if intent in label_to_id]
+    encoding = tokenizer([text for text, _ in in_domain], padding=True, truncation=True,
+                         max_length=128, return_tensors="pt")
+    labels = torch.tensor([label for _, label in in_domain])
+    optimizer = torch.optim.AdamW(model.parameters(), lr=2e-3)
+    model.train()
+    for _ in range(steps):
+        optimizer.zero_grad()
+        model(**encoding, labels=labels).loss.backward()
+        optimizer.step()
+    model.eval()
+    model.save_pretrained(str(model_dir))
+
+
+def build_embedding_model(out_dir: Path, seed: int):
+    """Write a 1-layer mean-pooling SentenceTransformer directory."""
+    import torch
+    from sentence_transformers import SentenceTransformer, models
+    from transformers import AutoTokenizer, BertModel
+
+    torch.manual_seed(seed)
+    transformer_dir = out_dir / "transformer"
+    BertModel(_tiny_bert_config(1)).save_pretrained(str(transformer_dir))
+    AutoTokenizer.from_pretrained(str(REAL_INTENT_DIR)).save_pretrained(str(transformer_dir))
+
+    word = models.Transformer(str(transformer_dir), max_seq_length=128)
+    pooling = models.Pooling(word.get_word_embedding_dimension(), pooling_mode="mean")
+    SentenceTransformer(modules=[word, pooling], device="cpu").save(str(out_dir))
+
+
+def build_knowledge_base(index_dir: Path, embedding_dir: Path, n_chunks: int, seed: int):
+    """Synthetic multilingual chunks, embedded with the stand-in model, as an mmap index."""
+    from sentence_transformers import SentenceTransformer
+    from vector_index import build_index
+
+    rng = random.Random(seed)
+    documents, metadatas = [], []
+    for _ in range(n_chunks):
+        language = rng.choice(sorted(_KB_TOPICS))
+        substances, facts = _KB_TOPICS[language]
+        sentences = [f"{rng.choice(substances)}: {rng.choice(facts)}." for _ in range(rng.randint(6, 14))]
+        documents.append(" ".join(sentences))
+        metadatas.append({
+            "category": rng.choice(_KB_CATEGORIES),
+            "geographic_context": rng.choice(_KB_PLACES),
+            "timeframe": "2020-2024",
+            "source": "synthetic"
+        })
+
+    model = SentenceTransformer(str(embedding_dir), device="cpu")
+    embeddings = model.encode(documents, batch_size=64, convert_to_numpy=True)
+    ids = [f"synthetic-{i}" for i in range(n_chunks)]
+    build_index(str(index_dir), ids, embeddings, documents, metadatas, metric="cosine", source="load-test")
+
+
+def prepare(work_dir: Path, seed: int = 0, n_chunks: int = 2000) -> Dict[str, str]:
+    """
+    Build (or reuse) all stand-ins under ``work_dir``.
+
+    Returns:
+        Environment variables that point the server at them.
+    """
+    stamp = {"version": FAKES_VERSION, "seed": seed, "n_chunks": n_chunks}
+    stamp_path = work_dir / "fakes.json"
+    intent_dir, embedding_dir, index_dir = work_dir / "intent", work_dir / "embedding", work_dir / "index"
+
+    if not stamp_path.exists() or json.loads(stamp_path.read_text()) != stamp:
+        if work_dir.exists():
+            shutil.rmtree(work_dir)
+        work_dir.mkdir(parents=True)
+        print("Building load-test stand-ins (tiny intent model, OOD detector, embedder, index)...")
+        build_intent_model(intent_dir, seed)
+        build_embedding_model(embedding_dir, seed)
+        build_knowledge_base(index_dir, embedding_dir, n_chunks, seed)
+        stamp_path.write_text(json.dumps(stamp))
+        print(f"✓ Stand-ins written to {work_dir}")
+
+    return {
+        "INTENT_MODEL_DIR": str(intent_dir),
+        "INTENT_ENGINE": "torch",
+        "RAG_EMBEDDING_MODEL": str(embedding_dir),
+        "RAG_VECTOR_STORE": "mmap",
+        "RAG_INDEX_DIR": str(index_dir),
+        "RAG_LEXICAL_INDEX": str(work_dir / "bm25.npz"),
+    }
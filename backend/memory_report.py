@@ -0,0 +1,65 @@
+"""
+Per-process memory report: unique (private) vs shared resident memory.
+
+Reads /proc/<pid>/smaps_rollup (Linux), so copy-on-write sharing between a
+preloading parent and its forked workers is visible directly.
+
+Usage:
+    python memory_report.py <master_pid>      # master + its worker processes
+"""
+
+import sys
+from pathlib import Path
+from typing import Dict, List
+
+
+def read_smaps(pid: int) -> Dict[str, int]:
+    """Return RSS, PSS, unique (USS) and shared memory of a process, in KiB."""
+    fields: Dict[str, int] = {}
+    with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                fields[parts[0][:-1]] = int(parts[1])
+    return {
+        "rss": fields.get("Rss", 0),
+        "pss": fields.get("Pss", 0),
+        "unique": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+        "shared": fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0),
+    }
+
+
+def child_pids(pid: int) -> List[int]:
+    """Direct children of ``pid``."""
+    children = Path(f"/proc/{pid}/task/{pid}/children")
+    if not children.exists():
+        return []
+    return [int(p) for p in children.read_text().split()]
+
+
+def print_report(master_pid: int, worker_pids: List[int]):
+    """Print a per-process table and the total footprint."""
+    print("\n" + "=" * 60)
+    print("Memory report (MiB)")
+    print("=" * 60)
+    print(f"{'process':<16}{'RSS':>10}{'PSS':>10}{'unique':>10}{'shared':>10}")
+
+    total_pss = 0
+    for role, pid in [("master", master_pid)] + [("worker", p) for p in worker_pids]:
+        try:
+            mem = read_smaps(pid)
+        except FileNotFoundError:
+            continue
+        total_pss += mem["pss"]
+        print(f"{f'{role} {pid}':<16}{mem['rss'] / 1024:>10.0f}{mem['pss'] / 1024:>10.0f}"
+              f"{mem['unique'] / 1024:>10.0f}{mem['shared'] / 1024:>10.0f}")
+
+    print(f"\nTotal proportional footprint (sum of PSS): {total_pss / 1024:.0f} MiB")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print(__doc__)
+        sys.exit(1)
+    master = int(sys.argv[1])
+    print_report(master, child_pids(master))
@@ -0,0 +1,105 @@
+"""
+Preload-then-fork serving mode for the Amal API.
+
+Loads MarBERT, the OOD detector and the embedding model once in the master
+process, moves their weights to shared memory, then forks uvicorn workers
+that all accept on the same socket. Workers share the model pages read-only
+instead of each loading a private copy.
+
+Usage:
+    python serve_preforked.py --workers 4 --port 8000
+    python serve_preforked.py --workers 4 --memory-report 60
+"""
+
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from typing import List
+
+import uvicorn
+
+import server
+from amal_backend import AmalBackend
+from memory_report import print_report
+
+
+def run_worker(sock: socket.socket, backend: AmalBackend, threads_per_worker: int):
+    """Child process: finish per-worker setup and serve until signalled."""
+    # Only limit torch if a loaded model already uses it; ONNX-only workers stay torch-free
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.set_num_threads(threads_per_worker)
+
+    backend.after_fork()
+    server.backend = backend
+
+    config = uvicorn.Config(server.app, log_level="info")
+    uvicorn.Server(config).run(sockets=[sock])
+    os._exit(0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--memory-report", type=float, metavar="SECONDS",
+                        help="Print per-worker unique/shared memory after this delay")
+    args = parser.parse_args()
+
+    # Load everything once, before any worker exists
+    backend = AmalBackend(load_rag=True, preload_for_fork=True)
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    threads_per_worker = max(1, (os.cpu_count() or 1) // args.workers)
+
+    # Keep the garbage collector from touching (and copying) preloaded objects
+    gc.collect()
+    gc.freeze()
+
+    workers: List[int] = []
+    for _ in range(args.workers):
+        pid = os.fork()
+        if pid == 0:
+            run_worker(sock, backend, threads_per_worker)
+        workers.append(pid)
+
+    print(f"✓ Master {os.getpid()} serving on {args.host}:{args.port} with workers {workers}")
+
+    def stop(signum, frame):
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    if args.memory_report:
+        def report():
+            time.sleep(args.memory_report)
+            print_report(os.getpid(), workers)
+        threading.Thread(target=report, daemon=True).start()
+
+    for pid in workers:
+        try:
+            os.waitpid(pid, 0)
+        except ChildProcessError:
+            pass
+    sock.close()
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,14 +3,19 @@ FastAPI Server for Amal Backend
 Provides REST API endpoints for the frontend chat interface.
 """
 
-from fastapi import FastAPI, HTTPException, Depends, Header
+from fastapi import FastAPI, HTTPException, Depends, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel, EmailStr
-from typing import Optional, List, Dict
+from typing import AsyncIterator, Optional, List, Dict
+import time
 import uvicorn
 
 from amal_backend import AmalBackend
 from auth import auth_backend
+from executors import StageExecutor, StageOverloaded
+from intent_batcher import IntentBatcher
+from streaming import LatencyTracker, sse_event, stream_in_stage
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -31,6 +36,32 @@ app.add_middleware(
 # Global backend instance (loaded on startup)
 backend: Optional[AmalBackend] = None
 
+# Upper bound on messages accepted by /chat/batch in one request
+MAX_BATCH_MESSAGES = 1000
+
+# Blocking work runs in bounded per-stage pools so the event loop (and /auth/*,
+# /health) stays responsive. Sized via CHAT_<STAGE>_WORKERS / CHAT_<STAGE>_QUEUE.
+# Inference workers mostly wait on the intent batcher, so allow a full batch.
+inference_stage = StageExecutor.from_env("inference", IntentBatcher.DEFAULT_MAX_BATCH_SIZE, 64)
+llm_stage = StageExecutor.from_env("llm", 16, 64)
+batch_stage = StageExecutor.from_env("batch", 1, 4)
+
+# Seconds clients should wait before retrying a rejected request
+RETRY_AFTER_SECONDS = 1
+
+# Time-to-first-token of /chat/stream responses, per response source
+stream_ttft = LatencyTracker()
+
+
+@app.exception_handler(StageOverloaded)
+async def stage_overloaded_handler(request: Request, exc: StageOverloaded):
+    """Fail fast with 503 instead of letting queue latency grow without bound."""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": f"Server busy ({exc.stage}), please retry"},
+        headers={"Retry-After": str(RETRY_AFTER_SECONDS)}
+    )
+
 
 # ============================================
 # Request/Response Models
@@ -50,10 +81,19 @@ class ChatResponse(BaseModel):
     source: str
 
 
+class ChatBatchRequest(BaseModel):
+    messages: List[str]
+
+
+class ChatBatchResponse(BaseModel):
+    results: List[ChatResponse]
+
+
 class HealthResponse(BaseModel):
     status: str
     intent_model: bool
     rag_model: bool
+    components: Dict = {}
 
 
 # Auth models
@@ -101,8 +141,21 @@ async def startup_event():
     """Load models on server startup."""
     global backend
     print("\n🚀 Starting Amal API Server...")
-    backend = AmalBackend(load_rag=True)
-    print("✓ Server ready!\n")
+    # serve_preforked.py injects a backend preloaded in the parent process.
+    # Otherwise models load in the background so /auth/* and /health serve immediately.
+    if backend is None:
+        backend = AmalBackend(load_rag=True, lazy=True)
+        backend.start_loading()
+    print("✓ Server ready (models loading in background)!\n")
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Let in-flight jobs finish before the worker exits."""
+    for stage in (inference_stage, llm_stage, batch_stage):
+        stage.shutdown()
+    if backend:
+        backend.close()
 
 
 @app.get("/", response_model=Dict)
@@ -114,21 +167,61 @@ async def root():
         "description": "Drug recovery support AI for Algeria",
         "endpoints": {
             "POST /chat": "Send a message and get AI response",
-            "GET /health": "Check server health status"
+            "POST /chat/stream": "Send a message and stream the AI response as Server-Sent Events",
+            "POST /chat/batch": "Classify and answer a list of messages",
+            "GET /health": "Check server health status",
+            "GET /metrics": "Runtime counters for monitoring"
         }
     }
 
 
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
-    """Check if all models are loaded."""
+    """Check if all models are loaded, with per-component readiness and load times."""
+    if not backend:
+        return HealthResponse(status="initializing", intent_model=False, rag_model=False)
+    
+    statuses = [component["status"] for component in backend.components.values()]
+    if any(status in ("pending", "loading") for status in statuses):
+        status = "initializing"
+    elif "failed" in statuses:
+        status = "degraded"
+    else:
+        status = "healthy"
+    
     return HealthResponse(
-        status="healthy" if backend else "initializing",
-        intent_model=backend.intent_backend is not None if backend else False,
-        rag_model=backend.rag_backend is not None if backend else False
+        status=status,
+        intent_model=backend.is_ready("intent_model"),
+        rag_model=backend.is_ready("rag_model"),
+        components=backend.components
     )
 
 
+def require_intent_model():
+    """Reject chat requests until the intent classifier has loaded."""
+    if not backend:
+        raise HTTPException(status_code=503, detail="Backend not initialized")
+    if not backend.is_ready("intent_model"):
+        raise HTTPException(
+            status_code=503,
+            detail="Models are still loading",
+            headers={"Retry-After": str(RETRY_AFTER_SECONDS)}
+        )
+
+
+@app.get("/metrics", response_model=Dict)
+async def metrics():
+    """Runtime counters (intent cache hit rate, batch sizes, support worker queue) for monitoring."""
+    if not backend:
+        raise HTTPException(status_code=503, detail="Backend not initialized")
+    metrics = await backend.get_metrics()
+    metrics["stages"] = {
+        stage.name: stage.get_stats() for stage in (inference_stage, llm_stage, batch_stage)
+    }
+    metrics["stream_ttft"] = stream_ttft.get_stats()
+    return metrics
+
+
 @app.post("/chat", response_model=ChatResponse)
 async def chat(request: ChatRequest):
     """
@@ -139,15 +232,135 @@ async def chat(request: ChatRequest):
     2. Route to appropriate handler
     3. Return response in user's detected language
     """
-    if not backend:
-        raise HTTPException(status_code=503, detail="Backend not initialized")
+    require_intent_model()
     
     if not request.message or not request.message.strip():
         raise HTTPException(status_code=400, detail="Message cannot be empty")
     
+    message = request.message.strip()
+    
     try:
-        result = backend.process_query(request.message.strip())
+        # CPU-bound: language detection + intent classification
+        language, intent_label, confidence = await inference_stage.run(backend.classify_query, message)
+        
+        # LLM routes run on the event loop (async Gemini calls with deadlines and
+        # hedging, support worker replies), still counted against the LLM stage
+        # limit; RAG embedding and retrieval go back to the inference stage.
+        # Fixed replies are inline
+        if backend.needs_llm(intent_label):
+            with llm_stage.admit():
+                result = await backend.respond_async(
+                    message, language, intent_label, confidence,
+                    session_id=request.conversation_id, executor=inference_stage
+                )
+        else:
+            result = backend.respond(message, language, intent_label, confidence)
         return ChatResponse(**result)
+    except StageOverloaded:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    Process a chat message and stream the AI response as Server-Sent Events.
+    
+    Events:
+    - ``message``: complete result for fixed replies (Harm, Out of context, ...)
+    - ``route``: intent, confidence, language and source, sent before generation
+    - ``token``: ``{"text": ...}`` answer chunks as the LLM produces them
+    - ``done``: full response plus ``ttft_ms`` and ``total_ms``
+    - ``error``: generation failed after the stream started
+    """
+    require_intent_model()
+    
+    if not request.message or not request.message.strip():
+        raise HTTPException(status_code=400, detail="Message cannot be empty")
+    
+    message = request.message.strip()
+    start = time.perf_counter()
+    
+    try:
+        language, intent_label, confidence = await inference_stage.run(backend.classify_query, message)
+    except StageOverloaded:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    if not backend.needs_llm(intent_label):
+        result = backend.respond(message, language, intent_label, confidence)
+        stream_ttft.record(result["source"], time.perf_counter() - start)
+        return StreamingResponse(
+            iter([sse_event("message", result)]),
+            media_type="text/event-stream"
+        )
+    
+    chunks, source = backend.respond_stream(message, language, intent_label, session_id=request.conversation_id)
+    # Admitted now so an overloaded LLM stage is a 503, not a broken stream
+    tokens = stream_in_stage(llm_stage, chunks)
+    
+    async def events() -> AsyncIterator[str]:
+        yield sse_event("route", {
+            "intent": intent_label,
+            "confidence": confidence,
+            "language": language,
+            "source": source
+        })
+        
+        parts = []
+        ttft = None
+        try:
+            async for text in tokens:
+                if ttft is None:
+                    ttft = time.perf_counter() - start
+                    stream_ttft.record(source, ttft)
+                parts.append(text)
+                yield sse_event("token", {"text": text})
+        except Exception as e:
+            yield sse_event("error", {"detail": str(e)})
+            return
+        
+        yield sse_event("done", {
+            "response": "".join(parts),
+            "ttft_ms": round(ttft * 1000.0, 1) if ttft is not None else None,
+            "total_ms": round((time.perf_counter() - start) * 1000.0, 1)
+        })
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Keep reverse proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.post("/chat/batch", response_model=ChatBatchResponse)
+async def chat_batch(request: ChatBatchRequest):
+    """
+    Process a list of messages in one call (backfills, re-scoring, evaluation).
+    
+    Intent classification is batched and messages are grouped by route;
+    each result matches what /chat would return for that message.
+    """
+    require_intent_model()
+    
+    if not request.messages:
+        raise HTTPException(status_code=400, detail="Messages cannot be empty")
+    
+    if len(request.messages) > MAX_BATCH_MESSAGES:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_MESSAGES} messages per batch")
+    
+    messages = [message.strip() for message in request.messages]
+    if any(not message for message in messages):
+        raise HTTPException(status_code=400, detail="Message cannot be empty")
+    
+    try:
+        results = await batch_stage.run(backend.process_queries, messages)
+        return ChatBatchResponse(results=[ChatResponse(**result) for result in results])
+    except StageOverloaded:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -0,0 +1,113 @@
+"""
+Server-Sent Events helpers for /chat/stream.
+Blocking token iterators (Gemini, the support model) are drained in a
+StageExecutor thread and handed to the event loop through an asyncio.Queue.
+"""
+
+import asyncio
+import json
+import threading
+from collections import deque
+from typing import Any, AsyncIterator, Dict, Iterator
+
+from executors import StageExecutor
+
+# Marks the end of a drained iterator
+_DONE = object()
+
+
+def sse_event(event: str, data: Dict) -> str:
+    """Format one SSE message with a JSON payload."""
+    payload = json.dumps(data, ensure_ascii=False)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+def stream_in_stage(stage: StageExecutor, chunks: Iterator[str]) -> AsyncIterator[str]:
+    """
+    Drain a blocking iterator in ``stage`` and yield its items asynchronously.
+
+    Admission happens immediately, so a full stage raises ``StageOverloaded``
+    here, before the HTTP response has started. The stage slot is held until
+    the iterator is exhausted or the client disconnects.
+
+    Raises:
+        StageOverloaded: If the stage is already at capacity.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    cancelled = threading.Event()
+
+    def pump():
+        try:
+            for chunk in chunks:
+                if cancelled.is_set():
+                    break
+                loop.call_soon_threadsafe(queue.put_nowait, chunk)
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, e)
+        finally:
+            close = getattr(chunks, "close", None)
+            if close:
+                close()
+            loop.call_soon_threadsafe(queue.put_nowait, _DONE)
+
+    stage.submit(pump)
+
+    async def drain() -> AsyncIterator[str]:
+        try:
+            while True:
+                item = await queue.get()
+                if item is _DONE:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            # Client went away or we are done: stop the producer at the next chunk
+            cancelled.set()
+
+    return drain()
+
+
+class LatencyTracker:
+    """Recent latency samples per key (e.g. time-to-first-token per source)."""
+
+    def __init__(self, window: int = 1000):
+        """
+        Initialize the tracker.
+
+        Args:
+            window: Samples kept per key; older ones are discarded.
+        """
+        self.window = window
+        self._samples: Dict[str, deque] = {}
+        self._counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def record(self, key: str, seconds: float):
+        """Add one sample, in seconds."""
+        with self._lock:
+            if key not in self._samples:
+                self._samples[key] = deque(maxlen=self.window)
+                self._counts[key] = 0
+            self._samples[key].append(seconds)
+            self._counts[key] += 1
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Count and p50/p95/max in milliseconds over the recent window, per key."""
+        with self._lock:
+            snapshot = {key: (sorted(samples), self._counts[key]) for key, samples in self._samples.items()}
+
+        stats = {}
+        for key, (ordered, count) in snapshot.items():
+            stats[key] = {
+                "count": count,
+                "p50_ms": round(_percentile(ordered, 50) * 1000.0, 1),
+                "p95_ms": round(_percentile(ordered, 95) * 1000.0, 1),
+                "max_ms": round(ordered[-1] * 1000.0, 1),
+            }
+        return stats
+
+
+def _percentile(ordered: list, q: float) -> float:
+    return ordered[min(len(ordered) - 1, int(q / 100.0 * len(ordered)))]
@@ -0,0 +1,98 @@
+"""
+Benchmark: dynamic micro-batching vs per-request intent classification.
+Reports throughput (req/s) and p50/p99 latency for several window/batch sizes.
+
+Usage:
+    python benchmark_batching.py --clients 32 --requests 512
+"""
+
+import argparse
+import itertools
+import threading
+import time
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from intent_backend import IntentBackend
+from intent_batcher import IntentBatcher
+
+SAMPLE_MESSAGES = [
+    "حاب نبرا من لادروك عاونوني",
+    "ما هي أعراض انسحاب الكوكايين؟",
+    "راني حاب نشرب قاع الدوا لي عندي باش نرقد وما نوضش",
+    "كيفاش راهي حالة الطقس في وهران؟",
+    "win kayen centre d'addictologie f dzayer?",
+    "ma3andich l'espoir f lhayat, nhab nmout",
+    "je veux arrêter le cannabis, aidez-moi",
+    "what are the withdrawal symptoms of heroin?",
+]
+
+
+def run_load(predict: Callable, clients: int, total_requests: int) -> Dict:
+    """Fire ``total_requests`` calls from ``clients`` threads and time each one."""
+    latencies: List[float] = []
+    lock = threading.Lock()
+    counter = itertools.count()
+
+    def client():
+        while True:
+            i = next(counter)
+            if i >= total_requests:
+                return
+            start = time.perf_counter()
+            predict(SAMPLE_MESSAGES[i % len(SAMPLE_MESSAGES)])
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    wall_start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - wall_start
+
+    lat_ms = np.array(latencies) * 1000.0
+    return {
+        "req_s": total_requests / wall,
+        "p50_ms": float(np.percentile(lat_ms, 50)),
+        "p99_ms": float(np.percentile(lat_ms, 99)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=512)
+    parser.add_argument("--windows", type=float, nargs="+", default=[2.0, 5.0, 10.0])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[8, 16, 32, 64])
+    args = parser.parse_args()
+
+    # Cache off: repeated sample messages would otherwise never reach the model
+    backend = IntentBackend(cache_max_entries=0)
+    # Warm up kernels so the first configuration is not penalised
+    backend._predict_batch(SAMPLE_MESSAGES)
+
+    print("\n" + "=" * 60)
+    print(f"Intent batching benchmark ({args.clients} clients, {args.requests} requests)")
+    print("=" * 60)
+    print(f"{'mode':<22}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'mean batch':>12}")
+
+    result = run_load(backend.predict_intent, args.clients, args.requests)
+    print(f"{'unbatched':<22}{result['req_s']:>10.1f}{result['p50_ms']:>10.1f}"
+          f"{result['p99_ms']:>10.1f}{1.0:>12.1f}")
+
+    for window_ms, batch_size in itertools.product(args.windows, args.batch_sizes):
+        batcher = IntentBatcher(backend, window_ms=window_ms, max_batch_size=batch_size)
+        result = run_load(batcher.predict_intent, args.clients, args.requests)
+        stats = batcher.get_stats()
+        batcher.close()
+        mode = f"window={window_ms:g}ms n={batch_size}"
+        print(f"{mode:<22}{result['req_s']:>10.1f}{result['p50_ms']:>10.1f}"
+              f"{result['p99_ms']:>10.1f}{stats['mean_batch']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Microbenchmark for text_normalizer.
+
+Times normalize() and normalize_batch() against the previous per-step
+implementations of IntentBackend.clean_text and AmalBackend.detect_language's
+script counting. Golden outputs and equivalence with those implementations
+are checked by test_text_normalizer.py.
+
+Usage:
+    python benchmark_normalizer.py
+"""
+
+import time
+from typing import Callable, List
+
+from test_text_normalizer import GOLDEN_CASES, legacy_clean_text, legacy_script_counts
+from text_normalizer import normalize, normalize_batch
+
+
+def time_it(fn: Callable, texts: List[str], repeats: int) -> float:
+    """Microseconds per message for ``fn`` over ``texts``."""
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn(texts)
+    return (time.perf_counter() - start) / (repeats * len(texts)) * 1e6
+
+
+def main():
+    texts = [text for text, _ in GOLDEN_CASES if text] * 200
+    repeats = 20
+
+    legacy_us = time_it(
+        lambda batch: [(legacy_clean_text(t), legacy_script_counts(t)) for t in batch], texts, repeats
+    )
+    single_us = time_it(lambda batch: [normalize(t) for t in batch], texts, repeats)
+    batch_us = time_it(normalize_batch, texts, repeats)
+
+    print("\n" + "=" * 60)
+    print(f"Microbenchmark ({len(texts)} messages x {repeats})")
+    print("=" * 60)
+    print(f"{'legacy clean_text + counts':<30}{legacy_us:>8.2f} µs/msg")
+    print(f"{'normalize':<30}{single_us:>8.2f} µs/msg  ({legacy_us / single_us:.1f}x)")
+    print(f"{'normalize_batch':<30}{batch_us:>8.2f} µs/msg  ({legacy_us / batch_us:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmark and parity check for MarBERT padding strategies.
+
+1. Parity: every strategy must return the same labels as padding="max_length".
+2. Latency vs length: per-message MarBERT time for messages of growing length.
+
+Usage:
+    python benchmark_padding.py                      # built-in messages
+    python benchmark_padding.py --parity-file held_out.txt
+"""
+
+import argparse
+import sys
+import time
+from typing import List
+
+import numpy as np
+
+from intent_backend import IntentBackend
+from benchmark_batching import SAMPLE_MESSAGES
+
+# Word used to grow messages to a target token length
+FILLER = "الإدمان"
+
+
+def check_parity(backend: IntentBackend, texts: List[str]) -> bool:
+    """Compare labels of each padding strategy against the legacy max_length path."""
+    original = backend.padding
+    predictions = {}
+    for strategy in backend.PADDING_STRATEGIES:
+        backend.padding = strategy
+        predictions[strategy] = [label for label, _ in backend._predict_batch(texts)]
+    backend.padding = original
+
+    reference = predictions["max_length"]
+    ok = True
+    for strategy, labels in predictions.items():
+        mismatches = sum(1 for a, b in zip(labels, reference) if a != b)
+        status = "✓" if mismatches == 0 else "✗"
+        print(f"  {status} {strategy:<11} {mismatches} / {len(texts)} label mismatches")
+        ok = ok and mismatches == 0
+    return ok
+
+
+def time_forward(backend: IntentBackend, text: str, repeats: int) -> float:
+    """Median milliseconds for tokenization + one MarBERT forward pass."""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        backend._intent_probs([text])
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings) * 1000.0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--parity-file", help="One message per line (held-out set)")
+    parser.add_argument("--lengths", type=int, nargs="+", default=[4, 8, 16, 32, 64, 120])
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    # Cache off so every strategy actually runs MarBERT
+    backend = IntentBackend(cache_max_entries=0)
+
+    texts = list(SAMPLE_MESSAGES)
+    if args.parity_file:
+        with open(args.parity_file, "r", encoding="utf-8") as f:
+            texts = [line.strip() for line in f if line.strip()]
+
+    print("\n" + "=" * 60)
+    print(f"Label parity vs padding='max_length' ({len(texts)} messages)")
+    print("=" * 60)
+    parity_ok = check_parity(backend, texts)
+
+    print("\n" + "=" * 60)
+    print("MarBERT latency vs message length (ms, median)")
+    print("=" * 60)
+    header = f"{'tokens':>8}" + "".join(f"{s:>13}" for s in backend.PADDING_STRATEGIES)
+    print(header)
+    for length in args.lengths:
+        text = " ".join([FILLER] * length)
+        n_tokens = len(backend.tokenizer(text, truncation=True, max_length=backend.MAX_SEQ_LENGTH)["input_ids"])
+        row = f"{n_tokens:>8}"
+        for strategy in backend.PADDING_STRATEGIES:
+            backend.padding = strategy
+            row += f"{time_forward(backend, text, args.repeats):>13.2f}"
+        print(row)
+
+    sys.exit(0 if parity_ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,18 +4,22 @@ Uses MarBERT model with OOD (Out-of-Domain) detection for Arabic/French/Darija t
 """
 
 import os
-import re
 import json
+import hashlib
 import warnings
-import joblib
-import torch
 import numpy as np
-from transformers import AutoTokenizer, AutoModelForSequenceClassification
-from typing import Dict, Tuple, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple, Optional
 from pathlib import Path
 
+from intent_cache import IntentCache
+from text_normalizer import NormalizedText, normalize, normalize_batch
+
 warnings.filterwarnings("ignore")
 
+# torch, transformers and joblib are imported where they are first needed, so
+# importing this module (e.g. from the API server) stays cheap.
+
 
 class IntentBackend:
     """Intent classification backend using MarBERT with OOD detection."""
@@ -29,14 +33,58 @@ class IntentBackend:
     # Default OOD threshold (best found during training)
     DEFAULT_OOD_THRESHOLD = 0.09
     
-    def __init__(self, base_dir: Optional[str] = None):
+    # MarBERT sequence length used during training
+    MAX_SEQ_LENGTH = 128
+    
+    # Padding targets for the "bucket" strategy (last one must be MAX_SEQ_LENGTH)
+    LENGTH_BUCKETS = (16, 32, 64, 128)
+    
+    # Supported tokenizer padding strategies
+    PADDING_STRATEGIES = ("bucket", "longest", "max_length")
+    
+    # Texts per model pass in predict_intents
+    DEFAULT_BATCH_SIZE = 32
+    
+    # MarBERT inference engines ('onnx*' require `python onnx_engine.py export`)
+    ENGINES = ("torch", "onnx", "onnx-int8")
+    
+    def __init__(
+        self,
+        base_dir: Optional[str] = None,
+        padding: str = "bucket",
+        engine: str = "torch",
+        cache_max_entries: int = IntentCache.DEFAULT_MAX_ENTRIES,
+        cache_ttl: Optional[float] = IntentCache.DEFAULT_TTL_SECONDS,
+        cache_max_bytes: int = IntentCache.DEFAULT_MAX_BYTES,
+        mmap_ood: bool = False
+    ):
         """
         Initialize the Intent Backend.
         
         Args:
             base_dir: Base directory containing model files. 
                       Defaults to 'incontext_marbret_approach' in the same folder.
+            padding: Tokenizer padding strategy for MarBERT:
+                     'bucket' pads to the nearest of LENGTH_BUCKETS,
+                     'longest' pads to the longest sequence in the batch,
+                     'max_length' always pads to MAX_SEQ_LENGTH (legacy).
+            engine: MarBERT inference engine: 'torch' (PyTorch), 'onnx'
+                    (ONNX Runtime FP32) or 'onnx-int8' (dynamic INT8, CPU).
+            cache_max_entries: Size of the result cache keyed on the raw text;
+                               0 disables caching.
+            cache_ttl: Cache entry lifetime in seconds (None = no expiry).
+            cache_max_bytes: Approximate memory bound of the cache.
+            mmap_ood: Memory-map the OOD detector's numpy arrays read-only
+                      (lets forked workers share them instead of copying).
         """
+        if padding not in self.PADDING_STRATEGIES:
+            raise ValueError(f"Unknown padding strategy '{padding}'. Use one of {self.PADDING_STRATEGIES}")
+        if engine not in self.ENGINES:
+            raise ValueError(f"Unknown engine '{engine}'. Use one of {self.ENGINES}")
+        self.padding = padding
+        self.engine = engine
+        self.mmap_ood = mmap_ood
+        
         if base_dir is None:
             base_dir = Path(__file__).parent / "incontext_marbret_approach"
         else:
@@ -46,24 +94,77 @@ class IntentBackend:
         self.model_dir = base_dir / "marbret_intent_classifier"
         self.detector_path = base_dir / "ood_detector" / "detector_pipeline.joblib"
         
-        # Set device
-        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        # Set device (the ONNX engines run on CPU without importing torch)
+        self.device = "cpu"
+        if self.engine == "torch":
+            import torch
+            self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         print(f"Using device: {self.device}")
         
+        # Result cache (keyed on raw text + model version + threshold)
+        self.cache = None
+        if cache_max_entries > 0:
+            self.cache = IntentCache(
+                max_entries=cache_max_entries,
+                ttl_seconds=cache_ttl,
+                max_bytes=cache_max_bytes
+            )
+        
         # Load models
-        self._load_ood_detector()
-        self._load_marbert_model()
-        self._load_label_mapping()
+        self._load_models()
         
         print("✓ Intent Backend initialized successfully")
     
+    def _load_models(self):
+        """Load the OOD detector, MarBERT and label mapping, and stamp their version."""
+        # The two models are independent; load them concurrently
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            loads = [pool.submit(self._load_ood_detector), pool.submit(self._load_marbert_model)]
+            for load in loads:
+                load.result()
+        self._load_label_mapping()
+        self.model_version = self._compute_model_version()
+    
+    def reload(self):
+        """Reload all model files from disk and invalidate cached results."""
+        print("Reloading intent models...")
+        self._load_models()
+        if self.cache is not None:
+            self.cache.clear()
+        print(f"✓ Intent models reloaded (version {self.model_version})")
+    
+    def _compute_model_version(self) -> str:
+        """Fingerprint the loaded model files (name, size, mtime) and engine."""
+        fingerprint = hashlib.sha1(self.engine.encode())
+        for path in sorted([self.detector_path, *self.model_dir.iterdir()]):
+            if path.is_file():
+                stat = path.stat()
+                fingerprint.update(f"{path.name}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+        return fingerprint.hexdigest()[:12]
+    
+    def share_memory(self):
+        """
+        Move MarBERT weights into shared memory before forking workers.
+        
+        Forked processes then map the same physical pages read-only instead of
+        each holding a private copy. No-op for the ONNX engines.
+        """
+        if self.engine == "torch":
+            self.model.share_memory()
+    
+    def get_cache_stats(self) -> Optional[Dict]:
+        """Return cache hit/miss/eviction counters, or None if caching is disabled."""
+        return self.cache.get_stats() if self.cache is not None else None
+    
     def _load_ood_detector(self):
         """Load the OOD (Out-of-Domain) detector."""
         if not self.detector_path.exists():
             raise FileNotFoundError(f"OOD detector not found at {self.detector_path}")
         
+        import joblib
+        
         print("Loading OOD detector...")
-        self.ood_detector = joblib.load(self.detector_path)
+        self.ood_detector = joblib.load(self.detector_path, mmap_mode="r" if self.mmap_ood else None)
         print("✓ OOD detector loaded")
     
     def _load_marbert_model(self):
@@ -71,11 +172,19 @@ class IntentBackend:
         if not self.model_dir.exists():
             raise FileNotFoundError(f"MarBERT model not found at {self.model_dir}")
         
-        print("Loading MarBERT model...")
+        from transformers import AutoTokenizer
+        
+        print(f"Loading MarBERT model ({self.engine})...")
         self.tokenizer = AutoTokenizer.from_pretrained(str(self.model_dir))
-        self.model = AutoModelForSequenceClassification.from_pretrained(str(self.model_dir))
-        self.model.to(self.device)
-        self.model.eval()
+        
+        if self.engine == "torch":
+            from transformers import AutoModelForSequenceClassification
+            self.model = AutoModelForSequenceClassification.from_pretrained(str(self.model_dir))
+            self.model.to(self.device)
+            self.model.eval()
+        else:
+            from onnx_engine import OnnxIntentModel, onnx_paths
+            self.model = OnnxIntentModel(onnx_paths(self.base_dir)[self.engine])
         print("✓ MarBERT model loaded")
     
     def _load_label_mapping(self):
@@ -100,43 +209,16 @@ class IntentBackend:
             
         Returns:
             Cleaned and normalized text.
-        """
-        if not isinstance(text, str):
-            return ""
-        
-        # Lowercase Latin characters
-        text = text.lower()
-        
-        # Remove URLs
-        text = re.sub(r'http\S+|www\S+|https\S+', '', text, flags=re.MULTILINE)
-        
-        # Remove emojis and special chars (keep basic punctuation and Arabic)
-        text = re.sub(r'[^\w\s\u0600-\u06FF]', ' ', text)
-        
-        # Arabic normalization
-        text = re.sub("[إأآا]", "ا", text)
-        text = re.sub("ى", "ي", text)
-        text = re.sub("ؤ", "ء", text)
-        text = re.sub("ئ", "ء", text)
-        text = re.sub("ة", "ه", text)
-        text = re.sub("گ", "ك", text)
-        
-        # Remove Tashkeel (Arabic diacritics)
-        tashkeel = re.compile(r'[\u064B-\u0652]')
-        text = re.sub(tashkeel, "", text)
         
-        # Remove longation (repeated characters)
-        text = re.sub(r'(.)\1+', r'\1\1', text)
-        
-        # Remove multiple spaces
-        text = re.sub(r'\s+', ' ', text).strip()
-        
-        return text
+        Delegates to the shared single-pass normalizer (see text_normalizer.py).
+        """
+        return normalize(text).cleaned
 
     def predict_intent(
         self, 
         text: str, 
-        ood_threshold: Optional[float] = None
+        ood_threshold: Optional[float] = None,
+        normalized: Optional[NormalizedText] = None
     ) -> Tuple[str, Dict]:
         """
         Predict intent for given text with confidence scores.
@@ -149,56 +231,201 @@ class IntentBackend:
             text: Input text to classify.
             ood_threshold: Threshold for OOD detection. 
                           Defaults to 0.09 (best found during training).
+            normalized: Precomputed ``normalize(text)`` output, to avoid
+                        normalizing the same message twice.
         
         Returns:
             Tuple of (intent_label, confidence_dict)
             - intent_label: One of "Looking for support", "Exact fact", "Harm", "Out of context"
             - confidence_dict: Contains 'stage', 'p_ood', and optionally 'p_intent'
         """
+        return self._predict_batch(
+            [text], ood_threshold, [normalized] if normalized is not None else None
+        )[0]
+    
+    def predict_intents(
+        self,
+        texts: List[str],
+        ood_threshold: Optional[float] = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        normalized: Optional[List[NormalizedText]] = None
+    ) -> List[Tuple[str, Dict]]:
+        """
+        Predict intents for many texts (backfills, re-scoring, evaluation).
+        
+        Texts are sorted by length and processed in chunks of ``batch_size`` so
+        each chunk pads to a similar length. Results match calling
+        ``predict_intent`` on every item.
+        
+        Args:
+            texts: Input texts to classify.
+            ood_threshold: Threshold for OOD detection (see ``predict_intent``).
+            batch_size: Number of texts per OOD/MarBERT pass.
+            normalized: Precomputed ``normalize_batch(texts)`` output.
+        
+        Returns:
+            List of (intent_label, confidence_dict), in the order of ``texts``.
+        """
+        if batch_size < 1:
+            raise ValueError("batch_size must be >= 1")
+        
+        if normalized is None:
+            normalized = normalize_batch(texts)
+        
+        order = sorted(range(len(texts)), key=lambda i: len(normalized[i].cleaned))
+        results: List[Optional[Tuple[str, Dict]]] = [None] * len(texts)
+        
+        for start in range(0, len(order), batch_size):
+            chunk = order[start:start + batch_size]
+            chunk_results = self._predict_batch(
+                [texts[i] for i in chunk], ood_threshold, [normalized[i] for i in chunk]
+            )
+            for i, result in zip(chunk, chunk_results):
+                results[i] = result
+        
+        return results
+    
+    def _predict_batch(
+        self,
+        texts: List[str],
+        ood_threshold: Optional[float] = None,
+        normalized: Optional[List[NormalizedText]] = None
+    ) -> List[Tuple[str, Dict]]:
+        """
+        Run the two-stage pipeline over several texts at once.
+        
+        The OOD detector sees every text in a single ``predict_proba`` call and
+        MarBERT runs one forward pass over the in-domain subset, so results are
+        identical to calling ``predict_intent`` per text.
+        
+        When the cache is enabled, texts that were already classified (same
+        model version and threshold) skip both stages.
+        
+        Args:
+            texts: Input texts to classify.
+            ood_threshold: Threshold for OOD detection (see ``predict_intent``).
+            normalized: Precomputed ``normalize_batch(texts)`` output.
+        
+        Returns:
+            List of (intent_label, confidence_dict), in the order of ``texts``.
+        """
         if ood_threshold is None:
             ood_threshold = self.DEFAULT_OOD_THRESHOLD
         
-        # Clean the text
-        cleaned = self.clean_text(text)
+        if not texts:
+            return []
+        results: List[Optional[Tuple[str, Dict]]] = [None] * len(texts)
+        
+        # Clean the texts (reuse the caller's normalization when available)
+        if normalized is None:
+            normalized = normalize_batch(texts)
+        cleaned = [item.cleaned for item in normalized]
+        
+        # Serve repeated messages from the cache. MarBERT sees the raw text, so
+        # the key is the raw text: two texts with the same cleaned form can
+        # still get different intent labels.
+        keys = None
+        if self.cache is not None:
+            keys = [(text, self.model_version, ood_threshold) for text in texts]
+            for i, key in enumerate(keys):
+                results[i] = self.cache.get(key)
         
         # Stage 1: OOD detection
-        p_ood = None
-        if hasattr(self.ood_detector, "predict_proba") and ood_threshold is not None:
-            probs = self.ood_detector.predict_proba([cleaned])[0]
+        p_oods: List[Optional[float]] = [None] * len(texts)
+        todo = [i for i, result in enumerate(results) if result is None]
+        if todo and hasattr(self.ood_detector, "predict_proba") and ood_threshold is not None:
+            probs = self.ood_detector.predict_proba([cleaned[i] for i in todo])
             classes = list(self.ood_detector.classes_)
             idx_ood = classes.index("out_of_domain")
-            p_ood = float(probs[idx_ood])
             
-            if p_ood >= ood_threshold:
-                return self.INTENT_OUT_OF_CONTEXT, {
-                    "stage": "ood",
-                    "p_ood": round(p_ood, 2)
-                }
+            for i, row in zip(todo, probs):
+                p_ood = float(row[idx_ood])
+                p_oods[i] = p_ood
+                if p_ood >= ood_threshold:
+                    results[i] = (self.INTENT_OUT_OF_CONTEXT, {
+                        "stage": "ood",
+                        "p_ood": round(p_ood, 2)
+                    })
+        
+        # Stage 2: MarBERT intent classification (in-domain texts only)
+        pending = [i for i in todo if results[i] is None]
+        if pending:
+            probs = self._intent_probs([texts[i] for i in pending])
+            
+            for row, i in zip(probs, pending):
+                pred_id = int(np.argmax(row))
+                p_ood = p_oods[i]
+                results[i] = (self.id_to_label[pred_id], {
+                    "stage": "intent",
+                    "p_ood": round(p_ood, 2) if p_ood is not None else None,
+                    "p_intent": round(float(row[pred_id]), 2)
+                })
+        
+        if keys is not None:
+            for i in todo:
+                self.cache.put(keys[i], results[i])
+        
+        return results
+    
+    def _intent_probs(self, texts: List[str]) -> np.ndarray:
+        """Run MarBERT on the configured engine and return class probabilities."""
+        encoding = self._encode(texts)
         
-        # Stage 2: MarBERT intent classification
-        encoding = self.tokenizer(
-            text,
-            add_special_tokens=True,
-            max_length=128,
-            truncation=True,
-            padding="max_length",
-            return_tensors="pt"
-        )
-        encoding = {k: v.to(self.device) for k, v in encoding.items()}
+        if self.engine != "torch":
+            return self.model.predict_proba(encoding)
         
+        import torch
+        encoding = {k: v.to(self.device) for k, v in encoding.items()}
         with torch.no_grad():
             logits = self.model(**encoding).logits
-            probs = torch.softmax(logits, dim=-1)[0].cpu().numpy()
+            return torch.softmax(logits, dim=-1).cpu().numpy()
+    
+    @property
+    def _tensor_type(self) -> str:
+        """Tokenizer output type: torch tensors for PyTorch, numpy for ONNX Runtime."""
+        return "pt" if self.engine == "torch" else "np"
+    
+    def _bucket_length(self, length: int) -> int:
+        """Return the smallest length bucket that fits ``length`` tokens."""
+        for bucket in self.LENGTH_BUCKETS:
+            if length <= bucket:
+                return bucket
+        return self.MAX_SEQ_LENGTH
+    
+    def _encode(self, texts: List[str]) -> Dict:
+        """
+        Tokenize texts for MarBERT using the configured padding strategy.
         
-        pred_id = int(np.argmax(probs))
-        pred_label = self.id_to_label[pred_id]
-        p_intent = float(probs[pred_id])
+        Padded positions are masked out by the attention mask, so every
+        strategy yields the same predictions; shorter padding only saves compute.
+        """
+        if self.padding == "max_length":
+            return self.tokenizer(
+                texts,
+                add_special_tokens=True,
+                max_length=self.MAX_SEQ_LENGTH,
+                truncation=True,
+                padding="max_length",
+                return_tensors=self._tensor_type
+            )
         
-        return pred_label, {
-            "stage": "intent",
-            "p_ood": round(p_ood, 2) if p_ood is not None else None,
-            "p_intent": round(p_intent, 2)
-        }
+        encoding = self.tokenizer(
+            texts,
+            add_special_tokens=True,
+            max_length=self.MAX_SEQ_LENGTH,
+            truncation=True,
+            padding=False
+        )
+        longest = max(len(ids) for ids in encoding["input_ids"])
+        if self.padding == "bucket":
+            longest = self._bucket_length(longest)
+        
+        return self.tokenizer.pad(
+            encoding,
+            padding="max_length",
+            max_length=longest,
+            return_tensors=self._tensor_type
+        )
     
     def is_harm_intent(self, text: str) -> bool:
         """
@@ -0,0 +1,181 @@
+"""
+Dynamic micro-batching for the Amal intent classifier.
+Collects concurrent predict_intent calls into one OOD + MarBERT pass.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple
+
+from text_normalizer import NormalizedText, normalize
+
+
+class IntentBatcher:
+    """
+    Cross-request batching engine in front of IntentBackend.
+
+    Callers block on ``predict_intent`` exactly as they would on the backend.
+    A single worker thread gathers requests arriving within ``window_ms`` (or
+    until ``max_batch_size`` is reached), runs them through
+    ``IntentBackend._predict_batch`` and hands each caller its own result.
+    """
+
+    # Defaults tuned for CPU nodes (small window, moderate batch)
+    DEFAULT_WINDOW_MS = 5.0
+    DEFAULT_MAX_BATCH_SIZE = 32
+
+    def __init__(
+        self,
+        intent_backend,
+        window_ms: float = DEFAULT_WINDOW_MS,
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE
+    ):
+        """
+        Initialize the batcher and start its worker thread.
+
+        Args:
+            intent_backend: Loaded IntentBackend instance.
+            window_ms: How long to wait for more requests after the first one.
+            max_batch_size: Maximum number of texts per model pass.
+        """
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be >= 1")
+
+        self.intent_backend = intent_backend
+        self.window_ms = window_ms
+        self.max_batch_size = max_batch_size
+
+        self._queue: "queue.Queue[Tuple[str, Optional[float], Optional[NormalizedText], Future]]" = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._stats = {"requests": 0, "batches": 0, "max_batch": 0}
+        # Guards _closed together with the queue, so nothing is queued after the stop sentinel
+        self._lock = threading.Lock()
+        self._closed = False
+
+        self._worker = threading.Thread(
+            target=self._run, name="intent-batcher", daemon=True
+        )
+        self._worker.start()
+
+    def submit(
+        self,
+        text: str,
+        ood_threshold: Optional[float] = None,
+        normalized: Optional[NormalizedText] = None
+    ) -> Future:
+        """
+        Queue a text for classification.
+
+        Args:
+            text: Input text to classify.
+            ood_threshold: Threshold for OOD detection.
+            normalized: Precomputed ``normalize(text)`` output.
+
+        Returns:
+            Future resolving to (intent_label, confidence_dict).
+
+        Raises:
+            RuntimeError: If the batcher is closed.
+        """
+        future: Future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("IntentBatcher is closed")
+            self._queue.put((text, ood_threshold, normalized, future))
+        return future
+
+    def predict_intent(
+        self,
+        text: str,
+        ood_threshold: Optional[float] = None,
+        normalized: Optional[NormalizedText] = None
+    ) -> Tuple[str, Dict]:
+        """Same contract as IntentBackend.predict_intent, served in batches."""
+        return self.submit(text, ood_threshold, normalized).result()
+
+    def close(self, timeout: Optional[float] = None):
+        """Stop the worker after draining requests already queued."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._worker.join(timeout)
+
+    def get_stats(self) -> Dict:
+        """Return request/batch counters and the mean batch size."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["mean_batch"] = (
+            round(stats["requests"] / stats["batches"], 2) if stats["batches"] else 0.0
+        )
+        return stats
+
+    def _collect(self) -> Tuple[List, bool]:
+        """Block for the first request, then gather more until the window closes."""
+        first = self._queue.get()
+        if first is None:
+            return [], True
+
+        batch = [first]
+        deadline = time.perf_counter() + self.window_ms / 1000.0
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self):
+        """Worker loop: collect, classify, fan results back out."""
+        stop = False
+        try:
+            while not stop:
+                batch, stop = self._collect()
+                if batch:
+                    self._process(batch)
+        finally:
+            self._fail_pending()
+
+    def _fail_pending(self):
+        """Fail requests still queued once the worker stops, so no caller waits forever."""
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if item is not None:
+                item[3].set_exception(RuntimeError("IntentBatcher is closed"))
+
+    def _process(self, batch: List):
+        """Run one batch, grouping by threshold so each caller gets its own semantics."""
+        with self._stats_lock:
+            self._stats["requests"] += len(batch)
+            self._stats["batches"] += 1
+            self._stats["max_batch"] = max(self._stats["max_batch"], len(batch))
+
+        groups: Dict[Optional[float], List] = {}
+        for item in batch:
+            groups.setdefault(item[1], []).append(item)
+
+        for ood_threshold, items in groups.items():
+            try:
+                results = self.intent_backend._predict_batch(
+                    [text for text, _, _, _ in items],
+                    ood_threshold,
+                    [n if n is not None else normalize(text) for text, _, n, _ in items]
+                )
+            except Exception as e:
+                for _, _, _, future in items:
+                    future.set_exception(e)
+                continue
+            for (_, _, _, future), result in zip(items, results):
+                future.set_result(result)
@@ -0,0 +1,112 @@
+"""
+Thread-safe LRU/TTL cache for intent classification results.
+Bounded by entry count and approximate memory; exposes hit/miss/eviction counters.
+"""
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Tuple
+
+
+class IntentCache:
+    """LRU cache with per-entry TTL and a memory bound, safe for concurrent use."""
+
+    DEFAULT_MAX_ENTRIES = 10000
+    DEFAULT_TTL_SECONDS = 3600.0
+    DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+
+    def __init__(
+        self,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        ttl_seconds: Optional[float] = DEFAULT_TTL_SECONDS,
+        max_bytes: int = DEFAULT_MAX_BYTES
+    ):
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries: Maximum number of cached results.
+            ttl_seconds: Entry lifetime in seconds (None = no expiry).
+            max_bytes: Approximate memory bound for keys and values.
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+
+        # key -> (expires_at, size_bytes, value)
+        self._entries: "OrderedDict[Hashable, Tuple[float, int, Tuple[str, Dict]]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    @staticmethod
+    def _sizeof(key: Hashable, value: Tuple[str, Dict]) -> int:
+        """Rough memory footprint of one entry."""
+        label, confidence = value
+        size = sys.getsizeof(key) + sys.getsizeof(label) + sys.getsizeof(confidence)
+        if isinstance(key, tuple):
+            size += sum(sys.getsizeof(part) for part in key)
+        return size
+
+    def get(self, key: Hashable) -> Optional[Tuple[str, Dict]]:
+        """Return a copy of the cached result, or None on miss/expiry."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+
+            expires_at, size, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self._bytes -= size
+                self._stats["expirations"] += 1
+                self._stats["misses"] += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+
+        label, confidence = value
+        return label, dict(confidence)
+
+    def put(self, key: Hashable, value: Tuple[str, Dict]):
+        """Store a result, evicting least-recently-used entries past the bounds."""
+        label, confidence = value
+        value = (label, dict(confidence))
+        size = self._sizeof(key, value)
+        if size > self.max_bytes:
+            return
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds else float("inf")
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+
+            self._entries[key] = (expires_at, size, value)
+            self._bytes += size
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self._stats["evictions"] += 1
+
+    def clear(self):
+        """Drop every entry (e.g. after a model reload)."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._stats["invalidations"] += 1
+
+    def get_stats(self) -> Dict:
+        """Return counters plus current size and hit rate for monitoring."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["bytes"] = self._bytes
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
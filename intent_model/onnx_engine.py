@@ -0,0 +1,220 @@
+"""
+ONNX Runtime inference engine for the MarBERT intent classifier.
+Exports the fine-tuned model once (optionally INT8-quantized) and serves it on CPU.
+
+Usage:
+    python onnx_engine.py export                     # FP32 + dynamic INT8
+    python onnx_engine.py compare --held-out held_out.txt
+"""
+
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Default export location, next to the PyTorch checkpoint
+DEFAULT_BASE_DIR = Path(__file__).parent / "incontext_marbret_approach"
+ONNX_DIR_NAME = "marbret_intent_classifier_onnx"
+FP32_FILE = "model.onnx"
+INT8_FILE = "model.int8.onnx"
+
+# Inputs produced by the MarBERT tokenizer
+MODEL_INPUTS = ["input_ids", "attention_mask", "token_type_ids"]
+
+
+def onnx_paths(base_dir: Optional[Path] = None) -> Dict[str, Path]:
+    """Return the FP32 and INT8 model paths for a model base directory."""
+    onnx_dir = Path(base_dir or DEFAULT_BASE_DIR) / ONNX_DIR_NAME
+    return {"onnx": onnx_dir / FP32_FILE, "onnx-int8": onnx_dir / INT8_FILE}
+
+
+def export_onnx(base_dir: Optional[Path] = None, quantize: bool = True, opset: int = 17) -> Dict[str, Path]:
+    """
+    Export marbret_intent_classifier to ONNX with dynamic batch/sequence axes.
+
+    Args:
+        base_dir: Directory containing 'marbret_intent_classifier'.
+        quantize: Also write a dynamically INT8-quantized copy.
+        opset: ONNX opset version.
+
+    Returns:
+        Dict mapping engine name to the written model path.
+    """
+    import torch
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+    base_dir = Path(base_dir or DEFAULT_BASE_DIR)
+    model_dir = base_dir / "marbret_intent_classifier"
+    paths = onnx_paths(base_dir)
+    paths["onnx"].parent.mkdir(parents=True, exist_ok=True)
+
+    print(f"Exporting {model_dir} to ONNX...")
+    tokenizer = AutoTokenizer.from_pretrained(str(model_dir))
+    model = AutoModelForSequenceClassification.from_pretrained(str(model_dir))
+    model.eval()
+
+    sample = tokenizer(["تصدير النموذج"], return_tensors="pt")
+    input_names = [name for name in MODEL_INPUTS if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["logits"] = {0: "batch"}
+
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in input_names),
+            str(paths["onnx"]),
+            input_names=input_names,
+            output_names=["logits"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+            do_constant_folding=True
+        )
+    print(f"✓ FP32 model written to {paths['onnx']}")
+
+    written = {"onnx": paths["onnx"]}
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(str(paths["onnx"]), str(paths["onnx-int8"]), weight_type=QuantType.QInt8)
+        print(f"✓ INT8 model written to {paths['onnx-int8']}")
+        written["onnx-int8"] = paths["onnx-int8"]
+
+    return written
+
+
+class OnnxIntentModel:
+    """ONNX Runtime session wrapper returning MarBERT intent probabilities."""
+
+    def __init__(self, model_path: Path, num_threads: Optional[int] = None):
+        """
+        Load an exported MarBERT ONNX model.
+
+        Args:
+            model_path: Path to model.onnx or model.int8.onnx.
+            num_threads: Intra-op threads (defaults to ONNX Runtime's choice).
+        """
+        import onnxruntime as ort
+
+        if not Path(model_path).exists():
+            raise FileNotFoundError(
+                f"ONNX model not found at {model_path}. Run 'python onnx_engine.py export' first."
+            )
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+
+        self.session = ort.InferenceSession(
+            str(model_path), sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+    def predict_proba(self, encoding: Dict) -> np.ndarray:
+        """Run the classifier on a tokenizer encoding and return softmax probabilities."""
+        feed = {
+            name: np.asarray(encoding[name].numpy() if hasattr(encoding[name], "numpy") else encoding[name], dtype=np.int64)
+            for name in self.input_names
+        }
+        logits = self.session.run(["logits"], feed)[0]
+        logits = logits - logits.max(axis=-1, keepdims=True)
+        exp = np.exp(logits)
+        return exp / exp.sum(axis=-1, keepdims=True)
+
+
+def _read_texts(path: Optional[str]) -> List[str]:
+    """Load one message per line, or fall back to the built-in samples."""
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            return [line.strip() for line in f if line.strip()]
+    from benchmark_batching import SAMPLE_MESSAGES
+    return list(SAMPLE_MESSAGES)
+
+
+def profile(engine: str, texts: List[str], repeats: int) -> Dict:
+    """Load one engine in this process and measure labels, latency and peak RSS."""
+    from intent_backend import IntentBackend
+
+    backend = IntentBackend(engine=engine, cache_max_entries=0)
+    labels = [label for label, _ in backend.predict_intents(texts)]
+
+    timings = []
+    for _ in range(repeats):
+        for text in texts:
+            start = time.perf_counter()
+            backend._intent_probs([text])
+            timings.append(time.perf_counter() - start)
+
+    lat_ms = np.array(timings) * 1000.0
+    return {
+        "engine": engine,
+        "labels": labels,
+        "p50_ms": float(np.percentile(lat_ms, 50)),
+        "p95_ms": float(np.percentile(lat_ms, 95)),
+        # ru_maxrss is reported in KiB on Linux
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+    }
+
+
+def compare(engines: List[str], held_out: Optional[str], repeats: int) -> bool:
+    """Profile each engine in a fresh process and report parity, latency and memory."""
+    reports = []
+    for engine in engines:
+        cmd = [sys.executable, __file__, "profile", "--engine", engine, "--repeats", str(repeats)]
+        if held_out:
+            cmd += ["--held-out", held_out]
+        output = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+        reports.append(json.loads(output.strip().splitlines()[-1]))
+
+    reference = reports[0]
+    print("\n" + "=" * 60)
+    print(f"Engine comparison (reference: {reference['engine']}, {len(reference['labels'])} messages)")
+    print("=" * 60)
+    print(f"{'engine':<11}{'agreement':>11}{'p50 ms':>9}{'p95 ms':>9}{'speedup':>9}{'RSS MB':>9}")
+
+    ok = True
+    for report in reports:
+        agree = np.mean([a == b for a, b in zip(report["labels"], reference["labels"])])
+        speedup = reference["p50_ms"] / report["p50_ms"]
+        print(f"{report['engine']:<11}{agree:>10.1%}{report['p50_ms']:>9.2f}{report['p95_ms']:>9.2f}"
+              f"{speedup:>8.2f}x{report['max_rss_mb']:>9.0f}")
+        ok = ok and agree == 1.0
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    export_cmd = sub.add_parser("export", help="Export MarBERT to ONNX")
+    export_cmd.add_argument("--no-quantize", action="store_true")
+    export_cmd.add_argument("--opset", type=int, default=17)
+
+    compare_cmd = sub.add_parser("compare", help="Parity + latency/memory report")
+    compare_cmd.add_argument("--engines", nargs="+", default=["torch", "onnx", "onnx-int8"])
+    compare_cmd.add_argument("--held-out", help="One message per line")
+    compare_cmd.add_argument("--repeats", type=int, default=5)
+
+    profile_cmd = sub.add_parser("profile", help=argparse.SUPPRESS)
+    profile_cmd.add_argument("--engine", required=True)
+    profile_cmd.add_argument("--held-out")
+    profile_cmd.add_argument("--repeats", type=int, default=5)
+
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export_onnx(quantize=not args.no_quantize, opset=args.opset)
+    elif args.command == "compare":
+        sys.exit(0 if compare(args.engines, args.held_out, args.repeats) else 1)
+    else:
+        print(json.dumps(profile(args.engine, _read_texts(args.held_out), args.repeats)))
+
+
+if __name__ == "__main__":
+    main()
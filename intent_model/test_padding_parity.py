@@ -0,0 +1,70 @@
+"""
+Label parity between MarBERT padding strategies.
+
+Padded positions are masked out, so 'bucket' and 'longest' must give the same
+labels as the legacy padding="max_length" path. Skipped when torch,
+transformers or the fine-tuned MarBERT weights are not available.
+
+Usage:
+    python -m pytest test_padding_parity.py
+"""
+
+from pathlib import Path
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("torch")
+pytest.importorskip("transformers")
+pytest.importorskip("joblib")
+
+MODEL_DIR = Path(__file__).parent / "incontext_marbret_approach" / "marbret_intent_classifier"
+WEIGHT_FILES = ("model.safetensors", "pytorch_model.bin")
+
+# Short, long and mixed-script messages, plus one past MAX_SEQ_LENGTH (truncated)
+MESSAGES = [
+    "حاب نبرا من لادروك عاونوني",
+    "ما هي أعراض انسحاب الكوكايين؟",
+    "راني حاب نشرب قاع الدوا لي عندي باش نرقد وما نوضش",
+    "كيفاش راهي حالة الطقس في وهران؟",
+    "win kayen centre d'addictologie f dzayer?",
+    "ma3andich l'espoir f lhayat, nhab nmout",
+    "je veux arrêter le cannabis, aidez-moi",
+    "what are the withdrawal symptoms of heroin?",
+    "سلام",
+    " ".join(["الإدمان"] * 200),
+]
+
+
+@pytest.fixture(scope="module")
+def backend():
+    if not any((MODEL_DIR / name).exists() for name in WEIGHT_FILES):
+        pytest.skip(f"MarBERT weights not found in {MODEL_DIR}")
+    from intent_backend import IntentBackend
+
+    # Cache off so every strategy actually runs MarBERT
+    return IntentBackend(cache_max_entries=0)
+
+
+def _run(backend, strategy, fn):
+    original = backend.padding
+    backend.padding = strategy
+    try:
+        return fn()
+    finally:
+        backend.padding = original
+
+
+@pytest.mark.parametrize("strategy", ["bucket", "longest"])
+def test_intent_probs_match_max_length(backend, strategy):
+    reference = _run(backend, "max_length", lambda: backend._intent_probs(MESSAGES))
+    probs = _run(backend, strategy, lambda: backend._intent_probs(MESSAGES))
+    assert list(np.argmax(probs, axis=1)) == list(np.argmax(reference, axis=1))
+    np.testing.assert_allclose(probs, reference, atol=1e-4)
+
+
+@pytest.mark.parametrize("strategy", ["bucket", "longest"])
+def test_pipeline_labels_match_max_length(backend, strategy):
+    reference = _run(backend, "max_length", lambda: backend._predict_batch(MESSAGES))
+    results = _run(backend, strategy, lambda: backend._predict_batch(MESSAGES))
+    assert [label for label, _ in results] == [label for label, _ in reference]
@@ -0,0 +1,81 @@
+"""
+Golden outputs for text_normalizer, and equivalence with the per-step
+implementations it replaced (IntentBackend.clean_text and the script
+counting in AmalBackend.detect_language).
+
+Usage:
+    python -m pytest test_text_normalizer.py
+"""
+
+import re
+
+import pytest
+
+from text_normalizer import normalize, normalize_batch
+
+# (input, expected cleaned text)
+GOLDEN_CASES = [
+    ("حاب نبرا من لادروك عاونوني", "حاب نبرا من لادروك عاونوني"),
+    ("ما هي أعراض انسحاب الكوكايين؟", "ما هي اعراض انسحاب الكوكايين؟"),
+    ("إدمانٌ قاتلٌ", "ادمان قاتل"),
+    ("مسؤول عن هذه المشكلة", "مسءول عن هذه المشكله"),
+    ("رانييييي تعبااااان", "رانيي تعباان"),
+    ("Je veux ARRÊTER!!! 😢😢", "je veux arrêter"),
+    ("win kayen centre d'addictologie f dzayer?", "win kayen centre d addictologie f dzayer"),
+    ("ma3andich l'espoir f lhayat, nhab nmout", "ma3andich l espoir f lhayat nhab nmout"),
+    ("شوف https://example.com/page و www.test.dz برك", "شوف و برك"),
+    ("  \t  سلام\n\n  cv  ", "سلام cv"),
+    ("گاع الناس", "كاع الناس"),
+    ("", ""),
+]
+
+
+def legacy_clean_text(text: str) -> str:
+    """IntentBackend.clean_text before text_normalizer (reference implementation)."""
+    if not isinstance(text, str):
+        return ""
+    text = text.lower()
+    text = re.sub(r'http\S+|www\S+|https\S+', '', text, flags=re.MULTILINE)
+    text = re.sub(r'[^\w\s\u0600-\u06FF]', ' ', text)
+    text = re.sub("[إأآا]", "ا", text)
+    text = re.sub("ى", "ي", text)
+    text = re.sub("ؤ", "ء", text)
+    text = re.sub("ئ", "ء", text)
+    text = re.sub("ة", "ه", text)
+    text = re.sub("گ", "ك", text)
+    tashkeel = re.compile(r'[\u064B-\u0652]')
+    text = re.sub(tashkeel, "", text)
+    text = re.sub(r'(.)\1+', r'\1\1', text)
+    text = re.sub(r'\s+', ' ', text).strip()
+    return text
+
+
+def legacy_script_counts(text: str):
+    """Script counting from AmalBackend.detect_language before text_normalizer."""
+    return len(re.findall(r'[\u0600-\u06FF]', text)), len(re.findall(r'[a-zA-Z]', text))
+
+
+@pytest.mark.parametrize("text, expected", GOLDEN_CASES)
+def test_golden_cleaned_text(text, expected):
+    assert normalize(text).cleaned == expected
+
+
+@pytest.mark.parametrize("text, expected", GOLDEN_CASES)
+def test_matches_legacy_clean_text(text, expected):
+    assert legacy_clean_text(text) == expected
+    assert normalize(text).cleaned == legacy_clean_text(text)
+
+
+@pytest.mark.parametrize("text", [text for text, _ in GOLDEN_CASES])
+def test_matches_legacy_script_counts(text):
+    result = normalize(text)
+    assert (result.arabic_chars, result.latin_chars) == legacy_script_counts(text)
+
+
+def test_batch_matches_single():
+    texts = [text for text, _ in GOLDEN_CASES]
+    assert normalize_batch(texts) == [normalize(text) for text in texts]
+
+
+def test_non_string_input_is_empty():
+    assert normalize(None).cleaned == legacy_clean_text(None) == ""
@@ -0,0 +1,114 @@
+"""
+Shared text normalization for Amal (Arabic/French/Darija).
+One precompiled pass produces the cleaned text used by the intent and OOD
+models together with the script counts used for language detection.
+"""
+
+import re
+from typing import Iterable, List, NamedTuple
+
+# URLs are dropped before anything else
+_URL_RE = re.compile(r'http\S+|www\S+|https\S+', flags=re.MULTILINE)
+
+# Characters kept as-is by the cleaner (everything else becomes a space)
+_KEEP_RE = re.compile(r'[\w\s\u0600-\u06FF]')
+
+# Runs of 3+ identical characters are collapsed to 2
+_ELONGATION_RE = re.compile(r'(.)\1+')
+
+# Arabic letter folding
+_ARABIC_FOLDING = {
+    "إ": "ا", "أ": "ا", "آ": "ا",
+    "ى": "ي",
+    "ؤ": "ء", "ئ": "ء",
+    "ة": "ه",
+    "گ": "ك",
+}
+
+# Tashkeel (Arabic diacritics)
+_TASHKEEL = range(0x064B, 0x0653)
+
+
+class _CleanTable(dict):
+    """
+    str.translate table for the cleaner, filled lazily per code point.
+
+    Combines punctuation/emoji removal, Arabic folding and tashkeel stripping
+    so they cost a single C-level translate call.
+    """
+
+    def __missing__(self, code: int):
+        char = chr(code)
+        if code in _TASHKEEL:
+            value = None
+        elif char in _ARABIC_FOLDING:
+            value = _ARABIC_FOLDING[char]
+        elif _KEEP_RE.match(char):
+            value = code
+        else:
+            value = " "
+        self[code] = value
+        return value
+
+
+class _ScriptTable(dict):
+    """str.translate table mapping Arabic letters to 'A', ASCII letters to 'L', dropping the rest."""
+
+    def __missing__(self, code: int):
+        if 0x0600 <= code <= 0x06FF:
+            value = "A"
+        elif (0x41 <= code <= 0x5A) or (0x61 <= code <= 0x7A):
+            value = "L"
+        else:
+            value = None
+        self[code] = value
+        return value
+
+
+_CLEAN_TABLE = _CleanTable()
+_SCRIPT_TABLE = _ScriptTable()
+
+
+class NormalizedText(NamedTuple):
+    """Normalization output shared by the intent, OOD and language detection stages."""
+
+    cleaned: str        # Model input (lowercased, folded, no URLs/diacritics/elongation)
+    lowered: str        # Raw text lowercased (used for word-level language cues)
+    arabic_chars: int   # Characters in U+0600..U+06FF of the raw text
+    latin_chars: int    # ASCII letters of the raw text
+
+
+EMPTY = NormalizedText("", "", 0, 0)
+
+
+def normalize(text: str) -> NormalizedText:
+    """
+    Normalize a message once for every downstream consumer.
+
+    Args:
+        text: Raw user message.
+
+    Returns:
+        NormalizedText with the cleaned text and script counts.
+    """
+    if not isinstance(text, str):
+        return EMPTY
+
+    lowered = text.lower()
+
+    cleaned = lowered
+    if "http" in cleaned or "www" in cleaned:
+        cleaned = _URL_RE.sub("", cleaned)
+    cleaned = cleaned.translate(_CLEAN_TABLE)
+    cleaned = _ELONGATION_RE.sub(r"\1\1", cleaned)
+    cleaned = " ".join(cleaned.split())
+
+    scripts = text.translate(_SCRIPT_TABLE)
+    arabic_chars = scripts.count("A")
+
+    return NormalizedText(cleaned, lowered, arabic_chars, len(scripts) - arabic_chars)
+
+
+def normalize_batch(texts: Iterable[str]) -> List[NormalizedText]:
+    """Normalize a list of messages (shares the precompiled tables across items)."""
+    return [normalize(text) for text in texts]
@@ -0,0 +1,216 @@
+"""
+Generation throughput: one ``model.generate`` per request vs the continuous-batching scheduler.
+
+Runs on CPU with a small randomly initialised Qwen2 stand-in. It uses the
+adapter's tokenizer, so the shapes (vocabulary, chat template, prompt lengths)
+are realistic without the 7B download. For each concurrency level, that many
+client threads each send --rounds requests. Reply lengths and sampling
+parameters vary per request, so conversations join and leave the running batch
+at different steps. Replies run to their full length (EOS is ignored) so both
+modes generate the same number of tokens.
+
+Usage:
+    python benchmark_generation.py
+    python benchmark_generation.py --concurrency 1 4 16 64 --max-new-tokens 64
+    python benchmark_generation.py --check   # greedy outputs must match model.generate
+"""
+
+import argparse
+import random
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+import torch
+from transformers import AutoTokenizer, Qwen2Config, Qwen2ForCausalLM
+
+from generation_scheduler import GenerationScheduler
+
+DEFAULT_TOKENIZER_DIR = Path(__file__).parent / "working" / "phase3-final"
+
+MESSAGES = [
+    "راني تعبت من الإدمان، حاب نبرا",
+    "ما هي أعراض انسحاب الكحول؟",
+    "je me sens seul et déprimé",
+    "Comment parler à ma famille de mon addiction sans qu'ils me rejettent ?",
+    "I relapsed last night after three months clean and I feel like a failure.",
+    "صاحبي يتعاطى وما نعرفش كيفاش نعاونو",
+    "Quels centres de désintoxication existent à Alger ?",
+    "How do I handle cravings at night?",
+]
+
+SYSTEM_PROMPT = ("You are a support assistant specialized in helping people struggling with drug addiction "
+                 "in Algeria. You are empathetic, patient, and non-judgmental.")
+
+
+def build_standin_model(tokenizer, seed: int = 0, hidden_size: int = 256, layers: int = 4):
+    """Small random Qwen2 causal LM sharing the real vocabulary."""
+    torch.manual_seed(seed)
+    config = Qwen2Config(
+        vocab_size=len(tokenizer),
+        hidden_size=hidden_size,
+        intermediate_size=hidden_size * 2,
+        num_hidden_layers=layers,
+        num_attention_heads=4,
+        num_key_value_heads=2,
+        max_position_embeddings=4096,
+        tie_word_embeddings=True,
+        eos_token_id=tokenizer.eos_token_id,
+        pad_token_id=tokenizer.pad_token_id,
+    )
+    return Qwen2ForCausalLM(config).eval()
+
+
+def build_prompts(tokenizer) -> List[List[int]]:
+    prompts = []
+    for message in MESSAGES:
+        messages = [{"role": "system", "content": SYSTEM_PROMPT}, {"role": "user", "content": message}]
+        text = tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+        prompts.append(tokenizer(text)["input_ids"])
+    return prompts
+
+
+def build_workload(prompts: List[List[int]], n: int, max_new_tokens: int, seed: int) -> List[Dict]:
+    """Requests with varied prompts, reply lengths and sampling parameters."""
+    rng = random.Random(seed)
+    return [
+        {
+            "input_ids": rng.choice(prompts),
+            "max_new_tokens": rng.randint(max(1, max_new_tokens // 2), max_new_tokens),
+            "temperature": rng.choice([0.7, 1.0]),
+            "top_p": rng.choice([0.9, 0.95]),
+        }
+        for _ in range(n)
+    ]
+
+
+def run_clients(workload: List[Dict], concurrency: int, send) -> Tuple[float, int, List[float]]:
+    """Split the workload over ``concurrency`` threads; returns (seconds, tokens, latencies)."""
+    tokens, latencies = [0], []
+    lock = threading.Lock()
+
+    def client(requests: List[Dict]):
+        for request in requests:
+            start = time.perf_counter()
+            generated = send(request)
+            with lock:
+                tokens[0] += generated
+                latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=client, args=(workload[i::concurrency],)) for i in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, tokens[0], latencies
+
+
+def check_greedy(model, tokenizer, prompts: List[List[int]], max_new_tokens: int) -> int:
+    """Number of prompts whose batched greedy reply equals ``model.generate``'s."""
+    scheduler = GenerationScheduler(model, tokenizer, max_batch_size=len(prompts))
+    handles = [scheduler.submit(ids, max_new_tokens=max_new_tokens, do_sample=False, stop_token_ids=[])
+               for ids in prompts]
+    for handle in handles:
+        handle.result()
+    scheduler.close()
+
+    matches = 0
+    with torch.no_grad():
+        for ids, handle in zip(prompts, handles):
+            output = model.generate(
+                torch.tensor([ids]),
+                attention_mask=torch.ones((1, len(ids)), dtype=torch.long),
+                max_new_tokens=max_new_tokens,
+                min_new_tokens=max_new_tokens,
+                do_sample=False,
+                pad_token_id=tokenizer.pad_token_id
+            )
+            matches += output[0, len(ids):].tolist() == handle.token_ids
+    return matches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokenizer-dir", default=str(DEFAULT_TOKENIZER_DIR))
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--rounds", type=int, default=2, help="requests per client thread")
+    parser.add_argument("--max-new-tokens", type=int, default=48)
+    parser.add_argument("--max-batch-size", type=int, default=64)
+    parser.add_argument("--hidden-size", type=int, default=256)
+    parser.add_argument("--layers", type=int, default=4)
+    parser.add_argument("--skip-unbatched", action="store_true", help="only measure the scheduler")
+    parser.add_argument("--check", action="store_true", help="verify greedy parity with model.generate")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    tokenizer = AutoTokenizer.from_pretrained(args.tokenizer_dir)
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    model = build_standin_model(tokenizer, args.seed, args.hidden_size, args.layers)
+    prompts = build_prompts(tokenizer)
+    params = sum(p.numel() for p in model.parameters()) / 1e6
+    print(f"Stand-in model: {params:.1f}M params, {args.layers} layers, "
+          f"prompts {min(map(len, prompts))}-{max(map(len, prompts))} tokens, {torch.get_num_threads()} threads")
+
+    if args.check:
+        matches = check_greedy(model, tokenizer, prompts, args.max_new_tokens)
+        print(f"{'✓' if matches == len(prompts) else '⚠'} Greedy parity: {matches}/{len(prompts)} replies "
+              f"identical to model.generate")
+
+    def unbatched(request: Dict) -> int:
+        ids = request["input_ids"]
+        with torch.no_grad():
+            output = model.generate(
+                torch.tensor([ids]),
+                attention_mask=torch.ones((1, len(ids)), dtype=torch.long),
+                max_new_tokens=request["max_new_tokens"],
+                min_new_tokens=request["max_new_tokens"],
+                temperature=request["temperature"],
+                top_p=request["top_p"],
+                do_sample=True,
+                pad_token_id=tokenizer.pad_token_id
+            )
+        return output.shape[1] - len(ids)
+
+    print("\n" + "=" * 78)
+    print(f"Generation throughput (max_new_tokens <= {args.max_new_tokens}, {args.rounds} requests per client)")
+    print("=" * 78)
+    print(f"{'clients':>8}{'mode':>11}{'requests':>10}{'tokens':>8}{'tok/s':>9}"
+          f"{'p50 s':>8}{'p95 s':>8}{'mean batch':>12}")
+
+    for concurrency in args.concurrency:
+        workload = build_workload(prompts, concurrency * args.rounds, args.max_new_tokens, args.seed)
+        results = {}
+
+        if not args.skip_unbatched:
+            results["unbatched"] = run_clients(workload, concurrency, unbatched) + ("-",)
+
+        scheduler = GenerationScheduler(model, tokenizer, max_batch_size=args.max_batch_size, seed=args.seed)
+
+        def batched(request: Dict) -> int:
+            handle = scheduler.submit(
+                request["input_ids"],
+                max_new_tokens=request["max_new_tokens"],
+                temperature=request["temperature"],
+                top_p=request["top_p"],
+                stop_token_ids=[]
+            )
+            handle.result()
+            return len(handle.token_ids)
+
+        results["batched"] = run_clients(workload, concurrency, batched) + (scheduler.get_stats()["mean_batch"],)
+        scheduler.close()
+
+        for mode, (seconds, tokens, latencies, mean_batch) in results.items():
+            print(f"{concurrency:>8}{mode:>11}{len(workload):>10}{tokens:>8}{tokens / seconds:>9.1f}"
+                  f"{np.percentile(latencies, 50):>8.2f}{np.percentile(latencies, 95):>8.2f}{mean_batch:>12}")
+        if "unbatched" in results:
+            speedup = (results["batched"][1] / results["batched"][0]) / (results["unbatched"][1] / results["unbatched"][0])
+            print(f"{'':>8}{'speedup':>11}{speedup:>35.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Prefill time saved by reusing the system-prompt KV cache.
+
+Uses the stand-in model from benchmark_generation.py and the real
+``SupportBackend.DEFAULT_SYSTEM_PROMPT``. For each test message it times the
+prefill forward pass (the step before the first token) twice: over the full
+prompt, and over only the tokens after the cached system-prompt prefix. It
+then checks that greedy replies are identical with and without the prefix,
+through both ``model.generate`` and the continuous-batching scheduler.
+
+Usage:
+    python benchmark_prefix_cache.py
+    python benchmark_prefix_cache.py --layers 8 --hidden-size 512 --repeats 20
+"""
+
+import argparse
+import time
+from typing import List
+
+import numpy as np
+import torch
+from transformers import AutoTokenizer
+
+from benchmark_generation import DEFAULT_TOKENIZER_DIR, MESSAGES, build_standin_model
+from generation_scheduler import GenerationScheduler
+from kv_cache import PrefixCache, cache_length, from_legacy
+from support_backend import SupportBackend
+
+
+def time_forward(model, input_ids: List[int], repeats: int, prefix_past=None) -> float:
+    """Median milliseconds of one prefill forward pass."""
+    offset = cache_length(prefix_past) if prefix_past else 0
+    timings = []
+    with torch.no_grad():
+        for _ in range(repeats):
+            start = time.perf_counter()
+            model(
+                input_ids=torch.tensor([input_ids[offset:]]),
+                attention_mask=torch.ones((1, len(input_ids)), dtype=torch.long),
+                past_key_values=from_legacy(prefix_past) if prefix_past else None,
+                use_cache=True
+            )
+            timings.append((time.perf_counter() - start) * 1000.0)
+    return float(np.median(timings))
+
+
+def greedy_generate(model, tokenizer, input_ids: List[int], max_new_tokens: int, prefix_past=None) -> List[int]:
+    with torch.no_grad():
+        output = model.generate(
+            torch.tensor([input_ids]),
+            attention_mask=torch.ones((1, len(input_ids)), dtype=torch.long),
+            past_key_values=from_legacy(prefix_past) if prefix_past else None,
+            max_new_tokens=max_new_tokens,
+            do_sample=False,
+            pad_token_id=tokenizer.pad_token_id
+        )
+    return output[0, len(input_ids):].tolist()
+
+
+def greedy_scheduled(model, tokenizer, prompts: List[List[int]], max_new_tokens: int, prefix_past=None) -> List[List[int]]:
+    scheduler = GenerationScheduler(model, tokenizer, max_batch_size=len(prompts))
+    handles = [scheduler.submit(ids, max_new_tokens=max_new_tokens, do_sample=False, prefix_past=prefix_past)
+               for ids in prompts]
+    for handle in handles:
+        handle.result()
+    scheduler.close()
+    return [handle.token_ids for handle in handles]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokenizer-dir", default=str(DEFAULT_TOKENIZER_DIR))
+    parser.add_argument("--hidden-size", type=int, default=256)
+    parser.add_argument("--layers", type=int, default=4)
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--max-new-tokens", type=int, default=32)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    tokenizer = AutoTokenizer.from_pretrained(args.tokenizer_dir)
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    model = build_standin_model(tokenizer, args.seed, args.hidden_size, args.layers)
+
+    system = {"role": "system", "content": SupportBackend.DEFAULT_SYSTEM_PROMPT}
+    prefix_ids = tokenizer(tokenizer.apply_chat_template([system], tokenize=False))["input_ids"]
+    prompts = [
+        tokenizer(tokenizer.apply_chat_template([system, {"role": "user", "content": message}],
+                                                tokenize=False, add_generation_prompt=True))["input_ids"]
+        for message in MESSAGES
+    ]
+    if any(ids[:len(prefix_ids)] != prefix_ids for ids in prompts):
+        raise SystemExit("Prompts do not start with the system-prompt tokens; the prefix cannot be reused")
+
+    cache = PrefixCache(model)
+    prefix_past = cache.get(prefix_ids)
+    print(f"System prompt: {len(prefix_ids)} tokens, computed once in {cache.get_stats()['prefill_ms']:.1f} ms")
+
+    print("\n" + "=" * 60)
+    print(f"Prefill per request (median of {args.repeats})")
+    print("=" * 60)
+    print(f"{'prompt tokens':>14}{'full ms':>10}{'cached ms':>11}{'saved ms':>10}{'saved':>8}")
+    full_all, cached_all = [], []
+    for ids in prompts:
+        full = time_forward(model, ids, args.repeats)
+        cached = time_forward(model, ids, args.repeats, prefix_past)
+        full_all.append(full)
+        cached_all.append(cached)
+        print(f"{len(ids):>14}{full:>10.2f}{cached:>11.2f}{full - cached:>10.2f}{(full - cached) / full:>8.0%}")
+    saved = float(np.mean(full_all) - np.mean(cached_all))
+    print(f"{'mean':>14}{np.mean(full_all):>10.2f}{np.mean(cached_all):>11.2f}{saved:>10.2f}"
+          f"{saved / np.mean(full_all):>8.0%}")
+
+    generate_matches = sum(
+        greedy_generate(model, tokenizer, ids, args.max_new_tokens)
+        == greedy_generate(model, tokenizer, ids, args.max_new_tokens, prefix_past)
+        for ids in prompts
+    )
+    uncached = greedy_scheduled(model, tokenizer, prompts, args.max_new_tokens)
+    cached = greedy_scheduled(model, tokenizer, prompts, args.max_new_tokens, prefix_past)
+    scheduler_matches = sum(a == b for a, b in zip(uncached, cached))
+
+    print()
+    for name, matches in (("model.generate", generate_matches), ("scheduler", scheduler_matches)):
+        print(f"{'✓' if matches == len(prompts) else '⚠'} Greedy parity ({name}): "
+              f"{matches}/{len(prompts)} replies identical with the cached prefix")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Per-turn latency of a 20-turn support conversation with and without the session KV cache.
+
+Both runs use the stand-in model from benchmark_generation.py behind
+``SupportBackend.from_model`` and greedy decoding, so they hold the same
+conversation. Without the cache, every turn prefills the whole dialogue
+again and latency grows with its length. With the cache, a turn prefills
+only what came after the previous turn's states: the end of the last reply
+and the new message.
+
+Usage:
+    python benchmark_session_cache.py
+    python benchmark_session_cache.py --turns 20 --max-new-tokens 64 --layers 8
+"""
+
+import argparse
+import time
+from typing import List, Tuple
+
+import numpy as np
+from transformers import AutoTokenizer
+
+from benchmark_generation import DEFAULT_TOKENIZER_DIR, MESSAGES, build_standin_model
+from support_backend import SupportBackend
+
+
+def run_conversation(backend: SupportBackend, turns: int, max_new_tokens: int,
+                     session_id=None) -> Tuple[List[float], List[str]]:
+    """Per-turn seconds and replies of one conversation."""
+    history, timings, replies = [], [], []
+    for turn in range(turns):
+        start = time.perf_counter()
+        response, history = backend.chat(
+            MESSAGES[turn % len(MESSAGES)],
+            history,
+            max_new_tokens=max_new_tokens,
+            do_sample=False,
+            session_id=session_id
+        )
+        timings.append(time.perf_counter() - start)
+        replies.append(response)
+    return timings, replies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokenizer-dir", default=str(DEFAULT_TOKENIZER_DIR))
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--max-new-tokens", type=int, default=48)
+    parser.add_argument("--hidden-size", type=int, default=256)
+    parser.add_argument("--layers", type=int, default=4)
+    parser.add_argument("--max-batch-size", type=int, default=0, help="run through the batching scheduler")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    tokenizer = AutoTokenizer.from_pretrained(args.tokenizer_dir)
+    model = build_standin_model(tokenizer, args.seed, args.hidden_size, args.layers)
+
+    uncached = SupportBackend.from_model(model, tokenizer, max_batch_size=args.max_batch_size, session_cache_mb=0)
+    cached = SupportBackend.from_model(model, tokenizer, max_batch_size=args.max_batch_size)
+
+    # Warm-up (system-prompt prefix cache, allocator) outside the measurement
+    run_conversation(uncached, 1, args.max_new_tokens)
+    run_conversation(cached, 1, args.max_new_tokens)
+
+    base_timings, base_replies = run_conversation(uncached, args.turns, args.max_new_tokens)
+    timings, replies = run_conversation(cached, args.turns, args.max_new_tokens, session_id="benchmark")
+
+    print("\n" + "=" * 60)
+    print(f"{args.turns}-turn conversation (max_new_tokens {args.max_new_tokens}, greedy)")
+    print("=" * 60)
+    print(f"{'turn':>6}{'no cache ms':>14}{'session cache ms':>18}{'saved':>9}")
+    for turn, (base, with_cache) in enumerate(zip(base_timings, timings), 1):
+        print(f"{turn:>6}{base * 1000:>14.1f}{with_cache * 1000:>18.1f}{(base - with_cache) / base:>9.0%}")
+    print(f"{'mean':>6}{np.mean(base_timings) * 1000:>14.1f}{np.mean(timings) * 1000:>18.1f}"
+          f"{(np.mean(base_timings) - np.mean(timings)) / np.mean(base_timings):>9.0%}")
+
+    stats = cached.session_cache.get_stats()
+    print(f"\nSession cache: {stats['hits']} hits, {stats['tokens_reused']} tokens reused, {stats['mb']} MB held")
+    matches = sum(a == b for a, b in zip(base_replies, replies))
+    print(f"{'✓' if matches == len(replies) else '⚠'} Greedy parity: {matches}/{len(replies)} replies identical")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Speculative decoding on CPU: tokens/s, acceptance rate and greedy parity.
+
+The main model is the random Qwen2 stand-in from benchmark_generation.py,
+made deeper so that verification is the expensive step. The draft model
+shares the main model's embeddings, output head and first --draft-layers
+layers, like an early-exit head. Its proposals therefore agree with the main
+model often, without any training. Both models are served through
+``SupportBackend.from_model``, so this runs the same generate path as
+production. A real deployment would use e.g. Qwen2.5-0.5B-Instruct as the
+draft (SUPPORT_DRAFT_MODEL).
+
+Usage:
+    python benchmark_speculative.py
+    python benchmark_speculative.py --draft-tokens 2 4 8 --layers 12 --draft-layers 2
+"""
+
+import argparse
+import time
+from typing import Dict, List
+
+from transformers import AutoTokenizer, Qwen2ForCausalLM
+
+from benchmark_generation import DEFAULT_TOKENIZER_DIR, MESSAGES, build_standin_model
+from support_backend import SupportBackend
+
+
+def build_draft(model, layers: int):
+    """Early-exit draft: the main model's embeddings, first ``layers`` layers and head."""
+    config = model.config.__class__.from_dict(model.config.to_dict())
+    config.num_hidden_layers = layers
+    draft = Qwen2ForCausalLM(config)
+    draft.load_state_dict(model.state_dict(), strict=False)
+    return draft.eval()
+
+
+def run(backend: SupportBackend, max_new_tokens: int) -> Dict:
+    """Greedy replies to every test message; returns replies and tokens/s."""
+    replies: List[str] = []
+    tokens, seconds = 0, 0.0
+    for message in MESSAGES:
+        start = time.perf_counter()
+        reply = backend.generate_response(message, max_new_tokens=max_new_tokens, do_sample=False)
+        seconds += time.perf_counter() - start
+        tokens += len(backend.tokenizer(reply, add_special_tokens=False)["input_ids"])
+        replies.append(reply)
+    return {"replies": replies, "tokens_per_s": tokens / seconds}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokenizer-dir", default=str(DEFAULT_TOKENIZER_DIR))
+    parser.add_argument("--hidden-size", type=int, default=384)
+    parser.add_argument("--layers", type=int, default=12)
+    parser.add_argument("--draft-layers", type=int, default=2)
+    parser.add_argument("--draft-tokens", type=int, nargs="+", default=[2, 4, 6])
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    tokenizer = AutoTokenizer.from_pretrained(args.tokenizer_dir)
+    model = build_standin_model(tokenizer, args.seed, args.hidden_size, args.layers)
+    draft = build_draft(model, args.draft_layers)
+
+    plain = SupportBackend.from_model(model, tokenizer, session_cache_mb=0)
+    run(plain, 4)  # warm-up, also builds the system-prompt prefix cache
+    baseline = run(plain, args.max_new_tokens)
+
+    print("\n" + "=" * 72)
+    print(f"Speculative decoding ({args.layers}-layer main, {args.draft_layers}-layer draft, "
+          f"{len(MESSAGES)} prompts, {args.max_new_tokens} greedy tokens)")
+    print("=" * 72)
+    print(f"{'draft tokens':>13}{'tok/s':>9}{'speedup':>9}{'acceptance':>12}{'tok/pass':>10}{'identical':>11}")
+    print(f"{'off':>13}{baseline['tokens_per_s']:>9.1f}{1.0:>8.2f}x{'-':>12}{'1.00':>10}{'-':>11}")
+
+    for num_draft_tokens in args.draft_tokens:
+        backend = SupportBackend.from_model(model, tokenizer, session_cache_mb=0, draft_model=draft,
+                                            num_draft_tokens=num_draft_tokens)
+        backend.prefix_cache = plain.prefix_cache
+        report = run(backend, args.max_new_tokens)
+        stats = backend.speculative.get_stats()
+        identical = sum(a == b for a, b in zip(report["replies"], baseline["replies"]))
+        print(f"{num_draft_tokens:>13}{report['tokens_per_s']:>9.1f}"
+              f"{report['tokens_per_s'] / baseline['tokens_per_s']:>8.2f}x{stats['acceptance_rate']:>12.1%}"
+              f"{stats['tokens_per_main_pass']:>10.2f}{identical:>7}/{len(MESSAGES)}")
+        if identical != len(MESSAGES):
+            print("⚠ Greedy speculative output differs from plain decoding")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+"""
+Low-memory CPU serving for the support model.
+
+``export`` merges the phase3-final LoRA adapter into the Qwen2.5-7B base
+weights. It quantizes every linear layer of the merged model, weight-only:
+int8 per output channel, or int4 in groups of 128 with per-group scales. The
+result goes to a single safetensors file. At load time, safetensors
+memory-maps the file, so the model is ready in seconds and its pages are
+shared between processes. It needs about 8 GB (int8) or 4.5 GB (int4),
+against roughly 30 GB for float32 with a runtime adapter.
+
+``compare`` loads each variant in a fresh process. It reports load time,
+tokens/s and peak RSS, plus how closely the outputs follow the unmerged
+float32 model: exact greedy matches, and teacher-forced top-1 agreement on
+the reference continuations.
+
+Usage:
+    python cpu_export.py export --bits 8              # writes working/cpu-int8
+    python cpu_export.py export --bits 4              # writes working/cpu-int4
+    python cpu_export.py compare --engines peft int8 int4
+"""
+
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+DEFAULT_ADAPTER_DIR = Path(__file__).parent / "working" / "phase3-final"
+WEIGHTS_FILE = "model.safetensors"
+QUANT_FILE = "quantization.json"
+
+# Linear layers kept in 16-bit: none by default (lm_head is the largest single matrix)
+SKIP_MODULES: Tuple[str, ...] = ()
+INT4_GROUP_SIZE = 128
+
+COMPARE_MESSAGES = [
+    "راني تعبت من الإدمان، حاب نبرا",
+    "ما هي أعراض انسحاب الكحول؟",
+    "je me sens seul et déprimé",
+]
+
+
+def export_dir(bits: int) -> Path:
+    """Default export location for a bit width."""
+    return Path(__file__).parent / "working" / f"cpu-int{bits}"
+
+
+def is_export(path: Optional[Path]) -> bool:
+    return bool(path) and (Path(path) / WEIGHTS_FILE).exists() and (Path(path) / QUANT_FILE).exists()
+
+
+def quantize_weight(weight: torch.Tensor, bits: int, group_size: int = INT4_GROUP_SIZE) -> Tuple[torch.Tensor, torch.Tensor]:
+    """
+    Symmetric weight-only quantization of a [out, in] matrix.
+
+    Args:
+        weight: Linear weight.
+        bits: 8 (per output channel) or 4 (per group of ``group_size`` inputs, two values per byte).
+        group_size: Input columns sharing one int4 scale.
+
+    Returns:
+        Tuple of (quantized weight, float32 scales).
+    """
+    w = weight.detach().float()
+    if bits == 8:
+        scales = w.abs().amax(dim=1).clamp(min=1e-8) / 127.0
+        return torch.round(w / scales[:, None]).clamp(-127, 127).to(torch.int8), scales
+    out_features, in_features = w.shape
+    groups = w.reshape(out_features, in_features // group_size, group_size)
+    scales = groups.abs().amax(dim=2).clamp(min=1e-8) / 7.0
+    q = (torch.round(groups / scales[..., None]).clamp(-8, 7) + 8).to(torch.uint8).reshape(out_features, in_features)
+    return q[:, 0::2] | (q[:, 1::2] << 4), scales
+
+
+def dequantize_weight(qweight: torch.Tensor, scales: torch.Tensor, bits: int, group_size: int,
+                      dtype: torch.dtype) -> torch.Tensor:
+    """Inverse of ``quantize_weight`` in ``dtype``."""
+    if bits == 8:
+        return qweight.to(dtype) * scales.to(dtype)[:, None]
+    out_features = qweight.shape[0]
+    q = torch.stack([qweight & 0x0F, qweight >> 4], dim=-1).reshape(out_features, -1).to(dtype) - 8
+    return (q.reshape(out_features, -1, group_size) * scales.to(dtype)[..., None]).reshape(out_features, -1)
+
+
+class QuantizedLinear(nn.Module):
+    """Linear layer over weight-only quantized weights (activations stay in floating point)."""
+
+    # Fused int8 weight x float activation kernel (PyTorch >= 2.3); probed on first use
+    _int8_kernel = hasattr(torch, "_weight_int8pack_mm")
+
+    def __init__(self, in_features: int, out_features: int, bits: int, group_size: int, bias: bool):
+        super().__init__()
+        self.in_features, self.out_features = in_features, out_features
+        self.bits, self.group_size = bits, group_size
+        packed = in_features if bits == 8 else in_features // 2
+        scale_shape = (out_features,) if bits == 8 else (out_features, in_features // group_size)
+        # Placeholders; load_state_dict(assign=True) swaps in the memory-mapped tensors
+        self.register_buffer("qweight", torch.empty((out_features, packed), dtype=torch.int8 if bits == 8 else torch.uint8, device="meta"))
+        self.register_buffer("scales", torch.empty(scale_shape, dtype=torch.float32, device="meta"))
+        self.register_buffer("bias", torch.empty(out_features, device="meta") if bias else None)
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        if self.bits == 8 and QuantizedLinear._int8_kernel:
+            try:
+                flat = x.reshape(-1, self.in_features).contiguous()
+                out = torch._weight_int8pack_mm(flat, self.qweight, self.scales.to(x.dtype))
+                out = out.reshape(*x.shape[:-1], self.out_features)
+                return out + self.bias if self.bias is not None else out
+            except RuntimeError:
+                QuantizedLinear._int8_kernel = False  # unsupported dtype/CPU: dequantize instead
+        weight = dequantize_weight(self.qweight, self.scales, self.bits, self.group_size, x.dtype)
+        return F.linear(x, weight, self.bias)
+
+
+def _quantized_modules(model) -> List[str]:
+    return [
+        name for name, module in model.named_modules()
+        if isinstance(module, nn.Linear) and not any(name.endswith(skip) for skip in SKIP_MODULES)
+    ]
+
+
+def export_cpu_model(
+    adapter_path: Path = DEFAULT_ADAPTER_DIR,
+    out_dir: Optional[Path] = None,
+    bits: int = 8,
+    group_size: int = INT4_GROUP_SIZE
+) -> Path:
+    """
+    Merge the LoRA adapter into the base model and write quantized safetensors.
+
+    Args:
+        adapter_path: LoRA adapter directory (its config names the base model).
+        out_dir: Output directory (default: working/cpu-int<bits>).
+        bits: 8 or 4.
+        group_size: int4 group size.
+
+    Returns:
+        The export directory.
+    """
+    from peft import PeftModel
+    from safetensors.torch import save_file
+    from transformers import AutoModelForCausalLM, AutoTokenizer
+
+    from support_backend import SupportBackend
+
+    if bits not in (4, 8):
+        raise ValueError("bits must be 8 or 4")
+    out_dir = Path(out_dir or export_dir(bits))
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    print(f"Loading {SupportBackend.BASE_MODEL} (bfloat16) and merging {adapter_path}...")
+    start = time.perf_counter()
+    base = AutoModelForCausalLM.from_pretrained(SupportBackend.BASE_MODEL, torch_dtype=torch.bfloat16,
+                                                low_cpu_mem_usage=True)
+    model = PeftModel.from_pretrained(base, str(adapter_path)).merge_and_unload()
+    model.eval()
+    print(f"✓ Adapter merged ({time.perf_counter() - start:.0f}s)")
+
+    modules = _quantized_modules(model)
+    tensors: Dict[str, torch.Tensor] = {}
+    quantized_params = set()
+    for name in modules:
+        linear = model.get_submodule(name)
+        qweight, scales = quantize_weight(linear.weight, bits, group_size)
+        tensors[f"{name}.qweight"] = qweight.contiguous()
+        tensors[f"{name}.scales"] = scales.contiguous()
+        quantized_params.add(f"{name}.weight")
+        if linear.bias is not None:
+            tensors[f"{name}.bias"] = linear.bias.detach().to(torch.bfloat16).contiguous()
+            quantized_params.add(f"{name}.bias")
+        linear.weight = nn.Parameter(torch.empty(0), requires_grad=False)  # free the 16-bit copy
+    print(f"✓ Quantized {len(modules)} linear layers to int{bits}")
+
+    for name, tensor in model.state_dict().items():
+        if name not in quantized_params and name not in tensors:
+            tensors[name] = tensor.detach().to(torch.bfloat16).contiguous()
+
+    save_file(tensors, str(out_dir / WEIGHTS_FILE), metadata={"format": "pt"})
+    # lm_head is quantized separately, so it can no longer share the embedding matrix
+    model.config.tie_word_embeddings = False
+    model.config.save_pretrained(str(out_dir))
+    if model.generation_config is not None:
+        model.generation_config.save_pretrained(str(out_dir))
+    AutoTokenizer.from_pretrained(str(adapter_path), trust_remote_code=True).save_pretrained(str(out_dir))
+    with open(out_dir / QUANT_FILE, "w", encoding="utf-8") as f:
+        json.dump({"bits": bits, "group_size": group_size, "modules": modules,
+                   "base_model": SupportBackend.BASE_MODEL, "adapter": Path(adapter_path).name}, f, indent=2)
+
+    size_gb = (out_dir / WEIGHTS_FILE).stat().st_size / 1e9
+    print(f"✓ Export written to {out_dir} ({size_gb:.1f} GB)")
+    return out_dir
+
+
+def load_cpu_model(path: Path, dtype: torch.dtype = torch.bfloat16):
+    """
+    Load an export for CPU inference, with weights memory-mapped from disk.
+
+    Args:
+        path: Export directory.
+        dtype: Activation/compute dtype (non-bfloat16 copies the unquantized weights).
+
+    Returns:
+        The causal LM in eval mode.
+    """
+    from accelerate import init_empty_weights
+    from safetensors import safe_open
+    from transformers import AutoConfig, AutoModelForCausalLM
+
+    path = Path(path)
+    with open(path / QUANT_FILE, encoding="utf-8") as f:
+        spec = json.load(f)
+    config = AutoConfig.from_pretrained(str(path))
+    with init_empty_weights():
+        model = AutoModelForCausalLM.from_config(config, torch_dtype=torch.bfloat16)
+    for name in spec["modules"]:
+        parent_name, _, child = name.rpartition(".")
+        parent = model.get_submodule(parent_name) if parent_name else model
+        linear = getattr(parent, child)
+        setattr(parent, child, QuantizedLinear(linear.in_features, linear.out_features, spec["bits"],
+                                               spec["group_size"], linear.bias is not None))
+
+    # safetensors backs CPU tensors with a mapping of the file: nothing is read until used
+    with safe_open(str(path / WEIGHTS_FILE), framework="pt") as f:
+        state = {key: f.get_tensor(key) for key in f.keys()}
+    model.load_state_dict(state, strict=True, assign=True)
+    if dtype != torch.bfloat16:
+        model.to(dtype)
+    return model.eval()
+
+
+def profile(engine: str, reference: Optional[str], max_new_tokens: int) -> Dict:
+    """Load one variant in this process; measure load time, tokens/s, RSS and output agreement."""
+    from support_backend import SupportBackend
+
+    start = time.perf_counter()
+    backend = SupportBackend(
+        cpu_export_dir="" if engine == "peft" else str(export_dir(int(engine[3:]))),
+        max_batch_size=0, prefix_cache_size=0, session_cache_mb=0
+    )
+    load_s = time.perf_counter() - start
+
+    reference_tokens = None
+    if reference:
+        with open(reference, encoding="utf-8") as f:
+            reference_tokens = json.load(f)["tokens"]
+
+    tokens, outputs, agreement, seconds = 0, [], [], 0.0
+    with torch.no_grad():
+        for i, message in enumerate(COMPARE_MESSAGES):
+            inputs = backend._prepare_inputs(message, None, None)
+            start = time.perf_counter()
+            sequence = backend.model.generate(**inputs, max_new_tokens=max_new_tokens, do_sample=False,
+                                              pad_token_id=backend.tokenizer.pad_token_id)[0]
+            seconds += time.perf_counter() - start
+            generated = sequence[inputs["input_ids"].shape[1]:].tolist()
+            tokens += len(generated)
+            outputs.append(generated)
+
+            if reference_tokens:
+                # Teacher forcing: does this model pick the reference's next token at every step?
+                expected = reference_tokens[i]
+                full = torch.cat([inputs["input_ids"][0], torch.tensor(expected, dtype=torch.long)])[None]
+                logits = backend.model(input_ids=full).logits[0, inputs["input_ids"].shape[1] - 1:-1]
+                agreement.append(float((logits.argmax(-1) == torch.tensor(expected)).float().mean()))
+
+    return {
+        "engine": engine,
+        "load_s": load_s,
+        "tokens_per_s": tokens / seconds,
+        "tokens": outputs,
+        "agreement": sum(agreement) / len(agreement) if agreement else 1.0,
+        "exact": sum(a == b for a, b in zip(outputs, reference_tokens)) if reference_tokens else len(outputs),
+        # ru_maxrss is reported in KiB on Linux
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+    }
+
+
+def compare(engines: List[str], max_new_tokens: int, min_agreement: float) -> bool:
+    """Profile each variant in a fresh process against the first one (the reference)."""
+    reports = []
+    with tempfile.TemporaryDirectory() as tmp:
+        reference_file = Path(tmp) / "reference.json"
+        for engine in engines:
+            cmd = [sys.executable, __file__, "profile", "--engine", engine, "--max-new-tokens", str(max_new_tokens)]
+            if reports:
+                cmd += ["--reference", str(reference_file)]
+            output = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+            reports.append(json.loads(output.strip().splitlines()[-1]))
+            if len(reports) == 1:
+                reference_file.write_text(json.dumps({"tokens": reports[0]["tokens"]}))
+
+    reference = reports[0]
+    print("\n" + "=" * 72)
+    print(f"CPU variants (reference: {reference['engine']}, {len(COMPARE_MESSAGES)} prompts, "
+          f"{max_new_tokens} greedy tokens)")
+    print("=" * 72)
+    print(f"{'engine':<8}{'load s':>8}{'tok/s':>8}{'speedup':>9}{'RSS MB':>9}{'exact':>8}{'top-1 agree':>13}")
+
+    ok = True
+    for report in reports:
+        speedup = report["tokens_per_s"] / reference["tokens_per_s"]
+        print(f"{report['engine']:<8}{report['load_s']:>8.1f}{report['tokens_per_s']:>8.2f}{speedup:>8.2f}x"
+              f"{report['max_rss_mb']:>9.0f}{report['exact']:>5}/{len(COMPARE_MESSAGES)}{report['agreement']:>13.1%}")
+        ok = ok and report["agreement"] >= min_agreement
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    export_cmd = sub.add_parser("export", help="Merge the adapter and write quantized weights")
+    export_cmd.add_argument("--bits", type=int, choices=[8, 4], default=8)
+    export_cmd.add_argument("--group-size", type=int, default=INT4_GROUP_SIZE)
+    export_cmd.add_argument("--adapter", default=str(DEFAULT_ADAPTER_DIR))
+    export_cmd.add_argument("--out")
+
+    compare_cmd = sub.add_parser("compare", help="Load time, tokens/s, RSS and output agreement")
+    compare_cmd.add_argument("--engines", nargs="+", default=["peft", "int8", "int4"])
+    compare_cmd.add_argument("--max-new-tokens", type=int, default=32)
+    compare_cmd.add_argument("--min-agreement", type=float, default=0.9,
+                             help="exit 1 if a variant's teacher-forced agreement is lower")
+
+    profile_cmd = sub.add_parser("profile", help=argparse.SUPPRESS)
+    profile_cmd.add_argument("--engine", required=True)
+    profile_cmd.add_argument("--reference")
+    profile_cmd.add_argument("--max-new-tokens", type=int, default=32)
+
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export_cpu_model(Path(args.adapter), Path(args.out) if args.out else None, args.bits, args.group_size)
+    elif args.command == "compare":
+        sys.exit(0 if compare(args.engines, args.max_new_tokens, args.min_agreement) else 1)
+    else:
+        print(json.dumps(profile(args.engine, args.reference, args.max_new_tokens)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,458 @@
+"""
+Continuous batching for causal LM generation.
+
+One scheduler thread owns the model and keeps a running batch of
+conversations, advancing all of them by one token per forward pass. At every
+token boundary, finished conversations leave the batch. Waiting ones are
+prefilled and merged in, so a long reply does not hold up a short one.
+
+The running batch shares one KV cache, left-padded to a common length. The
+attention mask hides the padding, and explicit position ids keep rotary
+positions right for every row. Each request keeps its own temperature, top_p
+and max_new_tokens. Other processors in the model's generation_config, such as
+repetition penalty and top-k, are not applied.
+"""
+
+import queue
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+import torch
+
+from kv_cache import cache_length, from_legacy, left_pad, to_legacy
+
+
+class GenerationHandle:
+    """Result of one submitted request: stream tokens/text or wait for the full reply."""
+
+    def __init__(self, tokenizer, cancel_event: Optional[threading.Event] = None):
+        self._tokenizer = tokenizer
+        self._queue: "queue.Queue[Optional[int]]" = queue.Queue()
+        self._done = threading.Event()
+        self._cancel = cancel_event or threading.Event()
+        self.token_ids: List[int] = []
+        self.error: Optional[BaseException] = None
+        self.submitted_at = time.perf_counter()
+        self.first_token_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        # With keep_cache: the sequence's KV states and the token ids they cover
+        self.past: Optional[tuple] = None
+        self.past_ids: Optional[List[int]] = None
+
+    def _put(self, token_id: int):
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        self.token_ids.append(token_id)
+        self._queue.put(token_id)
+
+    def _finish(self, error: Optional[BaseException] = None):
+        self.error = error
+        self.finished_at = time.perf_counter()
+        self._done.set()
+        self._queue.put(None)
+
+    def cancel(self):
+        """Stop generating at the next token boundary and free the batch slot (no KV states are kept)."""
+        self._cancel.set()
+
+    @property
+    def cancelled(self) -> bool:
+        """Whether ``cancel()`` was called (or the submit's cancel event was set)."""
+        return self._cancel.is_set()
+
+    def tokens(self) -> Iterator[int]:
+        """Generated token ids as they are produced."""
+        while True:
+            token_id = self._queue.get()
+            if token_id is None:
+                break
+            yield token_id
+        if self.error is not None:
+            raise self.error
+
+    def stream(self) -> Iterator[str]:
+        """Decoded text pieces as they are produced (joined, they equal ``result()``)."""
+        ids: List[int] = []
+        emitted = ""
+        for token_id in self.tokens():
+            ids.append(token_id)
+            text = self._tokenizer.decode(ids, skip_special_tokens=True)
+            # Wait for the rest of a multi-byte character
+            if text.endswith("�") or len(text) <= len(emitted):
+                continue
+            yield text[len(emitted):]
+            emitted = text
+
+    def result(self, timeout: Optional[float] = None) -> str:
+        """Block until generation ends and return the decoded reply."""
+        if not self._done.wait(timeout):
+            raise TimeoutError("Generation did not finish in time")
+        if self.error is not None:
+            raise self.error
+        return self._tokenizer.decode(self.token_ids, skip_special_tokens=True)
+
+
+class _Sequence:
+    """Per-request decoding state inside the scheduler."""
+
+    def __init__(self, handle: GenerationHandle, prompt_ids: List[int], max_new_tokens: int,
+                 temperature: float, top_p: float, do_sample: bool, stop_ids: frozenset,
+                 prefix_past: Optional[tuple], keep_cache: bool):
+        self.handle = handle
+        self.prompt_ids = prompt_ids
+        self.prefix_past = prefix_past
+        self.prefix_length = cache_length(prefix_past) if prefix_past else 0
+        self.keep_cache = keep_cache
+        self.max_new_tokens = max_new_tokens
+        self.temperature = temperature
+        self.top_p = top_p
+        self.do_sample = do_sample and temperature > 0
+        self.stop_ids = stop_ids
+        self.generated = 0
+        self.position = 0       # position id of the next fed token
+        self.last_token = None  # sampled token not yet in the KV cache
+        self.finished = False
+
+
+class GenerationScheduler:
+    """Continuous-batching generation loop around a Hugging Face causal LM."""
+
+    DEFAULT_MAX_BATCH_SIZE = 16
+
+    # Prompt tokens prefilled per token boundary (bounds the pause for running rows)
+    DEFAULT_MAX_PREFILL_TOKENS = 4096
+
+    def __init__(
+        self,
+        model,
+        tokenizer,
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        max_prefill_tokens: int = DEFAULT_MAX_PREFILL_TOKENS,
+        seed: Optional[int] = None
+    ):
+        """
+        Initialize the scheduler (the loop thread starts on the first submit).
+
+        Args:
+            model: Causal LM (transformers or PEFT-wrapped) accepting ``past_key_values``.
+            tokenizer: Matching tokenizer (pad/eos ids, decoding).
+            max_batch_size: Maximum concurrently decoding conversations.
+            max_prefill_tokens: Prompt tokens admitted per token boundary (at least one request).
+            seed: Sampling seed for reproducible runs.
+        """
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_batch_size = max_batch_size
+        self.max_prefill_tokens = max_prefill_tokens
+        self.device = model.device
+        self.pad_token_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else tokenizer.eos_token_id
+
+        stop_ids = set()
+        for eos in (tokenizer.eos_token_id, getattr(getattr(model, "generation_config", None), "eos_token_id", None)):
+            if isinstance(eos, int):
+                stop_ids.add(eos)
+            elif eos:
+                stop_ids.update(eos)
+        self.default_stop_ids = frozenset(stop_ids)
+
+        self._generator = torch.Generator(device=self.device)
+        if seed is not None:
+            self._generator.manual_seed(seed)
+
+        self._pending: "queue.Queue[Optional[_Sequence]]" = queue.Queue()
+        self._closed = False
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+
+        # Running batch: one row per sequence; KV and mask share the padded length
+        self._running: List[_Sequence] = []
+        self._past: Optional[tuple] = None
+        self._mask: Optional[torch.Tensor] = None
+
+        self._stats_lock = threading.Lock()
+        self._stats = {"requests": 0, "steps": 0, "tokens": 0, "prefills": 0, "prefill_tokens": 0,
+                       "prefix_tokens": 0, "max_batch": 0, "cancelled": 0}
+        self._batch_size_sum = 0
+
+    def submit(
+        self,
+        input_ids: Sequence[int],
+        max_new_tokens: int = 512,
+        temperature: float = 0.7,
+        top_p: float = 0.9,
+        do_sample: bool = True,
+        stop_token_ids: Optional[Iterable[int]] = None,
+        prefix_past: Optional[tuple] = None,
+        keep_cache: bool = False,
+        cancel_event: Optional[threading.Event] = None
+    ) -> GenerationHandle:
+        """
+        Queue a prompt for generation.
+
+        Args:
+            input_ids: Prompt token ids (chat template already applied).
+            max_new_tokens: Maximum tokens to generate.
+            temperature: Sampling temperature.
+            top_p: Nucleus sampling parameter.
+            do_sample: Whether to sample (False = greedy decoding).
+            stop_token_ids: Tokens that end the reply (default: the model's EOS ids).
+            prefix_past: Cached KV states (batch of one) for the first tokens of
+                ``input_ids``, e.g. from ``PrefixCache``; only the rest is prefilled.
+            keep_cache: Copy the sequence's KV states into ``handle.past`` when it
+                finishes, to continue the conversation next turn.
+            cancel_event: Setting it has the effect of ``handle.cancel()``.
+
+        Returns:
+            Handle to stream or wait for the reply.
+        """
+        if self._closed:
+            raise RuntimeError("GenerationScheduler is closed")
+        handle = GenerationHandle(self.tokenizer, cancel_event)
+        stop_ids = self.default_stop_ids if stop_token_ids is None else frozenset(stop_token_ids)
+        input_ids = list(input_ids)
+        if prefix_past is not None and cache_length(prefix_past) >= len(input_ids):
+            prefix_past = None  # at least one token has to be run to get logits
+        self._pending.put(_Sequence(handle, input_ids, max_new_tokens, temperature, top_p, do_sample,
+                                    stop_ids, prefix_past, keep_cache))
+        self._ensure_thread()
+        return handle
+
+    def close(self):
+        """Finish running and queued requests, then stop the loop thread."""
+        self._closed = True
+        self._pending.put(None)
+        if self._thread is not None:
+            self._thread.join()
+
+    def get_stats(self) -> Dict:
+        """Counters: requests, decode steps, generated tokens and batch sizes."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+            steps = stats["steps"]
+            stats["mean_batch"] = round(self._batch_size_sum / steps, 2) if steps else 0.0
+        stats["running"] = len(self._running)
+        stats["queued"] = self._pending.qsize()
+        return stats
+
+    def _ensure_thread(self):
+        with self._thread_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="generation-scheduler", daemon=True)
+                self._thread.start()
+
+    def _admit(self, block: bool) -> List[_Sequence]:
+        """Take waiting requests that fit the free batch slots and the prefill budget."""
+        admitted: List[_Sequence] = []
+        budget = self.max_prefill_tokens
+        while len(self._running) + len(admitted) < self.max_batch_size:
+            try:
+                item = self._pending.get(block=block and not admitted)
+            except queue.Empty:
+                break
+            if item is None:
+                self._stopping = True
+                break
+            if item.handle.cancelled:
+                item.handle._finish()
+                with self._stats_lock:
+                    self._stats["cancelled"] += 1
+                continue
+            admitted.append(item)
+            budget -= len(item.prompt_ids) - item.prefix_length
+            if budget <= 0:
+                break
+        return admitted
+
+    def _loop(self):
+        # Grad mode is thread-local, so disable it in the scheduler thread
+        with torch.no_grad():
+            while not (self._stopping and not self._running and self._pending.empty()):
+                admitted = self._admit(block=not self._running and not self._stopping)
+                try:
+                    if admitted:
+                        self._prefill(admitted)
+                    self._drop_cancelled()
+                    if self._running:
+                        self._step()
+                except Exception as e:
+                    for sequence in self._running + admitted:
+                        if not sequence.handle._done.is_set():
+                            sequence.handle._finish(e)
+                    self._running, self._past, self._mask = [], None, None
+
+    def _prefill(self, sequences: List[_Sequence]):
+        """Run the prompts of newly admitted requests and merge them into the batch."""
+        # Row layout: [pad, cached prefix | pad, uncached suffix]; the mask hides both pads
+        prefix_width = max(sequence.prefix_length for sequence in sequences)
+        suffixes = [sequence.prompt_ids[sequence.prefix_length:] for sequence in sequences]
+        suffix_width = max(len(suffix) for suffix in suffixes)
+        width = prefix_width + suffix_width
+        input_ids = torch.full((len(sequences), suffix_width), self.pad_token_id, dtype=torch.long)
+        mask = torch.zeros((len(sequences), width), dtype=torch.long)
+        for row, (sequence, suffix) in enumerate(zip(sequences, suffixes)):
+            input_ids[row, suffix_width - len(suffix):] = torch.tensor(suffix, dtype=torch.long)
+            mask[row, prefix_width - sequence.prefix_length:prefix_width] = 1
+            mask[row, width - len(suffix):] = 1
+            sequence.position = len(sequence.prompt_ids)
+        input_ids, mask = input_ids.to(self.device), mask.to(self.device)
+        position_ids = (mask.cumsum(-1) - 1).clamp(min=0)[:, prefix_width:]
+
+        prefix = self._stack_prefixes(sequences, prefix_width) if prefix_width else None
+        outputs = self.model(
+            input_ids=input_ids,
+            attention_mask=mask,
+            position_ids=position_ids,
+            past_key_values=from_legacy(prefix) if prefix else None,
+            use_cache=True
+        )
+        past = to_legacy(outputs.past_key_values)
+        tokens = self._sample(outputs.logits[:, -1, :], sequences)
+
+        if self._running:
+            length = max(self._mask.shape[1], width)
+            self._past = tuple(
+                (torch.cat([left_pad(k, length, 2), left_pad(new_k, length, 2)]),
+                 torch.cat([left_pad(v, length, 2), left_pad(new_v, length, 2)]))
+                for (k, v), (new_k, new_v) in zip(self._past, past)
+            )
+            self._mask = torch.cat([left_pad(self._mask, length, 1), left_pad(mask, length, 1)])
+        else:
+            self._past, self._mask = tuple(past), mask
+        self._running.extend(sequences)
+
+        with self._stats_lock:
+            self._stats["requests"] += len(sequences)
+            self._stats["prefills"] += 1
+            self._stats["prefill_tokens"] += sum(len(suffix) for suffix in suffixes)
+            self._stats["prefix_tokens"] += sum(sequence.prefix_length for sequence in sequences)
+        self._emit(sequences, tokens)
+        self._evict()
+
+    @staticmethod
+    def _stack_prefixes(sequences: List[_Sequence], width: int) -> tuple:
+        """Batch the rows' cached prefixes, left-padded to ``width`` (zeros for rows without one)."""
+        template = next(sequence.prefix_past for sequence in sequences if sequence.prefix_past)
+        layers = []
+        for layer, (key, value) in enumerate(template):
+            empty_key = key.new_zeros((1, key.shape[1], width, key.shape[3]))
+            empty_value = value.new_zeros((1, value.shape[1], width, value.shape[3]))
+            keys, values = [], []
+            for sequence in sequences:
+                if sequence.prefix_past:
+                    keys.append(left_pad(sequence.prefix_past[layer][0], width, 2))
+                    values.append(left_pad(sequence.prefix_past[layer][1], width, 2))
+                else:
+                    keys.append(empty_key)
+                    values.append(empty_value)
+            layers.append((torch.cat(keys), torch.cat(values)))
+        return tuple(layers)
+
+    def _step(self):
+        """Decode one token for every running sequence."""
+        batch = len(self._running)
+        input_ids = torch.tensor([[sequence.last_token] for sequence in self._running], device=self.device)
+        position_ids = torch.tensor([[sequence.position] for sequence in self._running], device=self.device)
+        mask = torch.cat([self._mask, self._mask.new_ones((batch, 1))], dim=1)
+
+        outputs = self.model(
+            input_ids=input_ids,
+            attention_mask=mask,
+            position_ids=position_ids,
+            past_key_values=from_legacy(self._past),
+            use_cache=True
+        )
+        self._past = to_legacy(outputs.past_key_values)
+        self._mask = mask
+        for sequence in self._running:
+            sequence.position += 1
+
+        tokens = self._sample(outputs.logits[:, -1, :], self._running)
+        with self._stats_lock:
+            self._stats["steps"] += 1
+            self._stats["max_batch"] = max(self._stats["max_batch"], batch)
+            self._batch_size_sum += batch
+        self._emit(self._running, tokens)
+        self._evict()
+
+    def _drop_cancelled(self):
+        """Evict rows whose handle was cancelled before spending another forward pass on them."""
+        cancelled = 0
+        for sequence in self._running:
+            if sequence.handle.cancelled and not sequence.finished:
+                sequence.finished = True
+                cancelled += 1
+        if cancelled:
+            with self._stats_lock:
+                self._stats["cancelled"] += cancelled
+            self._evict()
+
+    def _keep_cache(self, row: int, sequence: _Sequence):
+        """Copy one row's KV states without its padding columns into the handle."""
+        columns = self._mask[row].nonzero().squeeze(-1)
+        sequence.handle.past = tuple(
+            (k[row:row + 1].index_select(2, columns), v[row:row + 1].index_select(2, columns))
+            for k, v in self._past
+        )
+        # The last sampled token (or stop token) was never fed, so it is not covered
+        sequence.handle.past_ids = (sequence.prompt_ids + sequence.handle.token_ids)[:len(columns)]
+
+    def _sample(self, logits: torch.Tensor, sequences: List[_Sequence]) -> List[int]:
+        """Next token per row with that row's temperature/top_p (argmax for greedy rows)."""
+        logits = logits.float()
+        greedy = logits.argmax(dim=-1)
+        if not any(sequence.do_sample for sequence in sequences):
+            return greedy.tolist()
+
+        temperature = torch.tensor([max(s.temperature, 1e-5) for s in sequences], device=logits.device)
+        top_p = torch.tensor([s.top_p for s in sequences], device=logits.device)
+        probs = torch.softmax(logits / temperature[:, None], dim=-1)
+        sorted_probs, order = probs.sort(dim=-1, descending=True)
+        # Drop tokens outside the nucleus (the most likely token always stays)
+        outside = sorted_probs.cumsum(dim=-1) - sorted_probs > top_p[:, None]
+        sorted_probs = sorted_probs.masked_fill(outside, 0.0)
+        choice = torch.multinomial(sorted_probs, 1, generator=self._generator)
+        sampled = order.gather(-1, choice).squeeze(-1)
+
+        do_sample = torch.tensor([s.do_sample for s in sequences], device=logits.device)
+        return torch.where(do_sample, sampled, greedy).tolist()
+
+    def _emit(self, sequences: List[_Sequence], tokens: List[int]):
+        generated = 0
+        for sequence, token in zip(sequences, tokens):
+            sequence.generated += 1
+            sequence.last_token = token
+            if token in sequence.stop_ids:
+                sequence.finished = True
+                continue
+            sequence.handle._put(token)
+            generated += 1
+            if sequence.generated >= sequence.max_new_tokens:
+                sequence.finished = True
+        with self._stats_lock:
+            self._stats["tokens"] += generated
+
+    def _evict(self):
+        """Drop finished rows and KV columns that are padding in every remaining row."""
+        keep = [row for row, sequence in enumerate(self._running) if not sequence.finished]
+        if len(keep) == len(self._running):
+            return
+        for row, sequence in enumerate(self._running):
+            if sequence.finished:
+                if sequence.keep_cache and not sequence.handle.cancelled:
+                    self._keep_cache(row, sequence)
+                sequence.handle._finish()
+        if not keep:
+            self._running, self._past, self._mask = [], None, None
+            return
+
+        rows = torch.tensor(keep, device=self._mask.device)
+        self._running = [self._running[row] for row in keep]
+        mask = self._mask.index_select(0, rows)
+        start = int((mask.sum(dim=0) > 0).nonzero()[0])
+        self._mask = mask[:, start:]
+        self._past = tuple(
+            (k.index_select(0, rows)[:, :, start:], v.index_select(0, rows)[:, :, start:])
+            for k, v in self._past
+        )
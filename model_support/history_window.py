@@ -0,0 +1,244 @@
+"""
+Token-budgeted chat prompts built from cached per-message token ids.
+
+Every message is rendered through the tokenizer's chat template and tokenized
+once. After that, its ids come from an LRU keyed by (role, content). A prompt
+is assembled as: the system message, then the newest history turns that fit
+the budget, then the latest user message, then the generation prompt. The
+system message and the latest message are always kept. The oldest turns are
+dropped a whole user/assistant exchange at a time, or handed to an optional
+summarizer. If the system message and the latest message alone exceed the
+budget, the middle of the latest message is cut out, so the prompt always
+fits.
+
+The first assembled prompt is checked against a full render-and-tokenize of
+the same messages. If they differ, because the template or tokenizer does
+not split cleanly at message boundaries, prompts are tokenized in full from
+then on. The window logic stays the same.
+
+With a session id, the window keeps its start between calls while the prompt
+still fits. When it overflows, turns are dropped down to ``refill_ratio`` of
+the budget. This keeps the prompt prefix stable over many turns, so the
+per-conversation KV cache stays usable instead of missing on every turn.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Stand-in system message used to cut a single message's text out of a render
+_ANCHOR = {"role": "system", "content": ""}
+
+
+class HistoryWindow:
+    """Builds prompt token ids for a conversation within a token budget."""
+
+    DEFAULT_MAX_TOKENS = 4096
+
+    # After an overflow, a session's window is refilled down to this share of the budget
+    REFILL_RATIO = 0.75
+
+    # Left where the middle of an over-long latest message was cut out
+    TRUNCATION_MARKER = "\n[...]\n"
+
+    # Cached message tokenizations / session window starts
+    MAX_CACHED_MESSAGES = 10000
+    MAX_SESSIONS = 10000
+
+    def __init__(
+        self,
+        tokenizer,
+        max_tokens: int = DEFAULT_MAX_TOKENS,
+        refill_ratio: float = REFILL_RATIO,
+        summarizer: Optional[Callable[[List[Dict[str, str]]], str]] = None
+    ):
+        """
+        Initialize the window.
+
+        Args:
+            tokenizer: Tokenizer with a chat template.
+            max_tokens: Prompt token budget (system prompt + history + latest message).
+            refill_ratio: Share of the budget a session's window is cut down to on overflow.
+            summarizer: Optional callable turning dropped messages into a short text,
+                inserted as a system message after the system prompt.
+        """
+        self.tokenizer = tokenizer
+        self.max_tokens = max_tokens
+        self.refill_ratio = refill_ratio
+        self.summarizer = summarizer
+        self.exact: Optional[bool] = None  # set by the first full-tokenization check
+
+        self._messages: "OrderedDict[Tuple[str, str], List[int]]" = OrderedDict()
+        self._starts: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation_ids = self._tokenize(self._render_suffix([{"role": "user", "content": ""}], True))
+        self._stats = {"requests": 0, "windowed": 0, "over_budget": 0, "prompt_tokens": 0,
+                       "dropped_messages": 0, "dropped_tokens": 0, "truncated": 0, "truncated_tokens": 0,
+                       "message_hits": 0, "message_misses": 0}
+
+    def _tokenize(self, text: str) -> List[int]:
+        return self.tokenizer(text, add_special_tokens=False)["input_ids"]
+
+    def _render_suffix(self, messages: List[Dict[str, str]], add_generation_prompt: bool = False) -> str:
+        """Template text ``messages`` add after the anchor system message."""
+        head = self.tokenizer.apply_chat_template([_ANCHOR], tokenize=False)
+        text = self.tokenizer.apply_chat_template([_ANCHOR] + messages, tokenize=False,
+                                                  add_generation_prompt=add_generation_prompt)
+        if not text.startswith(head):
+            self.exact = False
+            return text
+        if add_generation_prompt:
+            return text[len(self.tokenizer.apply_chat_template([_ANCHOR] + messages, tokenize=False)):]
+        return text[len(head):]
+
+    def message_ids(self, message: Dict[str, str]) -> List[int]:
+        """Token ids of one rendered message (the system message renders as the prompt's first turn)."""
+        key = (message["role"], message["content"])
+        with self._lock:
+            ids = self._messages.get(key)
+            if ids is not None:
+                self._messages.move_to_end(key)
+                self._stats["message_hits"] += 1
+                return ids
+        if message["role"] == "system":
+            ids = self._tokenize(self.tokenizer.apply_chat_template([message], tokenize=False))
+        else:
+            ids = self._tokenize(self._render_suffix([message]))
+        with self._lock:
+            self._stats["message_misses"] += 1
+            self._messages[key] = ids
+            while len(self._messages) > self.MAX_CACHED_MESSAGES:
+                self._messages.popitem(last=False)
+        return ids
+
+    def build(
+        self,
+        system_prompt: str,
+        history: Optional[List[Dict[str, str]]],
+        user_message: str,
+        session_id: Optional[str] = None
+    ) -> Tuple[List[int], Dict]:
+        """
+        Assemble the prompt for one turn.
+
+        Args:
+            system_prompt: System prompt text.
+            history: Previous messages, oldest first.
+            user_message: The latest user message.
+            session_id: Conversation key; keeps the window start stable between turns.
+
+        Returns:
+            Tuple of (prompt token ids, report with kept/dropped message and token counts).
+        """
+        history = list(history or [])
+        system = {"role": "system", "content": system_prompt}
+        latest = {"role": "user", "content": user_message}
+        system_ids, latest_ids = self.message_ids(system), self.message_ids(latest)
+        history_ids = [self.message_ids(message) for message in history]
+        fixed = len(system_ids) + len(latest_ids) + len(self._generation_ids)
+
+        # Cut the middle of the latest message until the required part fits
+        # (retokenizing around the cut can shift a few tokens, hence the retries)
+        truncated_tokens = 0
+        for _ in range(3):
+            if fixed <= self.max_tokens or not latest["content"]:
+                break
+            before = len(latest_ids)
+            latest = {"role": "user", "content": self._truncate(latest["content"], fixed - self.max_tokens)}
+            latest_ids = self.message_ids(latest)
+            truncated_tokens += before - len(latest_ids)
+            fixed = len(system_ids) + len(latest_ids) + len(self._generation_ids)
+
+        # tail[i] = tokens of history[i:]
+        tail = [0] * (len(history) + 1)
+        for i in range(len(history) - 1, -1, -1):
+            tail[i] = tail[i + 1] + len(history_ids[i])
+        # Cut only in front of a user message so exchanges stay whole
+        boundaries = [i for i, message in enumerate(history) if message["role"] == "user"] + [len(history)]
+
+        start = self._window_start(session_id, boundaries, tail, fixed)
+        kept = history[start:]
+        summary_ids: List[int] = []
+        if start and self.summarizer is not None:
+            summary = self.summarizer(history[:start])
+            if summary:
+                kept = [{"role": "system", "content": summary}] + kept
+                summary_ids = self.message_ids(kept[0])
+
+        ids = system_ids + summary_ids + [t for part in history_ids[start:] for t in part] + latest_ids + self._generation_ids
+        if self.exact is None:
+            self.exact = ids == self._full_ids([system] + kept + [latest])
+            if not self.exact:
+                print("⚠ Chat template does not tokenize per message; tokenizing full prompts")
+        if not self.exact:
+            ids = self._full_ids([system] + kept + [latest])
+
+        report = {
+            "prompt_tokens": len(ids),
+            "kept_messages": len(history) - start,
+            "dropped_messages": start,
+            "dropped_tokens": tail[0] - tail[start],
+            "summarized": bool(summary_ids),
+            "truncated_tokens": truncated_tokens,
+        }
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["prompt_tokens"] += len(ids)
+            self._stats["windowed"] += bool(start)
+            self._stats["over_budget"] += len(ids) > self.max_tokens
+            self._stats["dropped_messages"] += start
+            self._stats["dropped_tokens"] += report["dropped_tokens"]
+            self._stats["truncated"] += bool(truncated_tokens)
+            self._stats["truncated_tokens"] += truncated_tokens
+        return ids, report
+
+    def _truncate(self, content: str, excess: int) -> str:
+        """``content`` with at least ``excess`` tokens cut from its middle (head and tail are kept)."""
+        ids = self._tokenize(content)
+        keep = max(len(ids) - excess - len(self._tokenize(self.TRUNCATION_MARKER)), 0)
+        head = keep // 2
+        tail = ids[len(ids) - (keep - head):] if keep > head else []
+        return (self.tokenizer.decode(ids[:head]) + self.TRUNCATION_MARKER
+                + self.tokenizer.decode(tail))
+
+    def _window_start(self, session_id: Optional[str], boundaries: List[int], tail: List[int], fixed: int) -> int:
+        """Index of the first kept history message."""
+        def first_fitting(budget: int, not_before: int) -> int:
+            return next((i for i in boundaries if i >= not_before and fixed + tail[i] <= budget), boundaries[-1])
+
+        if session_id is None:
+            return first_fitting(self.max_tokens, 0)
+        with self._lock:
+            previous = min(self._starts.get(session_id, 0), len(tail) - 1)
+        if fixed + tail[previous] <= self.max_tokens:
+            start = previous
+        else:
+            start = first_fitting(int(self.max_tokens * self.refill_ratio), previous)
+        with self._lock:
+            self._starts[session_id] = start
+            self._starts.move_to_end(session_id)
+            while len(self._starts) > self.MAX_SESSIONS:
+                self._starts.popitem(last=False)
+        return start
+
+    def _full_ids(self, messages: List[Dict[str, str]]) -> List[int]:
+        prompt = self.tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+        return self.tokenizer(prompt)["input_ids"]
+
+    def forget(self, session_id: str):
+        """Drop a session's remembered window start."""
+        with self._lock:
+            self._starts.pop(session_id, None)
+
+    def get_stats(self) -> Dict:
+        """Prompt sizes, windowing counters and message-cache hit rate."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["cached_messages"] = len(self._messages)
+        requests = stats["requests"]
+        lookups = stats["message_hits"] + stats["message_misses"]
+        stats["prompt_tokens_mean"] = round(stats["prompt_tokens"] / requests, 1) if requests else 0.0
+        stats["message_hit_rate"] = round(stats["message_hits"] / lookups, 3) if lookups else 0.0
+        stats["max_tokens"] = self.max_tokens
+        stats["exact"] = self.exact
+        return stats
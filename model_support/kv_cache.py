@@ -0,0 +1,252 @@
+"""
+KV-cache helpers shared by the support generation paths.
+
+Caches are handled as legacy tuples of (key, value) per layer, each shaped
+[batch, heads, seq, head_dim]. They are wrapped in the ``Cache`` class that
+newer transformers expect only at the point of a forward pass.
+``PrefixCache`` keeps the states of prompt prefixes, such as the system
+prompt, so each request only has to prefill the tokens that come after them.
+``ConversationCache`` keeps each conversation's states between turns.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Sequence
+
+import torch
+
+
+def to_legacy(past) -> tuple:
+    """KV cache as a tuple of (key, value) per layer."""
+    return past.to_legacy_cache() if hasattr(past, "to_legacy_cache") else past
+
+
+def from_legacy(layers: tuple):
+    """Wrap legacy KV tuples in a fresh ``DynamicCache`` (the tensors themselves are never modified in place)."""
+    try:
+        from transformers import DynamicCache
+    except ImportError:
+        return layers
+    return DynamicCache.from_legacy_cache(layers)
+
+
+def left_pad(tensor: torch.Tensor, length: int, dim: int) -> torch.Tensor:
+    """Zero-pad ``tensor`` on the left of ``dim`` up to ``length``."""
+    missing = length - tensor.shape[dim]
+    if missing <= 0:
+        return tensor
+    shape = list(tensor.shape)
+    shape[dim] = missing
+    return torch.cat([tensor.new_zeros(shape), tensor], dim=dim)
+
+
+def cache_length(layers: tuple) -> int:
+    """Number of positions held by a legacy KV cache."""
+    return layers[0][0].shape[2] if layers else 0
+
+
+def cache_bytes(layers: tuple) -> int:
+    """Memory held by a legacy KV cache."""
+    return sum(k.numel() * k.element_size() + v.numel() * v.element_size() for k, v in layers)
+
+
+def crop(layers: tuple, length: int) -> tuple:
+    """The first ``length`` positions of a legacy KV cache (views, no copy)."""
+    return tuple((k[:, :, :length], v[:, :, :length]) for k, v in layers)
+
+
+class PrefixCache:
+    """LRU of prefix KV states, computed once per model and shared by every request."""
+
+    DEFAULT_MAX_ENTRIES = 4
+
+    def __init__(self, model, max_entries: int = DEFAULT_MAX_ENTRIES):
+        """
+        Initialize the cache.
+
+        Args:
+            model: Causal LM the states belong to (base model plus adapter).
+            max_entries: Distinct prefixes kept (least recently used is dropped).
+        """
+        self.model = model
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._compute_lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "tokens_reused": 0,
+                       "prefill_ms": 0.0, "saved_ms": 0.0}
+
+    def get(self, prefix_ids: Sequence[int]) -> tuple:
+        """
+        KV states for ``prefix_ids``, computed on first use.
+
+        Args:
+            prefix_ids: Token ids of the prefix (batch of one).
+
+        Returns:
+            Legacy KV tuple covering exactly ``prefix_ids``.
+        """
+        key = tuple(prefix_ids)
+        entry = self._lookup(key)
+        if entry is not None:
+            return entry["past"]
+
+        # One computation at a time; a concurrent miss on the same prefix waits and reuses it
+        with self._compute_lock:
+            entry = self._lookup(key)
+            if entry is not None:
+                return entry["past"]
+            start = time.perf_counter()
+            with torch.no_grad():
+                input_ids = torch.tensor([key], device=self.model.device)
+                outputs = self.model(input_ids=input_ids, use_cache=True)
+            past = tuple((k, v) for k, v in to_legacy(outputs.past_key_values))
+            elapsed_ms = (time.perf_counter() - start) * 1000.0
+
+            with self._lock:
+                self._stats["misses"] += 1
+                self._stats["prefill_ms"] += elapsed_ms
+                self._entries[key] = {"past": past, "ms": elapsed_ms}
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self._stats["evictions"] += 1
+            return past
+
+    def _lookup(self, key: tuple):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                self._stats["tokens_reused"] += len(key)
+                # Each hit skips the prefill measured when the entry was built
+                self._stats["saved_ms"] += entry["ms"]
+            return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict:
+        """Hit/miss counters, prefix prefill time spent and (estimated) time saved."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        stats["saved_ms_per_hit"] = round(stats["saved_ms"] / stats["hits"], 2) if stats["hits"] else 0.0
+        stats["prefill_ms"] = round(stats["prefill_ms"], 2)
+        stats["saved_ms"] = round(stats["saved_ms"], 2)
+        return stats
+
+
+class ConversationCache:
+    """
+    Per-session KV states of the last turn, so the next turn only prefills what is new.
+
+    An entry holds the token ids its states cover. A new prompt reuses the
+    longest common token prefix, so a reply that retokenizes differently
+    still reuses everything before the difference. Entries are dropped after
+    ``idle_seconds`` without use, and least recently used first once
+    ``max_bytes`` is exceeded. A dropped session falls back to a full prefill.
+    """
+
+    DEFAULT_MAX_MB = 1024
+    DEFAULT_IDLE_SECONDS = 900
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_MB * 1024 * 1024, idle_seconds: float = DEFAULT_IDLE_SECONDS):
+        """
+        Initialize the store.
+
+        Args:
+            max_bytes: Total KV memory kept across sessions.
+            idle_seconds: Sessions unused for this long are dropped.
+        """
+        self.max_bytes = max_bytes
+        self.idle_seconds = idle_seconds
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "tokens_reused": 0, "stores": 0,
+                       "evicted_idle": 0, "evicted_memory": 0, "too_large": 0}
+
+    def get(self, session_id: str, input_ids: Sequence[int]) -> Optional[tuple]:
+        """
+        Cached states for the start of ``input_ids``.
+
+        Args:
+            session_id: Conversation key.
+            input_ids: Full prompt of the new turn.
+
+        Returns:
+            Legacy KV tuple covering a strict prefix of ``input_ids``, or None.
+        """
+        with self._lock:
+            self._drop_idle()
+            entry = self._entries.get(session_id)
+            length = 0
+            if entry is not None:
+                self._entries.move_to_end(session_id)
+                entry["last_used"] = time.monotonic()
+                cached_ids = entry["ids"]
+                limit = min(len(cached_ids), len(input_ids) - 1)  # leave a token to prefill
+                while length < limit and cached_ids[length] == input_ids[length]:
+                    length += 1
+            if not length:
+                self._stats["misses"] += 1
+                return None
+            self._stats["hits"] += 1
+            self._stats["tokens_reused"] += length
+            return crop(entry["past"], length)
+
+    def put(self, session_id: str, token_ids: Sequence[int], past: tuple):
+        """
+        Store the states after a turn (replacing the session's previous entry).
+
+        Args:
+            session_id: Conversation key.
+            token_ids: Token ids covered by ``past`` (prompt plus reply).
+            past: Legacy KV tuple, batch of one.
+        """
+        size = cache_bytes(past)
+        with self._lock:
+            self._remove(session_id)
+            if size > self.max_bytes:
+                self._stats["too_large"] += 1
+                return
+            self._entries[session_id] = {"ids": list(token_ids)[:cache_length(past)], "past": past,
+                                         "bytes": size, "last_used": time.monotonic()}
+            self._bytes += size
+            self._stats["stores"] += 1
+            self._drop_idle()
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self._stats["evicted_memory"] += 1
+
+    def discard(self, session_id: str):
+        """Forget a session (e.g. when the conversation is closed)."""
+        with self._lock:
+            self._remove(session_id)
+
+    def _remove(self, session_id: str):
+        entry = self._entries.pop(session_id, None)
+        if entry is not None:
+            self._bytes -= entry["bytes"]
+
+    def _drop_idle(self):
+        cutoff = time.monotonic() - self.idle_seconds
+        for session_id in [key for key, entry in self._entries.items() if entry["last_used"] < cutoff]:
+            self._remove(session_id)
+            self._stats["evicted_idle"] += 1
+
+    def get_stats(self) -> Dict:
+        """Hit/miss and eviction counters plus current memory use."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["sessions"] = len(self._entries)
+            stats["mb"] = round(self._bytes / (1024 * 1024), 2)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        stats["max_mb"] = round(self.max_bytes / (1024 * 1024), 2)
+        return stats
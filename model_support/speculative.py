@@ -0,0 +1,114 @@
+"""
+Speculative (assisted) decoding for the support model.
+
+A small draft model from the same tokenizer family proposes a few tokens at a
+time, for example Qwen2.5-0.5B-Instruct next to the 7B adapter model. The
+main model verifies them all in one forward pass. With greedy decoding the
+reply is identical to plain decoding. With sampling, the accepted tokens
+follow the main model's distribution. The loop itself is transformers'
+assisted generation (``generate(assistant_model=...)``).
+
+Acceptance is measured from forward passes during speculative requests:
+- Every main-model pass verifies one round of proposals and yields one token
+  beyond the accepted ones.
+- Every draft pass proposes one token.
+
+So ``accepted = new tokens - main passes`` and ``proposed = draft passes``.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+
+class SpeculativeDecoder:
+    """Draft model, generation options and acceptance counters for assisted generation."""
+
+    DEFAULT_NUM_DRAFT_TOKENS = 5
+    SCHEDULES = ("constant", "heuristic")
+
+    def __init__(self, model, draft_model, num_draft_tokens: int = DEFAULT_NUM_DRAFT_TOKENS,
+                 schedule: str = "constant"):
+        """
+        Initialize the decoder.
+
+        Args:
+            model: Main (verifying) model, possibly PEFT-wrapped.
+            draft_model: Small causal LM sharing the main model's tokenizer.
+            num_draft_tokens: Tokens proposed per round ('heuristic' starts here and adapts).
+            schedule: 'constant' or 'heuristic' (transformers' adaptive schedule).
+        """
+        if schedule not in self.SCHEDULES:
+            raise ValueError(f"schedule must be one of {self.SCHEDULES}")
+        self.draft_model = draft_model.eval()
+        self.num_draft_tokens = num_draft_tokens
+        self.schedule = schedule
+        self.draft_model.generation_config.num_assistant_tokens = num_draft_tokens
+        self.draft_model.generation_config.num_assistant_tokens_schedule = schedule
+
+        # Count forward passes only inside speculative requests on this thread
+        self._local = threading.local()
+        target = model.get_base_model() if hasattr(model, "get_base_model") else model
+        target.register_forward_hook(self._counter("main"))
+        self.draft_model.register_forward_hook(self._counter("draft"))
+
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "tokens": 0, "main_passes": 0, "draft_passes": 0, "seconds": 0.0}
+
+    @classmethod
+    def from_pretrained(cls, name: str, model, **options) -> "SpeculativeDecoder":
+        """Load a draft model by name/path onto the main model's device and dtype."""
+        from transformers import AutoModelForCausalLM
+
+        print(f"Loading draft model: {name}")
+        draft = AutoModelForCausalLM.from_pretrained(name, torch_dtype=model.dtype, trust_remote_code=True)
+        draft = draft.to(model.device)
+        print("✓ Draft model loaded")
+        return cls(model, draft, **options)
+
+    def _counter(self, kind: str):
+        def hook(module, inputs, outputs):
+            counts = getattr(self._local, "counts", None)
+            if counts is not None:
+                counts[kind] += 1
+        return hook
+
+    def generate_kwargs(self) -> Dict:
+        """Extra ``model.generate`` arguments enabling assisted decoding."""
+        return {"assistant_model": self.draft_model}
+
+    @contextmanager
+    def track(self) -> Iterator[Dict]:
+        """
+        Measure one speculative ``generate`` call on the current thread.
+
+        Yields:
+            Dict in which the caller stores ``tokens`` (number of new tokens).
+        """
+        self._local.counts = {"main": 0, "draft": 0}
+        record: Dict = {}
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            counts, self._local.counts = self._local.counts, None
+            with self._lock:
+                self._stats["requests"] += 1
+                self._stats["tokens"] += record.get("tokens", 0)
+                self._stats["main_passes"] += counts["main"]
+                self._stats["draft_passes"] += counts["draft"]
+                self._stats["seconds"] += time.perf_counter() - start
+
+    def get_stats(self) -> Dict:
+        """Acceptance rate, tokens per main-model pass and tokens/s."""
+        with self._lock:
+            stats = dict(self._stats)
+        accepted = max(stats["tokens"] - stats["main_passes"], 0)
+        stats["acceptance_rate"] = round(accepted / stats["draft_passes"], 3) if stats["draft_passes"] else 0.0
+        stats["tokens_per_main_pass"] = round(stats["tokens"] / stats["main_passes"], 2) if stats["main_passes"] else 0.0
+        stats["tokens_per_s"] = round(stats["tokens"] / stats["seconds"], 2) if stats["seconds"] else 0.0
+        stats["seconds"] = round(stats["seconds"], 3)
+        stats["num_draft_tokens"] = self.num_draft_tokens
+        stats["schedule"] = self.schedule
+        return stats
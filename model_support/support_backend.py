@@ -5,15 +5,37 @@ Uses Qwen2.5-7B-Instruct with LoRA adapter fine-tuned for drug recovery support.
 
 import os
 import warnings
+import threading
+from contextlib import nullcontext
 import torch
-from transformers import AutoTokenizer, AutoModelForCausalLM, BitsAndBytesConfig
+from transformers import (
+    AutoTokenizer, AutoModelForCausalLM, BitsAndBytesConfig, StoppingCriteria, StoppingCriteriaList,
+    TextIteratorStreamer
+)
 from peft import PeftModel
-from typing import Optional, List, Dict
+from typing import Iterator, Optional, List, Dict
 from pathlib import Path
 
+from cpu_export import export_dir, is_export, load_cpu_model
+from generation_scheduler import GenerationScheduler
+from history_window import HistoryWindow
+from speculative import SpeculativeDecoder
+from kv_cache import ConversationCache, PrefixCache, from_legacy, to_legacy
+
 warnings.filterwarnings("ignore")
 
 
+class _CancelCriteria(StoppingCriteria):
+    """Ends ``model.generate`` after the current token once any of ``events`` is set."""
+
+    def __init__(self, *events: threading.Event):
+        self.events = [event for event in events if event is not None]
+
+    def __call__(self, input_ids, scores, **kwargs):
+        stop = any(event.is_set() for event in self.events)
+        return torch.full((input_ids.shape[0],), stop, dtype=torch.bool, device=input_ids.device)
+
+
 class SupportBackend:
     """
     Support chat backend using Qwen2.5-7B-Instruct with LoRA adapter.
@@ -39,7 +61,13 @@ In emergencies or suicidal thoughts, direct the user to call crisis line 3033 (f
         adapter_path: Optional[str] = None,
         load_in_8bit: bool = True,
         load_in_4bit: bool = False,
-        device_map: str = "auto"
+        device_map: str = "auto",
+        max_batch_size: Optional[int] = None,
+        prefix_cache_size: Optional[int] = None,
+        session_cache_mb: Optional[int] = None,
+        cpu_export_dir: Optional[str] = None,
+        draft_model: Optional[str] = None,
+        num_draft_tokens: Optional[int] = None
     ):
         """
         Initialize the Support Backend.
@@ -49,6 +77,19 @@ In emergencies or suicidal thoughts, direct the user to call crisis line 3033 (f
             load_in_8bit: Load model in 8-bit quantization (recommended for ~8GB VRAM).
             load_in_4bit: Load model in 4-bit quantization (for ~4GB VRAM).
             device_map: Device mapping strategy ('auto', 'cuda', 'cpu').
+            max_batch_size: Conversations decoded together by the continuous-batching
+                scheduler (default: SUPPORT_MAX_BATCH_SIZE env, 0 = one ``generate`` per request).
+            prefix_cache_size: System prompts whose KV states are kept for reuse
+                (default: SUPPORT_PREFIX_CACHE_SIZE env or 4, 0 = disabled).
+            session_cache_mb: Memory for per-conversation KV states kept between turns
+                (default: SUPPORT_SESSION_CACHE_MB env or 1024, 0 = disabled).
+            cpu_export_dir: Merged, quantized export used when CUDA is unavailable
+                (default: SUPPORT_CPU_EXPORT_DIR env, else working/cpu-int8 or cpu-int4
+                if present; "" = always apply the adapter at runtime).
+            draft_model: Small same-tokenizer model for speculative decoding, e.g.
+                'Qwen/Qwen2.5-0.5B-Instruct' (default: SUPPORT_DRAFT_MODEL env, unset = off).
+            num_draft_tokens: Tokens the draft proposes per round
+                (default: SUPPORT_DRAFT_TOKENS env or 5).
         """
         if adapter_path is None:
             adapter_path = Path(__file__).parent / "working" / "phase3-final"
@@ -57,14 +98,28 @@ In emergencies or suicidal thoughts, direct the user to call crisis line 3033 (f
         
         self.adapter_path = adapter_path
         
-        # Check if adapter exists
-        if not (adapter_path / "adapter_model.safetensors").exists():
-            raise FileNotFoundError(f"Adapter not found at {adapter_path}")
-        
         # Set device
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
         print(f"Using device: {self.device}")
         
+        # On CPU, prefer the merged, quantized export (see cpu_export.py)
+        self.cpu_export_dir = None
+        if self.device == "cpu":
+            if cpu_export_dir is None:
+                cpu_export_dir = os.getenv("SUPPORT_CPU_EXPORT_DIR")
+            if cpu_export_dir is None:
+                cpu_export_dir = next((str(export_dir(bits)) for bits in (8, 4) if is_export(export_dir(bits))), "")
+            if cpu_export_dir:
+                if not is_export(Path(cpu_export_dir)):
+                    raise FileNotFoundError(
+                        f"CPU export not found at {cpu_export_dir}. Run 'python cpu_export.py export' first."
+                    )
+                self.cpu_export_dir = Path(cpu_export_dir)
+        
+        # Check if adapter exists (not needed once merged into an export)
+        if self.cpu_export_dir is None and not (adapter_path / "adapter_model.safetensors").exists():
+            raise FileNotFoundError(f"Adapter not found at {adapter_path}")
+        
         # Configure quantization
         self.quantization_config = None
         if load_in_4bit and torch.cuda.is_available():
@@ -81,11 +136,103 @@ In emergencies or suicidal thoughts, direct the user to call crisis line 3033 (f
         
         # Load model and tokenizer
         self._load_model(device_map)
+        self._init_serving(max_batch_size, prefix_cache_size, session_cache_mb, draft_model, num_draft_tokens)
         
         print("✓ Support Backend initialized successfully")
     
+    @classmethod
+    def from_model(cls, model, tokenizer, **serving_options) -> "SupportBackend":
+        """
+        Wrap an already loaded model and tokenizer (e.g. a stand-in model for benchmarks).
+        
+        Args:
+            model: Causal LM with the support model's chat format.
+            tokenizer: Matching tokenizer.
+            **serving_options: max_batch_size, prefix_cache_size, session_cache_mb,
+                draft_model (name or loaded model), num_draft_tokens.
+        """
+        backend = cls.__new__(cls)
+        backend.adapter_path = None
+        backend.cpu_export_dir = None
+        backend.device = str(model.device)
+        backend.quantization_config = None
+        backend.model, backend.tokenizer = model, tokenizer
+        if backend.tokenizer.pad_token is None:
+            backend.tokenizer.pad_token = backend.tokenizer.eos_token
+        backend._init_serving(
+            serving_options.get("max_batch_size"),
+            serving_options.get("prefix_cache_size"),
+            serving_options.get("session_cache_mb"),
+            serving_options.get("draft_model"),
+            serving_options.get("num_draft_tokens")
+        )
+        return backend
+    
+    def _init_serving(
+        self,
+        max_batch_size: Optional[int],
+        prefix_cache_size: Optional[int],
+        session_cache_mb: Optional[int],
+        draft_model=None,
+        num_draft_tokens: Optional[int] = None
+    ):
+        """Set up prompt windowing, KV caches and the batching scheduler (None = read from environment)."""
+        # Prompts are assembled from cached per-message token ids within a token budget
+        self.history_window = HistoryWindow(
+            self.tokenizer,
+            max_tokens=int(os.getenv("SUPPORT_CONTEXT_TOKENS", str(HistoryWindow.DEFAULT_MAX_TOKENS)))
+        )
+        
+        # System-prompt KV states, computed once and reused by every request's prefill
+        if prefix_cache_size is None:
+            prefix_cache_size = int(os.getenv("SUPPORT_PREFIX_CACHE_SIZE", str(PrefixCache.DEFAULT_MAX_ENTRIES)))
+        self.prefix_cache = PrefixCache(self.model, max_entries=prefix_cache_size) if prefix_cache_size > 0 else None
+        
+        # Continuous batching: one scheduler thread serves all concurrent conversations
+        if max_batch_size is None:
+            max_batch_size = int(os.getenv("SUPPORT_MAX_BATCH_SIZE", "0"))
+        self.scheduler = None
+        if max_batch_size > 0:
+            self.scheduler = GenerationScheduler(self.model, self.tokenizer, max_batch_size=max_batch_size)
+            print(f"✓ Continuous batching enabled (max batch {max_batch_size})")
+        
+        # Per-conversation KV states, so each turn only prefills the new message
+        if session_cache_mb is None:
+            session_cache_mb = int(os.getenv("SUPPORT_SESSION_CACHE_MB", str(ConversationCache.DEFAULT_MAX_MB)))
+        self.session_cache = None
+        if session_cache_mb > 0:
+            self.session_cache = ConversationCache(
+                max_bytes=session_cache_mb * 1024 * 1024,
+                idle_seconds=float(os.getenv("SUPPORT_SESSION_IDLE_SECONDS", str(ConversationCache.DEFAULT_IDLE_SECONDS)))
+            )
+        
+        # Speculative decoding: a draft model proposes tokens, this model verifies them.
+        # Used by the per-request generate path (the batching scheduler does not speculate).
+        if draft_model is None:
+            draft_model = os.getenv("SUPPORT_DRAFT_MODEL") or None
+        if num_draft_tokens is None:
+            num_draft_tokens = int(os.getenv("SUPPORT_DRAFT_TOKENS", str(SpeculativeDecoder.DEFAULT_NUM_DRAFT_TOKENS)))
+        self.speculative = None
+        if draft_model is not None:
+            options = {
+                "num_draft_tokens": num_draft_tokens,
+                "schedule": os.getenv("SUPPORT_DRAFT_SCHEDULE", "constant")
+            }
+            if isinstance(draft_model, str):
+                self.speculative = SpeculativeDecoder.from_pretrained(draft_model, self.model, **options)
+            else:
+                self.speculative = SpeculativeDecoder(self.model, draft_model, **options)
+            if self.scheduler is not None:
+                print("⚠ Speculative decoding is not applied while continuous batching is enabled")
+            else:
+                print(f"✓ Speculative decoding enabled ({num_draft_tokens} draft tokens)")
+    
     def _load_model(self, device_map: str):
         """Load base model with LoRA adapter."""
+        if self.cpu_export_dir is not None:
+            self._load_cpu_export()
+            return
+        
         print(f"Loading base model: {self.BASE_MODEL}")
         print("This may take a few minutes on first run...")
         
@@ -128,6 +275,16 @@ In emergencies or suicidal thoughts, direct the user to call crisis line 3033 (f
         self.model.eval()
         print("✓ LoRA adapter loaded")
 
+    def _load_cpu_export(self):
+        """Load the merged, weight-only quantized export (memory-mapped, no adapter step)."""
+        print(f"Loading merged CPU export from {self.cpu_export_dir}")
+        self.tokenizer = AutoTokenizer.from_pretrained(str(self.cpu_export_dir), trust_remote_code=True)
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+        dtype = getattr(torch, os.getenv("SUPPORT_CPU_DTYPE", "bfloat16"))
+        self.model = load_cpu_model(self.cpu_export_dir, dtype=dtype)
+        print("✓ Merged model loaded")
+    
     def generate_response(
         self,
         user_message: str,
@@ -136,7 +293,9 @@ In emergencies or suicidal thoughts, direct the user to call crisis line 3033 (f
         max_new_tokens: int = 512,
         temperature: float = 0.7,
         top_p: float = 0.9,
-        do_sample: bool = True
+        do_sample: bool = True,
+        session_id: Optional[str] = None,
+        cancel: Optional[threading.Event] = None
     ) -> str:
         """
         Generate a supportive response to user message.
@@ -149,47 +308,43 @@ In emergencies or suicidal thoughts, direct the user to call crisis line 3033 (f
             temperature: Sampling temperature (higher = more creative).
             top_p: Nucleus sampling parameter.
             do_sample: Whether to use sampling (False = greedy decoding).
+            session_id: Conversation key; the KV states are kept after this turn
+                so the next one only prefills the new message.
+            cancel: Once set, generation stops at the next token and the partial
+                reply is returned (its KV states are not kept).
             
         Returns:
             Generated response string.
         """
-        # Build messages list
-        messages = []
-        
-        # Add system prompt
-        system = system_prompt or self.DEFAULT_SYSTEM_PROMPT
-        messages.append({"role": "system", "content": system})
-        
-        # Add conversation history
-        if conversation_history:
-            messages.extend(conversation_history)
-        
-        # Add current user message
-        messages.append({"role": "user", "content": user_message})
-        
-        # Apply chat template
-        prompt = self.tokenizer.apply_chat_template(
-            messages,
-            tokenize=False,
-            add_generation_prompt=True
-        )
-        
-        # Tokenize
-        inputs = self.tokenizer(
-            prompt,
-            return_tensors="pt",
-            truncation=True,
-            max_length=4096
-        )
+        inputs = self._prepare_inputs(user_message, conversation_history, system_prompt, session_id)
+        prefix_past = self._start_past(inputs, system_prompt, session_id)
+        keep_cache = session_id is not None and self.session_cache is not None
         
-        # Move to device
-        if torch.cuda.is_available():
-            inputs = {k: v.to(self.model.device) for k, v in inputs.items()}
+        if self.scheduler is not None:
+            handle = self.scheduler.submit(
+                inputs['input_ids'][0].tolist(),
+                max_new_tokens=max_new_tokens,
+                temperature=temperature,
+                top_p=top_p,
+                do_sample=do_sample,
+                prefix_past=prefix_past,
+                keep_cache=keep_cache,
+                cancel_event=cancel
+            )
+            response = handle.result()
+            if keep_cache and handle.past is not None:
+                self.session_cache.put(session_id, handle.past_ids, handle.past)
+            return response.strip()
         
         # Generate
-        with torch.no_grad():
+        speculative = self.speculative.track() if self.speculative else nullcontext({})
+        with torch.no_grad(), speculative as record:
             outputs = self.model.generate(
                 **inputs,
+                **(self.speculative.generate_kwargs() if self.speculative else {}),
+                past_key_values=from_legacy(prefix_past) if prefix_past else None,
+                stopping_criteria=StoppingCriteriaList([_CancelCriteria(cancel)]) if cancel else None,
+                return_dict_in_generate=True,
                 max_new_tokens=max_new_tokens,
                 temperature=temperature,
                 top_p=top_p,
@@ -197,15 +352,179 @@ In emergencies or suicidal thoughts, direct the user to call crisis line 3033 (f
                 pad_token_id=self.tokenizer.pad_token_id,
                 eos_token_id=self.tokenizer.eos_token_id
             )
+            record["tokens"] = outputs.sequences.shape[1] - inputs['input_ids'].shape[1]
+        if keep_cache and not (cancel and cancel.is_set()):
+            self.session_cache.put(session_id, outputs.sequences[0].tolist(), to_legacy(outputs.past_key_values))
         
         # Decode response (only the new tokens)
         response = self.tokenizer.decode(
-            outputs[0][inputs['input_ids'].shape[1]:],
+            outputs.sequences[0][inputs['input_ids'].shape[1]:],
             skip_special_tokens=True
         )
         
         return response.strip()
     
+    def generate_response_stream(
+        self,
+        user_message: str,
+        conversation_history: Optional[List[Dict[str, str]]] = None,
+        system_prompt: Optional[str] = None,
+        max_new_tokens: int = 512,
+        temperature: float = 0.7,
+        top_p: float = 0.9,
+        do_sample: bool = True,
+        session_id: Optional[str] = None,
+        cancel: Optional[threading.Event] = None
+    ) -> Iterator[str]:
+        """
+        Generate a supportive response, yielding text as tokens are decoded.
+        
+        ``model.generate`` runs in a background thread and feeds a
+        ``TextIteratorStreamer`` (or the request joins the continuous-batching
+        scheduler); arguments are the same as ``generate_response``. Closing
+        the iterator early, or setting ``cancel``, stops generation at the next
+        token; the iterator only finishes once generation has stopped.
+        
+        Yields:
+            Decoded text pieces (joined, they equal the unstripped full response).
+        """
+        inputs = self._prepare_inputs(user_message, conversation_history, system_prompt, session_id)
+        prefix_past = self._start_past(inputs, system_prompt, session_id)
+        keep_cache = session_id is not None and self.session_cache is not None
+        
+        if self.scheduler is not None:
+            handle = self.scheduler.submit(
+                inputs['input_ids'][0].tolist(),
+                max_new_tokens=max_new_tokens,
+                temperature=temperature,
+                top_p=top_p,
+                do_sample=do_sample,
+                prefix_past=prefix_past,
+                keep_cache=keep_cache,
+                cancel_event=cancel
+            )
+            try:
+                yield from handle.stream()
+            finally:
+                # Consumer went away: free the batch slot at the next token
+                if not handle._done.is_set():
+                    handle.cancel()
+            if keep_cache and handle.past is not None:
+                self.session_cache.put(session_id, handle.past_ids, handle.past)
+            return
+        
+        streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True, skip_special_tokens=True)
+        stop = threading.Event()
+        errors = []
+        results = []
+        
+        def generate():
+            try:
+                # Grad mode is thread-local, so disable it in the generation thread
+                speculative = self.speculative.track() if self.speculative else nullcontext({})
+                with torch.no_grad(), speculative as record:
+                    results.append(self.model.generate(
+                        **inputs,
+                        **(self.speculative.generate_kwargs() if self.speculative else {}),
+                        past_key_values=from_legacy(prefix_past) if prefix_past else None,
+                        stopping_criteria=StoppingCriteriaList([_CancelCriteria(stop, cancel)]),
+                        return_dict_in_generate=True,
+                        streamer=streamer,
+                        max_new_tokens=max_new_tokens,
+                        temperature=temperature,
+                        top_p=top_p,
+                        do_sample=do_sample,
+                        pad_token_id=self.tokenizer.pad_token_id,
+                        eos_token_id=self.tokenizer.eos_token_id
+                    ))
+                    record["tokens"] = results[0].sequences.shape[1] - inputs['input_ids'].shape[1]
+            except Exception as e:
+                errors.append(e)
+                # Unblock the consumer waiting on the streamer
+                streamer.end()
+        
+        thread = threading.Thread(target=generate, name="support-generate", daemon=True)
+        thread.start()
+        try:
+            for text in streamer:
+                if text:
+                    yield text
+        finally:
+            # Never leave generate running after the consumer is gone
+            stop.set()
+            thread.join()
+        
+        if errors:
+            raise errors[0]
+        if keep_cache and results and not (cancel and cancel.is_set()):
+            self.session_cache.put(
+                session_id, results[0].sequences[0].tolist(), to_legacy(results[0].past_key_values)
+            )
+    
+    def _prepare_inputs(
+        self,
+        user_message: str,
+        conversation_history: Optional[List[Dict[str, str]]],
+        system_prompt: Optional[str],
+        session_id: Optional[str] = None
+    ) -> Dict:
+        """
+        Build the prompt token ids onto the model device.
+        
+        The system prompt and the latest message are always kept; the oldest
+        history turns are dropped to fit SUPPORT_CONTEXT_TOKENS (see ``HistoryWindow``).
+        """
+        system = system_prompt or self.DEFAULT_SYSTEM_PROMPT
+        input_ids, _ = self.history_window.build(system, conversation_history, user_message, session_id)
+        
+        inputs = {
+            "input_ids": torch.tensor([input_ids], dtype=torch.long),
+            "attention_mask": torch.ones((1, len(input_ids)), dtype=torch.long)
+        }
+        
+        # Move to device
+        if torch.cuda.is_available():
+            inputs = {k: v.to(self.model.device) for k, v in inputs.items()}
+        
+        return inputs
+    
+    def _start_past(self, inputs: Dict, system_prompt: Optional[str], session_id: Optional[str]) -> Optional[tuple]:
+        """KV states to start the prefill from: the conversation's last turn, else the system prompt."""
+        if session_id is not None and self.session_cache is not None:
+            past = self.session_cache.get(session_id, inputs['input_ids'][0].tolist())
+            if past is not None:
+                return past
+        return self._prefix_past(inputs, system_prompt)
+    
+    def end_session(self, session_id: str):
+        """Release the KV states and window position kept for a conversation."""
+        self.history_window.forget(session_id)
+        if self.session_cache is not None:
+            self.session_cache.discard(session_id)
+    
+    def get_stats(self) -> Dict:
+        """Prompt windowing, KV-cache and batching counters."""
+        return {
+            "history": self.history_window.get_stats(),
+            "prefix_cache": self.prefix_cache.get_stats() if self.prefix_cache else None,
+            "session_cache": self.session_cache.get_stats() if self.session_cache else None,
+            "scheduler": self.scheduler.get_stats() if self.scheduler else None,
+            "speculative": self.speculative.get_stats() if self.speculative else None,
+        }
+    
+    def _prefix_past(self, inputs: Dict, system_prompt: Optional[str]) -> Optional[tuple]:
+        """Cached KV states for the system-prompt turn the prompt starts with, if any."""
+        if self.prefix_cache is None:
+            return None
+        system = system_prompt or self.DEFAULT_SYSTEM_PROMPT
+        prefix_ids = self.history_window.message_ids({"role": "system", "content": system})
+        
+        # Reuse only when the prompt tokenizes to exactly this prefix plus more tokens
+        input_ids = inputs['input_ids'][0].tolist()
+        if len(input_ids) <= len(prefix_ids) or input_ids[:len(prefix_ids)] != prefix_ids:
+            return None
+        return self.prefix_cache.get(prefix_ids)
+    
     def chat(
         self,
         user_message: str,
@@ -218,7 +537,8 @@ In emergencies or suicidal thoughts, direct the user to call crisis line 3033 (f
         Args:
             user_message: User's message.
             conversation_history: Previous conversation history.
-            **kwargs: Additional generation parameters.
+            **kwargs: Additional generation parameters (pass ``session_id`` to
+                keep the KV states between turns).
             
         Returns:
             Tuple of (response, updated_history)
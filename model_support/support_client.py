@@ -0,0 +1,312 @@
+"""
+Client for the out-of-process support-model worker (see support_worker.py).
+
+The API processes talk to one worker over a Unix socket, one JSON object per
+line. Each request opens its own connection and the worker closes it after a
+``generate``, so a request is cancelled in the worker by closing that
+connection. This module only uses the standard
+library, so importing it does not pull torch or transformers into the API
+process.
+
+Requests:
+- ``{"op": "generate", "message": ..., "session_id": ..., "history": ..., "params": {...}, "stream": bool}``
+- ``{"op": "end_session", "session_id": ...}``
+- ``{"op": "stats"}``
+
+Events sent back:
+- ``{"event": "token", "text": ...}`` (streaming requests only)
+- ``{"event": "done", "response": ..., "wait_ms": ..., "generation_ms": ...}``
+- ``{"event": "error", "detail": ..., "busy": bool}``
+- ``{"event": "stats", "stats": {...}}``
+"""
+
+import asyncio
+import json
+import os
+import socket
+import threading
+import time
+from contextlib import aclosing
+from typing import AsyncIterator, Dict, Iterator, List, Optional
+
+DEFAULT_SOCKET = "/tmp/amal-support.sock"
+
+# Generation options forwarded to SupportBackend.generate_response
+GENERATION_PARAMS = ("system_prompt", "max_new_tokens", "temperature", "top_p", "do_sample")
+
+# Replies can be long; allow large lines on the asyncio streams
+STREAM_LIMIT = 16 * 1024 * 1024
+
+
+class SupportWorkerError(Exception):
+    """The worker is unreachable, rejected the request, or failed while generating."""
+
+    def __init__(self, detail: str, busy: bool = False, unreachable: bool = False):
+        super().__init__(detail)
+        self.busy = busy
+        self.unreachable = unreachable
+
+
+def encode(message: Dict) -> bytes:
+    """One protocol line."""
+    return (json.dumps(message, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+class SupportClient:
+    """Sends support generation jobs to the worker and receives results or token streams."""
+
+    DEFAULT_CONNECT_TIMEOUT = 2.0
+    DEFAULT_TIMEOUT = 300.0
+
+    def __init__(
+        self,
+        socket_path: Optional[str] = None,
+        connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+        timeout: float = DEFAULT_TIMEOUT
+    ):
+        """
+        Initialize the client.
+
+        Args:
+            socket_path: Worker socket (default: SUPPORT_WORKER_SOCKET env or /tmp/amal-support.sock).
+            connect_timeout: Seconds to wait for a connection before giving up.
+            timeout: Seconds to wait for the next event of a running request.
+        """
+        self.socket_path = socket_path or os.getenv("SUPPORT_WORKER_SOCKET", DEFAULT_SOCKET)
+        self.connect_timeout = connect_timeout
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "completed": 0, "failed": 0, "busy": 0, "unreachable": 0,
+                       "round_trip_ms": 0.0, "queue_wait_ms": 0.0}
+
+    def _request(self, message: str, session_id: Optional[str], history: Optional[List[Dict[str, str]]],
+                 stream: bool, params: Dict) -> Dict:
+        unknown = set(params) - set(GENERATION_PARAMS)
+        if unknown:
+            raise ValueError(f"Unknown generation parameters: {sorted(unknown)}")
+        return {"op": "generate", "message": message, "session_id": session_id,
+                "history": history, "stream": stream, "params": params}
+
+    async def _open(self):
+        try:
+            return await asyncio.wait_for(
+                asyncio.open_unix_connection(self.socket_path, limit=STREAM_LIMIT), self.connect_timeout
+            )
+        except (OSError, asyncio.TimeoutError) as e:
+            raise SupportWorkerError(f"Support worker unreachable at {self.socket_path}: {e}", unreachable=True) from e
+
+    async def _events(self, request: Dict) -> AsyncIterator[Dict]:
+        """Send one request and yield its events until ``done``/``error``/``stats``."""
+        reader, writer = await self._open()
+        try:
+            writer.write(encode(request))
+            await writer.drain()
+            while True:
+                line = await asyncio.wait_for(reader.readline(), self.timeout)
+                if not line:
+                    raise SupportWorkerError("Support worker closed the connection")
+                event = json.loads(line)
+                yield event
+                if event["event"] in ("done", "error", "stats"):
+                    return
+        finally:
+            writer.close()
+
+    async def generate(
+        self,
+        message: str,
+        session_id: Optional[str] = None,
+        history: Optional[List[Dict[str, str]]] = None,
+        **params
+    ) -> str:
+        """
+        Generate a full reply.
+
+        Args:
+            message: The user's message.
+            session_id: Conversation key; the worker keeps its history and KV states.
+            history: Explicit previous messages (overrides the worker-kept history).
+            **params: Generation options (see ``GENERATION_PARAMS``).
+
+        Returns:
+            Generated response string.
+
+        Raises:
+            SupportWorkerError: If the worker is unreachable, busy or fails.
+        """
+        start = time.perf_counter()
+        self._count("requests")
+        response = None
+        try:
+            async with aclosing(self._events(self._request(message, session_id, history, False, params))) as events:
+                async for event in events:
+                    if event["event"] == "error":
+                        raise SupportWorkerError(event["detail"], busy=event.get("busy", False))
+                    if event["event"] == "done":
+                        self._finish(start, event)
+                        response = event["response"]
+        except Exception as e:
+            self._fail(e)
+            raise
+        return response
+
+    async def stream(
+        self,
+        message: str,
+        session_id: Optional[str] = None,
+        history: Optional[List[Dict[str, str]]] = None,
+        **params
+    ) -> AsyncIterator[str]:
+        """
+        Generate a reply, yielding text pieces as the worker decodes them.
+
+        Arguments are the same as ``generate``. Stopping the iteration closes
+        the connection, which cancels the job in the worker.
+        """
+        start = time.perf_counter()
+        self._count("requests")
+        try:
+            async with aclosing(self._events(self._request(message, session_id, history, True, params))) as events:
+                async for event in events:
+                    if event["event"] == "token":
+                        yield event["text"]
+                    elif event["event"] == "error":
+                        raise SupportWorkerError(event["detail"], busy=event.get("busy", False))
+                    elif event["event"] == "done":
+                        self._finish(start, event)
+        except Exception as e:
+            self._fail(e)
+            raise
+
+    def stream_sync(
+        self,
+        message: str,
+        session_id: Optional[str] = None,
+        history: Optional[List[Dict[str, str]]] = None,
+        **params
+    ) -> Iterator[str]:
+        """Blocking ``stream`` for callers that drain iterators in a thread (e.g. ``stream_in_stage``)."""
+        start = time.perf_counter()
+        self._count("requests")
+        try:
+            with self._connect() as sock:
+                sock.sendall(encode(self._request(message, session_id, history, True, params)))
+                sock.settimeout(self.timeout)
+                for event in self._read_events(sock):
+                    if event["event"] == "token":
+                        yield event["text"]
+                    elif event["event"] == "error":
+                        raise SupportWorkerError(event["detail"], busy=event.get("busy", False))
+                    elif event["event"] == "done":
+                        self._finish(start, event)
+                        return
+                raise SupportWorkerError("Support worker closed the connection")
+        except Exception as e:
+            self._fail(e)
+            raise
+
+    def _connect(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.connect_timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError as e:
+            sock.close()
+            raise SupportWorkerError(f"Support worker unreachable at {self.socket_path}: {e}", unreachable=True) from e
+        return sock
+
+    @staticmethod
+    def _read_events(sock: socket.socket) -> Iterator[Dict]:
+        buffer = b""
+        while True:
+            data = sock.recv(65536)
+            if not data:
+                return
+            buffer += data
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line:
+                    yield json.loads(line)
+
+    def _call(self, request: Dict) -> Dict:
+        """Blocking single-event request (stats, end_session)."""
+        with self._connect() as sock:
+            sock.sendall(encode(request))
+            for event in self._read_events(sock):
+                if event["event"] == "error":
+                    raise SupportWorkerError(event["detail"])
+                return event
+        raise SupportWorkerError("Support worker closed the connection")
+
+    def ping(self) -> bool:
+        """Whether the worker answers a stats request."""
+        try:
+            self._call({"op": "stats"})
+            return True
+        except (SupportWorkerError, OSError, ValueError):
+            return False
+
+    def end_session(self, session_id: str):
+        """Release the history and KV states the worker keeps for a conversation."""
+        self._call({"op": "end_session", "session_id": session_id})
+
+    def worker_stats(self) -> Optional[Dict]:
+        """The worker's queue, latency and model counters (None if unreachable)."""
+        try:
+            return self._call({"op": "stats"})["stats"]
+        except (SupportWorkerError, OSError, ValueError):
+            return None
+
+    async def worker_stats_async(self) -> Optional[Dict]:
+        """``worker_stats`` for event-loop callers: a stalled worker never blocks the loop."""
+        try:
+            # Same bound as the blocking call: connect timeout plus one for the reply
+            return await asyncio.wait_for(self._stats_event(), 2 * self.connect_timeout)
+        except (SupportWorkerError, OSError, ValueError, asyncio.TimeoutError):
+            return None
+
+    async def _stats_event(self) -> Dict:
+        async with aclosing(self._events({"op": "stats"})) as events:
+            async for event in events:
+                if event["event"] == "error":
+                    raise SupportWorkerError(event["detail"])
+                return event["stats"]
+        raise SupportWorkerError("Support worker closed the connection")
+
+    def _count(self, key: str):
+        with self._lock:
+            self._stats[key] += 1
+
+    def _finish(self, start: float, event: Dict):
+        with self._lock:
+            self._stats["completed"] += 1
+            self._stats["round_trip_ms"] += (time.perf_counter() - start) * 1000.0
+            self._stats["queue_wait_ms"] += event.get("wait_ms", 0.0)
+
+    def _fail(self, error: Exception):
+        with self._lock:
+            self._stats["failed"] += 1
+            if isinstance(error, SupportWorkerError):
+                self._stats["busy"] += error.busy
+                self._stats["unreachable"] += error.unreachable
+
+    def get_stats(self) -> Dict:
+        """This process's request counters plus the worker's own stats."""
+        stats = self._local_stats()
+        stats["worker"] = self.worker_stats()
+        return stats
+
+    async def get_stats_async(self) -> Dict:
+        """``get_stats`` for event-loop callers (e.g. the API's /metrics)."""
+        stats = self._local_stats()
+        stats["worker"] = await self.worker_stats_async()
+        return stats
+
+    def _local_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+        completed = stats["completed"]
+        stats["round_trip_ms_mean"] = round(stats.pop("round_trip_ms") / completed, 1) if completed else 0.0
+        stats["queue_wait_ms_mean"] = round(stats.pop("queue_wait_ms") / completed, 1) if completed else 0.0
+        stats["socket"] = self.socket_path
+        return stats
@@ -0,0 +1,353 @@
+"""
+Dedicated generation process for the support model.
+
+The worker loads ``SupportBackend`` once and serves every API process over a
+Unix socket (protocol in support_client.py). uvicorn or preforked workers then
+share one copy of the model, and generation never blocks their event loops.
+
+Jobs wait in one bounded FIFO queue. A fixed number of generation threads
+take jobs from it: one thread by default, or one per batch slot when the
+continuous-batching scheduler is enabled, so concurrent jobs are decoded
+together. Once the queue is full, new jobs are answered with a ``busy``
+error right away. If a client disconnects, its job is dropped while still
+queued. A running job stops generating at the next token (freeing its batch
+slot), and its result is discarded. A generation thread only takes the next
+job once the model has stopped.
+
+Conversation history is kept here per ``session_id``, next to the KV states
+the backend keeps. Every API process can then continue any conversation.
+
+Usage:
+    python support_worker.py
+    python support_worker.py --socket /tmp/amal-support.sock --max-queue 64
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import queue
+import signal
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Dict, List, Optional
+
+from support_client import DEFAULT_SOCKET, GENERATION_PARAMS, STREAM_LIMIT, encode
+
+# Marks the end of the job queue for the generation threads
+_STOP = object()
+
+
+class _Job:
+    """One generation request waiting in, or taken from, the worker queue."""
+
+    def __init__(self, request: Dict, emit: Callable[[Dict], None]):
+        self.message = request["message"]
+        self.session_id = request.get("session_id")
+        self.history = request.get("history")
+        self.stream = bool(request.get("stream"))
+        self.params = {key: value for key, value in (request.get("params") or {}).items() if key in GENERATION_PARAMS}
+        self.emit = emit
+        self.cancelled = threading.Event()
+        self.enqueued_at = time.perf_counter()
+
+
+class SupportWorker:
+    """Bounded job queue and generation threads in front of one ``SupportBackend``."""
+
+    DEFAULT_MAX_QUEUE = 64
+
+    # Conversations whose history is kept (least recently used is dropped)
+    MAX_SESSIONS = 10000
+
+    # Latency samples kept for percentiles
+    WINDOW = 1000
+
+    def __init__(self, backend, concurrency: Optional[int] = None, max_queue: Optional[int] = None):
+        """
+        Initialize the worker and start its generation threads.
+
+        Args:
+            backend: Loaded ``SupportBackend``.
+            concurrency: Jobs generated at once (default: SUPPORT_WORKER_CONCURRENCY env,
+                else the scheduler's batch size, else 1).
+            max_queue: Jobs allowed to wait before new ones are rejected
+                (default: SUPPORT_WORKER_QUEUE env or 64).
+        """
+        if concurrency is None:
+            scheduler = getattr(backend, "scheduler", None)
+            concurrency = int(os.getenv("SUPPORT_WORKER_CONCURRENCY", scheduler.max_batch_size if scheduler else 1))
+        if max_queue is None:
+            max_queue = int(os.getenv("SUPPORT_WORKER_QUEUE", self.DEFAULT_MAX_QUEUE))
+        if concurrency < 1 or max_queue < 0:
+            raise ValueError("concurrency must be >= 1 and max_queue >= 0")
+
+        self.backend = backend
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self._jobs: queue.Queue = queue.Queue()
+        self._histories: "OrderedDict[str, List[Dict[str, str]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._active = 0
+        self._connections = 0
+        self._stats = {"requests": 0, "completed": 0, "failed": 0, "rejected": 0, "cancelled": 0}
+        self._latency = {name: deque(maxlen=self.WINDOW) for name in ("wait", "generation", "ttft")}
+
+        self._threads = [
+            threading.Thread(target=self._run, name=f"support-worker-{i}", daemon=True)
+            for i in range(concurrency)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, request: Dict, emit: Callable[[Dict], None]) -> Optional[_Job]:
+        """
+        Queue a generation request.
+
+        Args:
+            request: Decoded ``generate`` request.
+            emit: Called from a generation thread with each event for the client.
+
+        Returns:
+            The queued job, or None if the queue is full (a ``busy`` error was emitted).
+        """
+        with self._lock:
+            self._stats["requests"] += 1
+            if self._waiting >= self.max_queue:
+                self._stats["rejected"] += 1
+                emit({"event": "error", "detail": "Support worker queue is full", "busy": True})
+                return None
+            self._waiting += 1
+        job = _Job(request, emit)
+        self._jobs.put(job)
+        return job
+
+    def _run(self):
+        while True:
+            job = self._jobs.get()
+            if job is _STOP:
+                return
+            started = time.perf_counter()
+            with self._lock:
+                self._waiting -= 1
+                if job.cancelled.is_set():
+                    self._stats["cancelled"] += 1
+                    continue
+                self._active += 1
+                self._latency["wait"].append(started - job.enqueued_at)
+            try:
+                self._generate(job, started)
+            finally:
+                with self._lock:
+                    self._active -= 1
+
+    def _generate(self, job: _Job, started: float):
+        history = job.history
+        if history is None and job.session_id is not None:
+            with self._lock:
+                history = list(self._histories.get(job.session_id, []))
+
+        try:
+            if job.stream:
+                parts = []
+                chunks = self.backend.generate_response_stream(
+                    job.message, history, session_id=job.session_id, cancel=job.cancelled, **job.params
+                )
+                try:
+                    for text in chunks:
+                        if job.cancelled.is_set():
+                            break
+                        if not parts:
+                            self._record("ttft", time.perf_counter() - started)
+                        parts.append(text)
+                        job.emit({"event": "token", "text": text})
+                finally:
+                    # Returns once the backend's generation has actually stopped
+                    chunks.close()
+                response = "".join(parts).strip()
+            else:
+                response = self.backend.generate_response(
+                    job.message, history, session_id=job.session_id, cancel=job.cancelled, **job.params
+                )
+        except Exception as e:
+            with self._lock:
+                self._stats["failed"] += 1
+            job.emit({"event": "error", "detail": str(e), "busy": False})
+            return
+
+        finished = time.perf_counter()
+        if job.cancelled.is_set():
+            with self._lock:
+                self._stats["cancelled"] += 1
+            return
+        if job.session_id is not None:
+            self._remember(job.session_id, (history or []) + [
+                {"role": "user", "content": job.message},
+                {"role": "assistant", "content": response},
+            ])
+        with self._lock:
+            self._stats["completed"] += 1
+            self._latency["generation"].append(finished - started)
+        job.emit({
+            "event": "done",
+            "response": response,
+            "wait_ms": round((started - job.enqueued_at) * 1000.0, 1),
+            "generation_ms": round((finished - started) * 1000.0, 1),
+        })
+
+    def _record(self, name: str, seconds: float):
+        with self._lock:
+            self._latency[name].append(seconds)
+
+    def _remember(self, session_id: str, history: List[Dict[str, str]]):
+        with self._lock:
+            self._histories[session_id] = history
+            self._histories.move_to_end(session_id)
+            while len(self._histories) > self.MAX_SESSIONS:
+                dropped, _ = self._histories.popitem(last=False)
+                self.backend.end_session(dropped)
+
+    def end_session(self, session_id: str):
+        """Forget a conversation's history and KV states."""
+        with self._lock:
+            self._histories.pop(session_id, None)
+        self.backend.end_session(session_id)
+
+    def close(self):
+        """Stop the generation threads once the queued jobs are done."""
+        for _ in self._threads:
+            self._jobs.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+
+    def get_stats(self) -> Dict:
+        """Queue depth, wait/generation/first-token latency and the backend's counters."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update(queue_depth=self._waiting, active=self._active, connections=self._connections,
+                         sessions=len(self._histories))
+            samples = {name: sorted(values) for name, values in self._latency.items()}
+        stats["concurrency"] = self.concurrency
+        stats["max_queue"] = self.max_queue
+        for name, ordered in samples.items():
+            stats[f"{name}_ms"] = {
+                "p50": round(_percentile(ordered, 50) * 1000.0, 1),
+                "p95": round(_percentile(ordered, 95) * 1000.0, 1),
+                "max": round(ordered[-1] * 1000.0, 1) if ordered else 0.0,
+            }
+        stats["backend"] = self.backend.get_stats()
+        return stats
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serve one client connection: requests are answered in order, and a ``generate`` ends it."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._connections += 1
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    return
+                try:
+                    request = json.loads(line)
+                    op = request.get("op")
+                    if op == "generate":
+                        await self._serve_generate(request, reader, writer, loop)
+                        return
+                    if op == "stats":
+                        event = {"event": "stats", "stats": self.get_stats()}
+                    elif op == "end_session":
+                        self.end_session(request["session_id"])
+                        event = {"event": "done", "response": ""}
+                    else:
+                        event = {"event": "error", "detail": f"Unknown op: {op}", "busy": False}
+                except (ValueError, KeyError, TypeError) as e:
+                    event = {"event": "error", "detail": f"Bad request: {e}", "busy": False}
+                writer.write(encode(event))
+                await writer.drain()
+        except ConnectionError:
+            return
+        finally:
+            with self._lock:
+                self._connections -= 1
+            writer.close()
+
+    async def _serve_generate(self, request: Dict, reader: asyncio.StreamReader,
+                              writer: asyncio.StreamWriter, loop: asyncio.AbstractEventLoop):
+        """Queue a job and forward its events; a closed connection cancels the job."""
+        events: asyncio.Queue = asyncio.Queue()
+        job = self.submit(request, lambda event: loop.call_soon_threadsafe(events.put_nowait, event))
+        if job is None:
+            writer.write(encode(await events.get()))
+            await writer.drain()
+            return
+
+        # The client sends nothing else while a job runs, so EOF means it went away
+        disconnected = asyncio.ensure_future(reader.read(1))
+        try:
+            while True:
+                next_event = asyncio.ensure_future(events.get())
+                done, _ = await asyncio.wait({next_event, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+                if next_event not in done:
+                    next_event.cancel()
+                    job.cancelled.set()
+                    return
+                event = next_event.result()
+                writer.write(encode(event))
+                await writer.drain()
+                if event["event"] in ("done", "error"):
+                    return
+        except ConnectionError:
+            job.cancelled.set()
+        finally:
+            disconnected.cancel()
+
+
+def _percentile(ordered: list, q: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(q / 100.0 * len(ordered)))]
+
+
+async def serve(worker: SupportWorker, socket_path: str):
+    """Listen on ``socket_path`` until SIGINT/SIGTERM."""
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    server = await asyncio.start_unix_server(worker.handle, path=socket_path, limit=STREAM_LIMIT)
+    os.chmod(socket_path, 0o660)
+    print(f"✓ Support worker listening on {socket_path} "
+          f"(concurrency={worker.concurrency}, max_queue={worker.max_queue})")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+    async with server:
+        await stop.wait()
+    os.unlink(socket_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--socket", default=os.getenv("SUPPORT_WORKER_SOCKET", DEFAULT_SOCKET))
+    parser.add_argument("--concurrency", type=int, default=None)
+    parser.add_argument("--max-queue", type=int, default=None)
+    parser.add_argument("--load-in-4bit", action="store_true")
+    args = parser.parse_args()
+
+    # Heavy imports only in the worker process
+    from support_backend import SupportBackend
+
+    backend = SupportBackend(load_in_8bit=not args.load_in_4bit, load_in_4bit=args.load_in_4bit)
+    worker = SupportWorker(backend, concurrency=args.concurrency, max_queue=args.max_queue)
+    try:
+        asyncio.run(serve(worker, args.socket))
+    finally:
+        print("Stopping support worker...")
+        worker.close()
+
+
+if __name__ == "__main__":
+    main()
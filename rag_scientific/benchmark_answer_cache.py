@@ -0,0 +1,104 @@
+"""
+Answer-cache safety: paraphrases should hit, entity swaps must not.
+
+Every pair is (cached query, new query). A paraphrase asks the same question
+in other words, so reusing the answer is right. An entity swap asks the same
+question about a different substance or place, so reusing the answer is a
+wrong medical fact. MiniLM paraphrase embeddings put many swaps above the
+similarity threshold; the content-term check (``LexicalIndex.content_terms``)
+is what keeps them apart.
+
+Reports each pair's similarity and whether it hits by similarity alone and
+with the term check. Exits with status 1 if any entity swap hits with the check.
+
+Usage:
+    python benchmark_answer_cache.py
+    python benchmark_answer_cache.py --threshold 0.92 --lexical-index full_database_bm25.npz
+"""
+
+import argparse
+import os
+import sys
+from pathlib import Path
+
+from lexical_index import LexicalIndex, tokenize
+from semantic_cache import SemanticCache
+
+DEFAULT_LEXICAL_INDEX = Path(__file__).parent / "full_database_bm25.npz"
+
+# (cached query, new query, language)
+PARAPHRASES = [
+    ("What are the withdrawal symptoms of cocaine?", "What are cocaine withdrawal symptoms?", "en"),
+    ("Quels sont les symptômes du sevrage à la cocaïne ?", "Quels sont les symptômes de sevrage de la cocaïne ?", "fr"),
+    ("ما هي أعراض انسحاب الكوكايين؟", "ماهي أعراض انسحاب الكوكايين", "ar"),
+    ("How long does heroin withdrawal last?", "How long does withdrawal from heroin last?", "en"),
+    ("win kayen centre d'addictologie f oran?", "win kayen centre d'addictologie f oran", "dz"),
+]
+
+ENTITY_SWAPS = [
+    ("What are the withdrawal symptoms of cocaine?", "What are the withdrawal symptoms of heroin?", "en"),
+    ("What are the long-term effects of cannabis?", "What are the long-term effects of tramadol?", "en"),
+    ("Quels sont les symptômes du sevrage à la cocaïne ?", "Quels sont les symptômes du sevrage à l'héroïne ?", "fr"),
+    ("ما هي أعراض انسحاب الكوكايين؟", "ما هي أعراض انسحاب الهيروين؟", "ar"),
+    ("win kayen centre d'addictologie f oran?", "win kayen centre d'addictologie f annaba?", "dz"),
+    ("How long does heroin withdrawal last?", "How long does alcohol withdrawal last?", "en"),
+]
+
+
+def evaluate(model, pairs, threshold: float, key_terms) -> list:
+    """Per pair: (similarity, hit by similarity only, hit with the term check)."""
+    rows = []
+    for cached, query, language in pairs:
+        embeddings = model.encode([cached, query], normalize_embeddings=True)
+        plain = SemanticCache(threshold=threshold)
+        guarded = SemanticCache(threshold=threshold, key_terms=key_terms)
+        for cache in (plain, guarded):
+            cache.put(cached, embeddings[0], language, "answer")
+        similarity = float(embeddings[0] @ embeddings[1])
+        rows.append((cached, query, similarity,
+                     plain.get(embeddings[1], language, query) is not None,
+                     guarded.get(embeddings[1], language, query) is not None))
+    return rows
+
+
+def report(title: str, rows: list) -> int:
+    print(f"\n{title}")
+    print(f"{'similarity':>10}{'plain':>7}{'guarded':>9}  new query")
+    for _, query, similarity, plain, guarded in rows:
+        print(f"{similarity:>10.3f}{'hit' if plain else '-':>7}{'hit' if guarded else '-':>9}  {query}")
+    return sum(guarded for *_, guarded in rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threshold", type=float, default=SemanticCache.DEFAULT_THRESHOLD)
+    parser.add_argument("--lexical-index", default=str(DEFAULT_LEXICAL_INDEX),
+                        help="BM25 index for document frequencies (all terms must match without it)")
+    args = parser.parse_args()
+
+    from sentence_transformers import SentenceTransformer
+    from rag_backend import RAGBackend
+
+    model = SentenceTransformer(os.getenv("RAG_EMBEDDING_MODEL", RAGBackend.EMBEDDING_MODEL), device="cpu")
+    if os.path.exists(args.lexical_index):
+        key_terms = LexicalIndex.load(args.lexical_index).content_terms
+        source = args.lexical_index
+    else:
+        key_terms = lambda text: frozenset(tokenize(text))
+        source = "all terms (no BM25 index)"
+
+    print("\n" + "=" * 72)
+    print(f"Answer cache: threshold {args.threshold}, content terms from {source}")
+    print("=" * 72)
+    paraphrase_hits = report("Paraphrases (should hit)", evaluate(model, PARAPHRASES, args.threshold, key_terms))
+    swap_hits = report("Entity swaps (must not hit)", evaluate(model, ENTITY_SWAPS, args.threshold, key_terms))
+
+    print(f"\nParaphrase hits: {paraphrase_hits}/{len(PARAPHRASES)}   "
+          f"entity-swap hits: {swap_hits}/{len(ENTITY_SWAPS)}")
+    if swap_hits:
+        print("⚠ The cache would serve an answer about a different substance or place")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+CPU encode throughput for the RAG query embedding model.
+
+1. Direct ``model.encode`` at different batch sizes.
+2. Concurrent single-query callers: direct encode vs EmbeddingService batching
+   (cache disabled so every query really hits the model).
+
+Usage:
+    python benchmark_embeddings.py
+    python benchmark_embeddings.py --texts 1024 --threads 16 --batch-sizes 1 8 32 128
+"""
+
+import argparse
+import threading
+import time
+from typing import Callable, List
+
+from embedding_service import EmbeddingService
+
+SAMPLE_QUERIES = [
+    "ما هي أعراض انسحاب الكوكايين؟",
+    "ما هي معدلات استخدام القنب في شمال أفريقيا؟",
+    "Quels sont les effets du cannabis sur le cerveau?",
+    "win kayen centre d'addictologie f dzayer?",
+    "What are the long-term effects of heroin use?",
+    "واش هي الأضرار تاع الحبوب المهلوسة؟",
+    "Combien de temps dure le sevrage aux opioïdes?",
+    "How common is tramadol misuse among young adults?",
+]
+
+
+def make_texts(n: int) -> List[str]:
+    """Distinct queries (suffix keeps them from deduplicating)."""
+    return [f"{SAMPLE_QUERIES[i % len(SAMPLE_QUERIES)]} ({i})" for i in range(n)]
+
+
+def throughput_by_batch_size(model, texts: List[str], batch_sizes: List[int]):
+    print(f"\n{'batch size':>10}{'texts/s':>12}{'ms/text':>10}")
+    model.encode(texts[:8])  # warm-up
+    for batch_size in batch_sizes:
+        start = time.perf_counter()
+        model.encode(texts, batch_size=batch_size)
+        elapsed = time.perf_counter() - start
+        print(f"{batch_size:>10}{len(texts) / elapsed:>12.1f}{elapsed * 1000.0 / len(texts):>10.2f}")
+
+
+def concurrent_throughput(encode_one: Callable[[str], object], texts: List[str], threads: int) -> float:
+    """Texts/s when ``threads`` callers each encode one query at a time."""
+    chunks = [texts[i::threads] for i in range(threads)]
+
+    def worker(chunk: List[str]):
+        for text in chunk:
+            encode_one(text)
+
+    pool = [threading.Thread(target=worker, args=(chunk,)) for chunk in chunks]
+    start = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return len(texts) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--texts", type=int, default=512)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 8, 16, 32, 64, 128])
+    parser.add_argument("--window-ms", type=float, default=EmbeddingService.DEFAULT_WINDOW_MS)
+    args = parser.parse_args()
+
+    from sentence_transformers import SentenceTransformer
+    from rag_backend import RAGBackend
+
+    model = SentenceTransformer(RAGBackend.EMBEDDING_MODEL, device="cpu")
+    texts = make_texts(args.texts)
+
+    print("\n" + "=" * 60)
+    print(f"Encode throughput ({RAGBackend.EMBEDDING_MODEL}, CPU, {len(texts)} texts)")
+    print("=" * 60)
+    throughput_by_batch_size(model, texts, args.batch_sizes)
+
+    service = EmbeddingService(model, window_ms=args.window_ms, cache_max_entries=0)
+    direct = concurrent_throughput(lambda text: model.encode([text]), texts, args.threads)
+    batched = concurrent_throughput(lambda text: service.encode([text]), texts, args.threads)
+    stats = service.get_stats()
+
+    print(f"\n{args.threads} concurrent single-query callers:")
+    print(f"  direct encode:     {direct:>8.1f} texts/s")
+    print(f"  EmbeddingService:  {batched:>8.1f} texts/s  "
+          f"(mean batch {stats['mean_batch']}, max {stats['max_batch']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Tail-latency benchmark for the async LLM policies against fake_llm_server.py.
+
+Compares plain retries (no deadline, like the synchronous path), per-attempt
+deadlines, and deadlines + hedging on the same seeded latency/error profile.
+
+Usage:
+    python benchmark_llm_resilience.py
+    python benchmark_llm_resilience.py --requests 500 --concurrency 16 --slow-rate 0.05 --error-rate 0.02
+"""
+
+import argparse
+import asyncio
+import time
+from typing import Dict, List
+
+from fake_llm_server import FakeLLMConfig, start_fake_llm
+from resilient_llm import HttpLLMClient, ResilientLLM
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q / 100.0 * len(ordered)))]
+
+
+async def run_policy(llm: ResilientLLM, requests: int, concurrency: int) -> Dict:
+    """Send ``requests`` prompts with bounded concurrency; return latency and errors."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    failures = 0
+
+    async def one(i: int):
+        nonlocal failures
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await llm.generate(f"question {i}")
+            except Exception:
+                failures += 1
+            latencies.append((time.perf_counter() - start) * 1000.0)
+
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return {
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "failure_rate": failures / requests,
+        "stats": llm.get_stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    parser.add_argument("--slow-rate", type=float, default=0.05)
+    parser.add_argument("--slow-ms", type=float, default=3000.0)
+    parser.add_argument("--error-rate", type=float, default=0.02)
+    parser.add_argument("--timeout", type=float, default=1.5, help="Per-attempt deadline (s)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    policies = {
+        "retry only": dict(attempt_timeout=None),
+        "deadline": dict(attempt_timeout=args.timeout),
+        "deadline+hedge": dict(attempt_timeout=args.timeout, hedge=True),
+    }
+
+    print("\n" + "=" * 60)
+    print(f"LLM tail latency ({args.requests} requests, concurrency {args.concurrency}, "
+          f"{args.slow_rate:.0%} slow, {args.error_rate:.0%} errors)")
+    print("=" * 60)
+    print(f"{'policy':<16}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'failed':>8}{'hedges':>8}{'won':>6}")
+
+    for name, options in policies.items():
+        # Same seed per policy so each sees the same latency/error sequence
+        server = start_fake_llm(FakeLLMConfig(
+            latency_ms=args.latency_ms, slow_rate=args.slow_rate, slow_ms=args.slow_ms,
+            error_rate=args.error_rate, seed=args.seed
+        ))
+        client = HttpLLMClient(f"http://127.0.0.1:{server.server_port}/generate")
+        llm = ResilientLLM(client, backoff_base=0.05, backoff_max=0.5, **options)
+        try:
+            report = asyncio.run(run_policy(llm, args.requests, args.concurrency))
+        finally:
+            server.shutdown()
+
+        stats = report["stats"]
+        print(f"{name:<16}{report['p50_ms']:>9.0f}{report['p95_ms']:>9.0f}{report['p99_ms']:>9.0f}"
+              f"{report['failure_rate']:>8.1%}{stats['hedges_sent']:>8}{stats['hedges_won']:>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Offline retrieval evaluation: dense-only vs lexical-only vs hybrid (RRF).
+
+Reports hit@k, MRR and latency per mode, plus the cost of BM25 scoring alone.
+Without --eval-file, queries are random word windows cut from sampled chunks
+(the source chunk is the relevant one); this favours exact-term matching, so
+prefer a labelled file of real user questions when one is available.
+
+Usage:
+    python benchmark_retrieval.py --queries 200 --k 5
+    python benchmark_retrieval.py --eval-file eval.jsonl   # {"query": ..., "relevant_ids": [...]}
+"""
+
+import argparse
+import json
+import random
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from rag_backend import RAGBackend
+
+DEFAULT_PERSIST_DIR = Path(__file__).parent / "full_database"
+
+
+def load_eval_file(path: str) -> List[Tuple[str, List[str]]]:
+    with open(path, encoding="utf-8") as f:
+        return [(item["query"], item["relevant_ids"]) for item in map(json.loads, f) if item.get("query")]
+
+
+def synthetic_queries(rag: RAGBackend, n: int, seed: int) -> List[Tuple[str, List[str]]]:
+    """Random 6-10 word windows from random chunks."""
+    rng = random.Random(seed)
+    total = rag.collection.count()
+    cases = []
+    for offset in rng.sample(range(total), min(n, total)):
+        page = rag.collection.get(include=["documents"], limit=1, offset=offset)
+        words = (page["documents"][0] or "").split()
+        if len(words) < 6:
+            continue
+        length = rng.randint(6, min(10, len(words)))
+        start = rng.randint(0, len(words) - length)
+        cases.append((" ".join(words[start:start + length]), [page["ids"][0]]))
+    return cases
+
+
+def evaluate(rag: RAGBackend, mode: str, cases: List[Tuple[str, List[str]]], k: int) -> Dict:
+    """Hit@k, MRR@k and per-query latency for one retrieval mode."""
+    rag.retrieval_mode = mode
+    rag.embedding_service.clear()  # every mode pays for encoding
+
+    hits, reciprocal_ranks, timings = 0, [], []
+    for query, relevant in cases:
+        start = time.perf_counter()
+        ranking = rag.rank_chunks([query], k)[0]
+        timings.append((time.perf_counter() - start) * 1000.0)
+
+        rank = next((i + 1 for i, chunk_id in enumerate(ranking) if chunk_id in relevant), None)
+        hits += rank is not None
+        reciprocal_ranks.append(1.0 / rank if rank else 0.0)
+
+    return {
+        "hit_rate": hits / len(cases),
+        "mrr": float(np.mean(reciprocal_ranks)),
+        "p50_ms": float(np.percentile(timings, 50)),
+        "p95_ms": float(np.percentile(timings, 95)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--persist-dir", default=str(DEFAULT_PERSIST_DIR))
+    parser.add_argument("--eval-file")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rag = RAGBackend(persist_dir=args.persist_dir)
+    if rag.lexical_index is None:
+        raise SystemExit("Lexical index unavailable; run with RAG_RETRIEVAL=hybrid")
+
+    cases = load_eval_file(args.eval_file) if args.eval_file else synthetic_queries(rag, args.queries, args.seed)
+
+    print("\n" + "=" * 60)
+    print(f"Retrieval evaluation ({len(cases)} queries, k={args.k}, "
+          f"{'labelled' if args.eval_file else 'synthetic'})")
+    print("=" * 60)
+    print(f"{'mode':<10}{'hit@k':>8}{'MRR':>8}{'p50 ms':>9}{'p95 ms':>9}")
+    for mode in RAGBackend.RETRIEVAL_MODES:
+        report = evaluate(rag, mode, cases, args.k)
+        print(f"{mode:<10}{report['hit_rate']:>8.3f}{report['mrr']:>8.3f}"
+              f"{report['p50_ms']:>9.2f}{report['p95_ms']:>9.2f}")
+
+    # BM25 scoring alone, the part added to every hybrid request
+    timings = []
+    for query, _ in cases:
+        start = time.perf_counter()
+        rag.lexical_index.search(query, RAGBackend.HYBRID_CANDIDATES)
+        timings.append((time.perf_counter() - start) * 1000.0)
+    print(f"\nBM25 scoring: p50 {np.percentile(timings, 50):.3f} ms, p95 {np.percentile(timings, 95):.3f} ms "
+          f"({len(rag.lexical_index.ids)} chunks, {len(rag.lexical_index.vocab)} terms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Recall@k and latency/memory of the memory-mapped index vs ChromaDB.
+
+Query texts are sampled from the knowledge base itself (chunk prefixes), and
+each engine is profiled in a fresh process so memory numbers are not mixed.
+Recall@k is the overlap of each engine's top-k ids with ChromaDB's.
+
+Usage:
+    python vector_index.py export                      # once
+    python benchmark_vector_index.py --queries 200 --k 5 --nprobe 4 8 16
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+BASE_DIR = Path(__file__).parent
+DEFAULT_PERSIST_DIR = BASE_DIR / "full_database"
+DEFAULT_INDEX_DIR = BASE_DIR / "full_database_mmap"
+COLLECTION = "improved_drug_research"
+
+
+def rss_mb() -> float:
+    """Current resident set size (Linux)."""
+    with open("/proc/self/statm") as f:
+        resident_pages = int(f.read().split()[1])
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+def sample_queries(index_dir: str, n: int, seed: int) -> List[str]:
+    """Prefixes of random chunks, so every query has a known relevant neighbour."""
+    from vector_index import MmapVectorIndex
+
+    index = MmapVectorIndex(index_dir)
+    rows = random.Random(seed).sample(range(index.count()), min(n, index.count()))
+    return [index.documents[row][:200] for row in rows]
+
+
+def profile(engine: str, queries: List[str], k: int, nprobe: int, persist_dir: str, index_dir: str) -> Dict:
+    """Open one engine in this process, run all queries, report ids, latency and memory."""
+    from sentence_transformers import SentenceTransformer
+    from rag_backend import RAGBackend
+
+    model = SentenceTransformer(RAGBackend.EMBEDDING_MODEL, device="cpu")
+    embeddings = model.encode(queries)
+
+    before = rss_mb()
+    start = time.perf_counter()
+    if engine == "chroma":
+        import chromadb
+        from chromadb.config import Settings
+
+        client = chromadb.PersistentClient(path=persist_dir, settings=Settings(anonymized_telemetry=False))
+        store = client.get_collection(name=COLLECTION)
+    else:
+        from vector_index import MmapVectorIndex
+        store = MmapVectorIndex(index_dir, nprobe=nprobe)
+    open_ms = (time.perf_counter() - start) * 1000.0
+
+    ids, timings = [], []
+    for embedding in embeddings:
+        start = time.perf_counter()
+        result = store.query(query_embeddings=[embedding.tolist()], n_results=k)
+        timings.append((time.perf_counter() - start) * 1000.0)
+        ids.append(result["ids"][0])
+
+    return {
+        "engine": engine if engine == "chroma" else f"mmap/nprobe={nprobe}",
+        "ids": ids,
+        "open_ms": open_ms,
+        "p50_ms": float(np.percentile(timings, 50)),
+        "p95_ms": float(np.percentile(timings, 95)),
+        "rss_delta_mb": rss_mb() - before,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--persist-dir", default=str(DEFAULT_PERSIST_DIR))
+    parser.add_argument("--index-dir", default=str(DEFAULT_INDEX_DIR))
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 8, 16])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--profile", choices=["chroma", "mmap"], help=argparse.SUPPRESS)
+    parser.add_argument("--queries-file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.profile:
+        with open(args.queries_file, encoding="utf-8") as f:
+            queries = json.load(f)
+        nprobe = args.nprobe[0]
+        print(json.dumps(profile(args.profile, queries, args.k, nprobe, args.persist_dir, args.index_dir)))
+        return
+
+    queries = sample_queries(args.index_dir, args.queries, args.seed)
+    queries_file = BASE_DIR / ".benchmark_queries.json"
+    with open(queries_file, "w", encoding="utf-8") as f:
+        json.dump(queries, f, ensure_ascii=False)
+
+    runs = [("chroma", args.nprobe[0])] + [("mmap", nprobe) for nprobe in args.nprobe]
+    reports = []
+    try:
+        for engine, nprobe in runs:
+            cmd = [
+                sys.executable, __file__, "--profile", engine, "--queries-file", str(queries_file),
+                "--k", str(args.k), "--nprobe", str(nprobe),
+                "--persist-dir", args.persist_dir, "--index-dir", args.index_dir
+            ]
+            output = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+            reports.append(json.loads(output.strip().splitlines()[-1]))
+    finally:
+        queries_file.unlink(missing_ok=True)
+
+    index_mb = sum(p.stat().st_size for p in Path(args.index_dir).iterdir()) / (1024 * 1024)
+    reference = reports[0]["ids"]
+
+    print("\n" + "=" * 60)
+    print(f"Vector index vs ChromaDB ({len(queries)} queries, k={args.k}, index {index_mb:.1f} MiB on disk)")
+    print("=" * 60)
+    print(f"{'engine':<18}{'recall@k':>9}{'open ms':>9}{'p50 ms':>8}{'p95 ms':>8}{'+RSS MB':>9}")
+    for report in reports:
+        recall = np.mean([
+            len(set(ids) & set(ref)) / max(1, len(ref)) for ids, ref in zip(report["ids"], reference)
+        ])
+        print(f"{report['engine']:<18}{recall:>9.3f}{report['open_ms']:>9.1f}{report['p50_ms']:>8.2f}"
+              f"{report['p95_ms']:>8.2f}{report['rss_delta_mb']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
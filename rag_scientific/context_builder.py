@@ -0,0 +1,212 @@
+"""
+Token-budgeted context assembly for RAG prompts.
+
+Retrieved chunks are filtered and ordered before they reach the prompt:
+
+1. Chunks whose cosine similarity to the query is below ``min_similarity``
+   are dropped.
+2. The rest are ordered by maximal marginal relevance (MMR), so a chunk that
+   repeats an earlier one ranks low. Near-identical chunks are dropped.
+3. Chunks are added in that order until the language's token budget or
+   ``max_chunks`` is reached.
+
+Token counts are estimates from script-aware characters-per-token ratios.
+They are close enough for budgeting and need no tokenizer call.
+"""
+
+import math
+import re
+import threading
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Arabic script (base block + supplement); tokenizes denser than Latin
+_ARABIC_RE = re.compile(r"[\u0600-\u06FF\u0750-\u077F]")
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate LLM token count (~2.5 chars/token for Arabic, ~4 otherwise)."""
+    arabic = len(_ARABIC_RE.findall(text))
+    return int(math.ceil(arabic / 2.5 + (len(text) - arabic) / 4.0))
+
+
+def format_chunk(document: str, metadata: Dict) -> str:
+    """One context block of the prompt: the chunk text with its category, place and timeframe."""
+    part = f"**Context from {metadata.get('category', 'Unknown')}:**\n{document}"
+    if metadata.get('geographic_context') and metadata.get('geographic_context') != 'unknown':
+        part += f"\n- Geographic Context: {metadata['geographic_context']}"
+    if metadata.get('timeframe') and metadata.get('timeframe') != 'unknown':
+        part += f"\n- Timeframe: {metadata['timeframe']}"
+    return part
+
+
+def parse_budgets(value: str) -> Dict[str, int]:
+    """
+    Parse a budget setting: '1200' (all languages) or 'ar=1800,fr=1200,...'.
+    """
+    if "=" not in value:
+        return {language: int(value) for language in ContextBuilder.DEFAULT_BUDGETS}
+    budgets = dict(ContextBuilder.DEFAULT_BUDGETS)
+    for item in value.split(","):
+        language, _, tokens = item.partition("=")
+        budgets[language.strip()] = int(tokens)
+    return budgets
+
+
+class ContextBuilder:
+    """Selects which retrieved chunks go into a prompt, and tracks prompt sizes."""
+
+    # Context tokens per response language; Arabic script needs more tokens for the same content
+    DEFAULT_BUDGETS = {"ar": 1800, "dz": 1800, "fr": 1200, "en": 1200}
+    DEFAULT_MIN_SIMILARITY = 0.25
+    DEFAULT_MMR_LAMBDA = 0.7
+
+    # Chunks at least this similar to an already selected one are dropped outright
+    DUPLICATE_SIMILARITY = 0.95
+
+    # Recent prompts kept for the token percentiles in stats
+    STATS_WINDOW = 1000
+
+    def __init__(
+        self,
+        budgets: Optional[Dict[str, int]] = None,
+        min_similarity: float = DEFAULT_MIN_SIMILARITY,
+        mmr_lambda: float = DEFAULT_MMR_LAMBDA
+    ):
+        """
+        Initialize the builder.
+
+        Args:
+            budgets: Context token budget per language ('en' is the fallback).
+            min_similarity: Minimum query/chunk cosine similarity to keep a chunk.
+            mmr_lambda: MMR trade-off; 1.0 ranks by relevance only, lower values favour diversity.
+        """
+        self.budgets = budgets or dict(self.DEFAULT_BUDGETS)
+        self.min_similarity = min_similarity
+        self.mmr_lambda = mmr_lambda
+
+        self._lock = threading.Lock()
+        self._stats = {
+            "requests": 0, "candidates": 0, "chunks_used": 0,
+            "below_cutoff": 0, "duplicates": 0, "over_budget": 0, "truncated": 0
+        }
+        self._prompt_tokens = deque(maxlen=self.STATS_WINDOW)
+        self._context_tokens = deque(maxlen=self.STATS_WINDOW)
+
+    @staticmethod
+    def _unit_rows(vectors: np.ndarray) -> np.ndarray:
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+    def _mmr(self, candidates: List[int], relevance: np.ndarray, vectors: np.ndarray) -> Tuple[List[int], int]:
+        """MMR order over ``candidates``; returns (order, number of near-duplicates dropped)."""
+        selected: List[int] = []
+        remaining = list(candidates)
+        duplicates = 0
+        while remaining:
+            if selected:
+                redundancy = (vectors[remaining] @ vectors[selected].T).max(axis=1)
+                keep = redundancy < self.DUPLICATE_SIMILARITY
+                duplicates += int((~keep).sum())
+                remaining = [i for i, k in zip(remaining, keep) if k]
+                redundancy = redundancy[keep]
+                if not remaining:
+                    break
+            else:
+                redundancy = np.zeros(len(remaining), dtype=np.float32)
+            scores = self.mmr_lambda * relevance[remaining] - (1.0 - self.mmr_lambda) * redundancy
+            selected.append(remaining.pop(int(np.argmax(scores))))
+        return selected, duplicates
+
+    def select(
+        self,
+        language: str,
+        documents: List[str],
+        metadatas: List[Dict],
+        max_chunks: int,
+        query_embedding: Optional[np.ndarray] = None,
+        chunk_embeddings: Optional[np.ndarray] = None
+    ) -> Tuple[List[str], List[Dict]]:
+        """
+        Pick the chunks for one prompt.
+
+        Without embeddings, only the token budget is applied (in retrieval order).
+
+        Args:
+            language: Response language (selects the budget).
+            documents: Retrieved chunk texts, best first.
+            metadatas: Metadata aligned with ``documents``.
+            max_chunks: Maximum chunks to keep.
+            query_embedding: Query vector.
+            chunk_embeddings: One vector per retrieved chunk.
+
+        Returns:
+            Tuple of (documents, metadatas) to put in the prompt; empty if nothing is relevant.
+        """
+        order = list(range(len(documents)))
+        below_cutoff = duplicates = 0
+        if order and query_embedding is not None and chunk_embeddings is not None:
+            vectors = self._unit_rows(chunk_embeddings)
+            relevance = vectors @ self._unit_rows(query_embedding)[0]
+            relevant = [i for i in order if relevance[i] >= self.min_similarity]
+            below_cutoff = len(order) - len(relevant)
+            order, duplicates = self._mmr(relevant, relevance, vectors)
+
+        budget = self.budgets.get(language, self.budgets.get("en", self.DEFAULT_BUDGETS["en"]))
+        chosen_documents, chosen_metadatas = [], []
+        used = over_budget = truncated = 0
+        for i in order:
+            if len(chosen_documents) >= max_chunks:
+                break
+            document, metadata = documents[i], metadatas[i] or {}
+            cost = estimate_tokens(format_chunk(document, metadata))
+            if used + cost > budget:
+                if chosen_documents:
+                    over_budget += 1  # a shorter, lower-ranked chunk may still fit
+                    continue
+                # Never send an empty context because the best chunk alone is too long
+                document = document[:max(1, int(len(document) * budget / cost))]
+                cost = estimate_tokens(format_chunk(document, metadata))
+                truncated = 1
+            chosen_documents.append(document)
+            chosen_metadatas.append(metadata)
+            used += cost
+
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["candidates"] += len(documents)
+            self._stats["chunks_used"] += len(chosen_documents)
+            self._stats["below_cutoff"] += below_cutoff
+            self._stats["duplicates"] += duplicates
+            self._stats["over_budget"] += over_budget
+            self._stats["truncated"] += truncated
+            self._context_tokens.append(used)
+        return chosen_documents, chosen_metadatas
+
+    def record_prompt(self, prompt: str):
+        """Record the estimated size of a prompt sent to the LLM."""
+        tokens = estimate_tokens(prompt)
+        with self._lock:
+            self._prompt_tokens.append(tokens)
+
+    def get_stats(self) -> Dict:
+        """Chunk counters plus recent context/prompt token sizes."""
+        with self._lock:
+            stats = dict(self._stats)
+            prompt_tokens = list(self._prompt_tokens)
+            context_tokens = list(self._context_tokens)
+        requests = stats["requests"]
+        stats["mean_candidates"] = round(stats["candidates"] / requests, 2) if requests else 0.0
+        stats["mean_chunks_used"] = round(stats["chunks_used"] / requests, 2) if requests else 0.0
+        if context_tokens:
+            stats["context_tokens_mean"] = round(float(np.mean(context_tokens)), 1)
+        if prompt_tokens:
+            stats["prompt_tokens_mean"] = round(float(np.mean(prompt_tokens)), 1)
+            stats["prompt_tokens_p50"] = int(np.percentile(prompt_tokens, 50))
+            stats["prompt_tokens_p95"] = int(np.percentile(prompt_tokens, 95))
+        stats["budgets"] = dict(self.budgets)
+        stats["min_similarity"] = self.min_similarity
+        return stats
+
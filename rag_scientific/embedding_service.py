@@ -0,0 +1,190 @@
+"""
+Query embedding service for the RAG backend.
+Caches embeddings by normalized text and batches concurrent encode calls into
+one SentenceTransformer pass; vectors stay numpy arrays end to end.
+"""
+
+import os
+import queue
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+def normalize_query(text: str) -> str:
+    """Cache key and encoded form of a query: NFC, single spaces, stripped."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class EmbeddingService:
+    """
+    Cross-request batching and caching in front of a SentenceTransformer.
+
+    Callers block on ``encode`` as they would on ``model.encode``. Cache hits
+    return immediately; misses from concurrent callers arriving within
+    ``window_ms`` are encoded together by a single worker thread.
+    """
+
+    DEFAULT_WINDOW_MS = 2.0
+    DEFAULT_MAX_BATCH_SIZE = 64
+    DEFAULT_CACHE_ENTRIES = 10000
+
+    def __init__(
+        self,
+        model,
+        window_ms: float = DEFAULT_WINDOW_MS,
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        cache_max_entries: int = DEFAULT_CACHE_ENTRIES
+    ):
+        """
+        Initialize the service (the worker thread starts on first use).
+
+        Args:
+            model: Loaded SentenceTransformer (anything with ``encode(list) -> ndarray``).
+            window_ms: How long to wait for more requests after the first one.
+                0 encodes each call directly in the caller's thread.
+            max_batch_size: Maximum number of texts per model pass.
+            cache_max_entries: Cached embeddings (0 disables the cache).
+        """
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be >= 1")
+
+        self.model = model
+        self.window_ms = window_ms
+        self.max_batch_size = max_batch_size
+        self.cache_max_entries = cache_max_entries
+
+        self._cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {"requests": 0, "texts": 0, "cache_hits": 0, "encoded": 0, "batches": 0, "max_batch": 0}
+
+        self._queue: "queue.Queue[Tuple[List[str], Future]]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._worker_pid: Optional[int] = None
+        self._start_lock = threading.Lock()
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed ``texts``, one float32 row per text, in order.
+
+        Equivalent to ``model.encode([normalize_query(t) for t in texts])``.
+        """
+        keys = [normalize_query(text) for text in texts]
+        rows: List[Optional[np.ndarray]] = [self._cache_get(key) for key in keys]
+        missing = list(dict.fromkeys(key for key, row in zip(keys, rows) if row is None))
+
+        with self._stats_lock:
+            self._stats["requests"] += 1
+            self._stats["texts"] += len(keys)
+            self._stats["cache_hits"] += sum(row is not None for row in rows)
+
+        if missing:
+            if self.window_ms > 0:
+                future: Future = Future()
+                self._ensure_worker()
+                self._queue.put((missing, future))
+                encoded = future.result()
+            else:
+                encoded = self._encode_now(missing)
+            by_key = dict(zip(missing, encoded))
+            rows = [row if row is not None else by_key[key] for key, row in zip(keys, rows)]
+
+        if not rows:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.stack(rows)
+
+    def _encode_now(self, texts: List[str]) -> np.ndarray:
+        """One model pass; results are cached."""
+        vectors = np.asarray(
+            self.model.encode(texts, batch_size=self.max_batch_size, convert_to_numpy=True),
+            dtype=np.float32
+        )
+        with self._stats_lock:
+            self._stats["encoded"] += len(texts)
+            self._stats["batches"] += 1
+            self._stats["max_batch"] = max(self._stats["max_batch"], len(texts))
+        for text, vector in zip(texts, vectors):
+            self._cache_put(text, vector)
+        return vectors
+
+    def _cache_get(self, key: str) -> Optional[np.ndarray]:
+        if self.cache_max_entries <= 0:
+            return None
+        with self._cache_lock:
+            vector = self._cache.get(key)
+            if vector is not None:
+                self._cache.move_to_end(key)
+            return vector
+
+    def _cache_put(self, key: str, vector: np.ndarray):
+        if self.cache_max_entries <= 0:
+            return
+        with self._cache_lock:
+            self._cache[key] = vector
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_max_entries:
+                self._cache.popitem(last=False)
+
+    def _ensure_worker(self):
+        """Start the worker thread, again after fork() (threads don't survive it)."""
+        pid = os.getpid()
+        if self._worker_pid == pid:
+            return
+        with self._start_lock:
+            if self._worker_pid != pid:
+                self._queue = queue.Queue()
+                self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._worker.start()
+                self._worker_pid = pid
+
+    def _collect(self) -> List[Tuple[List[str], Future]]:
+        """Block for the first request, then gather more until the window closes."""
+        batch = [self._queue.get()]
+        size = len(batch[0][0])
+        deadline = time.perf_counter() + self.window_ms / 1000.0
+        while size < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(item)
+            size += len(item[0])
+        return batch
+
+    def _run(self):
+        """Worker loop: collect, encode the union once, fan rows back out."""
+        while True:
+            batch = self._collect()
+            texts = list(dict.fromkeys(text for texts, _ in batch for text in texts))
+            try:
+                by_text = dict(zip(texts, self._encode_now(texts)))
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for texts, future in batch:
+                future.set_result([by_text[text] for text in texts])
+
+    def clear(self):
+        """Drop cached embeddings (e.g. after swapping the model)."""
+        with self._cache_lock:
+            self._cache.clear()
+
+    def get_stats(self) -> Dict:
+        """Return request, cache and batch counters."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        with self._cache_lock:
+            stats["cache_entries"] = len(self._cache)
+        stats["cache_hit_rate"] = round(stats["cache_hits"] / stats["texts"], 4) if stats["texts"] else 0.0
+        stats["mean_batch"] = round(stats["encoded"] / stats["batches"], 2) if stats["batches"] else 0.0
+        return stats
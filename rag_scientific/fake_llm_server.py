@@ -0,0 +1,136 @@
+"""
+Local stand-in for the Gemini API with injectable latency and errors.
+
+Serves ``POST /generate`` with ``{"prompt": ...}`` -> ``{"text": ...}`` so the
+async RAG pipeline (ResilientLLM + HttpLLMClient) can be exercised without a
+key or network access.
+
+Usage:
+    python fake_llm_server.py --port 8089 --latency-ms 300 --slow-rate 0.05 --slow-ms 5000 --error-rate 0.02
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+
+class FakeLLMConfig:
+    """Latency/error profile; attributes may be changed while the server runs."""
+
+    def __init__(
+        self,
+        latency_ms: float = 300.0,
+        jitter_ms: float = 50.0,
+        slow_rate: float = 0.0,
+        slow_ms: float = 5000.0,
+        error_rate: float = 0.0,
+        seed: Optional[int] = None
+    ):
+        """
+        Args:
+            latency_ms: Typical response time.
+            jitter_ms: Uniform +/- noise added to every response.
+            slow_rate: Fraction of requests that take ``slow_ms`` instead (tail latency).
+            slow_ms: Response time of slow requests.
+            error_rate: Fraction of requests answered with HTTP 503.
+            seed: Random seed for reproducible runs.
+        """
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.slow_rate = slow_rate
+        self.slow_ms = slow_ms
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def draw(self):
+        """Return (delay_seconds, fail) for one request."""
+        with self._lock:
+            fail = self._random.random() < self.error_rate
+            if self._random.random() < self.slow_rate:
+                delay_ms = self.slow_ms
+            else:
+                delay_ms = self.latency_ms + self._random.uniform(-self.jitter_ms, self.jitter_ms)
+        return max(0.0, delay_ms) / 1000.0, fail
+
+
+def make_handler(config: FakeLLMConfig):
+    """Request handler class bound to a config."""
+
+    class FakeLLMHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            prompt = json.loads(self.rfile.read(length) or b"{}").get("prompt", "")
+
+            delay, fail = config.draw()
+            time.sleep(delay)
+
+            if fail:
+                status, payload = 503, {"error": "injected failure"}
+            else:
+                status, payload = 200, {"text": f"Fake answer ({len(prompt)} prompt chars)."}
+
+            body = json.dumps(payload).encode("utf-8")
+            try:
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                # Client gave up (timeout or lost hedge race)
+                pass
+
+        def log_message(self, format, *args):
+            pass
+
+    return FakeLLMHandler
+
+
+def start_fake_llm(config: FakeLLMConfig, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """
+    Start the fake server in a daemon thread.
+
+    Returns:
+        The running server; its URL is ``http://{host}:{server.server_port}/generate``.
+        Call ``shutdown()`` to stop it.
+    """
+    server = ThreadingHTTPServer((host, port), make_handler(config))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-llm", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument("--jitter-ms", type=float, default=50.0)
+    parser.add_argument("--slow-rate", type=float, default=0.0)
+    parser.add_argument("--slow-ms", type=float, default=5000.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    config = FakeLLMConfig(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, slow_rate=args.slow_rate,
+        slow_ms=args.slow_ms, error_rate=args.error_rate, seed=args.seed
+    )
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(config))
+    print(f"✓ Fake LLM serving on http://{args.host}:{args.port}/generate")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
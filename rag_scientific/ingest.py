@@ -0,0 +1,443 @@
+"""
+Incremental ingestion into the RAG knowledge base (ChromaDB).
+
+Source documents are streamed and split into overlapping word windows. Each
+chunk gets a content hash, and only chunks whose hash changed are embedded,
+in worker processes. New chunks are upserted in bulk. Chunks left over from a
+shorter previous version of a document are deleted.
+
+A journal next to the database records every completed source file. A rerun,
+including one after a crash, skips those files, and chunks already written
+from a half-finished file are skipped by their hash.
+
+Sources (files or directories, searched recursively):
+    *.txt, *.md   one document per file; metadata from an optional
+                  '<file>.meta.json' sidecar, otherwise from the flags below
+    *.jsonl       one document per line: {"text": ..., "id": ..., "category": ..., ...}
+
+The collection must already exist, so a mistyped --collection or --persist-dir
+fails instead of filling a new, empty collection. Pass --create to create it
+with the distance metric the RAG backend expects.
+
+Usage:
+    python ingest.py papers/ --category research_paper --source research_paper
+    python ingest.py unodc_2024.jsonl --workers 4 --batch-size 128
+    python ingest.py corpus/ --persist-dir ./new_database --create
+"""
+
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+BASE_DIR = Path(__file__).parent
+DEFAULT_PERSIST_DIR = BASE_DIR / "full_database"
+COLLECTION = "improved_drug_research"
+
+# Distance for new collections: the context builder scores chunks by cosine
+# similarity, and the embeddings are not normalized, so rank by cosine too
+HNSW_SPACE = "cosine"
+
+SOURCE_SUFFIXES = (".txt", ".md", ".jsonl")
+METADATA_FIELDS = ("category", "geographic_context", "timeframe", "source")
+
+# Chunk size/overlap in words (the report's 500-1000 token chunks with 100 overlap)
+DEFAULT_CHUNK_WORDS = 500
+DEFAULT_OVERLAP_WORDS = 100
+
+# Seconds between progress lines
+PROGRESS_INTERVAL = 5.0
+
+
+class Chunk(NamedTuple):
+    id: str
+    text: str
+    metadata: Dict
+    source_file: str
+
+
+def embedding_model_name() -> str:
+    from rag_backend import RAGBackend
+    return RAGBackend.EMBEDDING_MODEL
+
+
+def chunk_text(text: str, chunk_words: int = DEFAULT_CHUNK_WORDS, overlap_words: int = DEFAULT_OVERLAP_WORDS) -> List[str]:
+    """Overlapping word windows over ``text`` (whitespace is collapsed)."""
+    words = text.split()
+    if not words:
+        return []
+    stride = max(1, chunk_words - overlap_words)
+    chunks = []
+    for start in range(0, len(words), stride):
+        chunks.append(" ".join(words[start:start + chunk_words]))
+        if start + chunk_words >= len(words):
+            break
+    return chunks
+
+
+def content_hash(text: str, metadata: Dict, model_name: str) -> str:
+    """Chunk fingerprint; includes the model so switching models re-embeds everything."""
+    key = f"{model_name}\n{json.dumps(metadata, sort_keys=True, ensure_ascii=False)}\n{text}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+
+def iter_source_files(paths: List[str]) -> Iterator[Tuple[Path, str]]:
+    """
+    (path, stable name) for every source file under ``paths``.
+
+    The name is the document id and journal key, so it starts with the
+    directory the file was found in (``papers/review.txt``), not just its
+    path below the root. Two roots yielding the same name would overwrite
+    each other's chunks, so that raises ValueError before anything is written.
+    """
+    seen: Dict[str, Path] = {}
+    for root in map(Path, paths):
+        if root.is_file():
+            files = [(root, f"{root.resolve().parent.name}/{root.name}")]
+        else:
+            prefix = root.resolve().name
+            files = [
+                (path, f"{prefix}/{path.relative_to(root).as_posix()}")
+                for path in sorted(root.rglob("*"))
+                if path.is_file() and path.suffix in SOURCE_SUFFIXES and not path.name.endswith(".meta.json")
+            ]
+        for path, name in files:
+            if name in seen and seen[name].resolve() != path.resolve():
+                raise ValueError(f"'{path}' and '{seen[name]}' would both be ingested as '{name}'; "
+                                 "rename one of them")
+            seen[name] = path
+    for name, path in seen.items():
+        yield path, name
+
+
+def file_fingerprint(path: Path, chunk_words: int, overlap_words: int, model_name: str) -> str:
+    """Hash of the file (and its sidecar) plus everything that changes the resulting chunks."""
+    digest = hashlib.sha256(f"{chunk_words}:{overlap_words}:{model_name}".encode())
+    for part in (path, path.with_name(path.name + ".meta.json")):
+        if part.exists():
+            with open(part, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(block)
+    return digest.hexdigest()
+
+
+def iter_documents(path: Path, name: str, defaults: Dict[str, str]) -> Iterator[Tuple[str, str, Dict]]:
+    """(document id, text, metadata) for each document in one source file."""
+    if path.suffix == ".jsonl":
+        with open(path, encoding="utf-8") as f:
+            for line_no, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                metadata = {**defaults, **{k: record[k] for k in METADATA_FIELDS if record.get(k)}}
+                yield f"{name}:{record.get('id', line_no)}", record.get("text", ""), metadata
+        return
+
+    metadata = dict(defaults)
+    sidecar = path.with_name(path.name + ".meta.json")
+    if sidecar.exists():
+        with open(sidecar, encoding="utf-8") as f:
+            metadata.update({k: v for k, v in json.load(f).items() if k in METADATA_FIELDS and v})
+    with open(path, encoding="utf-8") as f:
+        yield name, f.read(), metadata
+
+
+class IngestJournal:
+    """Append-only record of fully ingested source files."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.done: Dict[str, str] = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # torn last line from a crash
+                    self.done[entry["file"]] = entry["fingerprint"]
+        self._file = open(path, "a", encoding="utf-8")
+
+    def is_done(self, name: str, fingerprint: str) -> bool:
+        return self.done.get(name) == fingerprint
+
+    def mark_done(self, name: str, fingerprint: str, chunks: int):
+        self.done[name] = fingerprint
+        self._file.write(json.dumps({"file": name, "fingerprint": fingerprint, "chunks": chunks,
+                                     "at": time.time()}, ensure_ascii=False) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+# Embedding model of a pool worker process
+_worker_model = None
+
+
+def _init_worker(model_name: str, threads: int):
+    global _worker_model
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    torch.set_num_threads(threads)
+    _worker_model = SentenceTransformer(model_name, device="cpu")
+
+
+def _encode(texts: List[str], batch_size: int) -> np.ndarray:
+    return _worker_model.encode(texts, batch_size=batch_size, convert_to_numpy=True)
+
+
+class Ingestor:
+    """Streams chunks into a collection: hash check, pooled embedding, bulk upsert."""
+
+    def __init__(
+        self,
+        collection,
+        journal: IngestJournal,
+        workers: int = 2,
+        batch_size: int = 64,
+        chunk_words: int = DEFAULT_CHUNK_WORDS,
+        overlap_words: int = DEFAULT_OVERLAP_WORDS,
+        defaults: Optional[Dict[str, str]] = None
+    ):
+        """
+        Initialize the ingestor.
+
+        Args:
+            collection: ChromaDB collection to upsert into.
+            journal: Completed-file journal used for resuming.
+            workers: Embedding processes (0 encodes in this process).
+            batch_size: Chunks per hash lookup, encode call and upsert.
+            chunk_words: Words per chunk.
+            overlap_words: Words shared by consecutive chunks.
+            defaults: Metadata for documents that do not specify their own.
+        """
+        self.collection = collection
+        self.journal = journal
+        self.workers = workers
+        self.batch_size = batch_size
+        self.chunk_words = chunk_words
+        self.overlap_words = overlap_words
+        self.defaults = defaults or {}
+        self.model_name = embedding_model_name()
+
+        self._buffer: List[Chunk] = []
+        self._inflight: List[Tuple[List[Chunk], object]] = []
+        # source file -> [fingerprint, chunks not yet settled, total chunks, finished reading]
+        self._files: Dict[str, list] = {}
+        self.stats = {
+            "files": 0, "files_skipped": 0, "documents": 0, "chunks": 0,
+            "unchanged": 0, "embedded": 0, "deleted": 0
+        }
+
+        self._pool = None
+        self._model = None
+        if workers > 0:
+            threads = max(1, (os.cpu_count() or 1) // workers)
+            # spawn: workers load their own model instead of inheriting torch state
+            self._pool = multiprocessing.get_context("spawn").Pool(
+                workers, initializer=_init_worker, initargs=(self.model_name, threads)
+            )
+        else:
+            from sentence_transformers import SentenceTransformer
+            self._model = SentenceTransformer(self.model_name, device="cpu")
+
+    def run(self, paths: List[str]) -> Dict:
+        """Ingest every source file under ``paths``; returns counters and throughput."""
+        start = last_report = time.perf_counter()
+        for path, name in iter_source_files(paths):
+            fingerprint = file_fingerprint(path, self.chunk_words, self.overlap_words, self.model_name)
+            if self.journal.is_done(name, fingerprint):
+                self.stats["files_skipped"] += 1
+                continue
+
+            self._files[name] = [fingerprint, 0, 0, False]
+            for doc_id, text, metadata in iter_documents(path, name, self.defaults):
+                pieces = chunk_text(text, self.chunk_words, self.overlap_words)
+                self._files[name][1] += len(pieces)
+                self._files[name][2] += len(pieces)
+                for i, piece in enumerate(pieces):
+                    chunk_metadata = {
+                        **metadata, "doc_id": doc_id, "chunk_index": i,
+                        "content_hash": content_hash(piece, metadata, self.model_name)
+                    }
+                    self._buffer.append(Chunk(f"{doc_id}#{i}", piece, chunk_metadata, name))
+                    if len(self._buffer) >= self.batch_size:
+                        self._dispatch()
+                self._delete_stale(doc_id, len(pieces))
+                self.stats["documents"] += 1
+                self.stats["chunks"] += len(pieces)
+
+                if time.perf_counter() - last_report >= PROGRESS_INTERVAL:
+                    last_report = time.perf_counter()
+                    self._report_progress(last_report - start)
+
+            self._files[name][3] = True
+            self.stats["files"] += 1
+            self._settle([])
+
+        self._dispatch()
+        while self._inflight:
+            self._complete_oldest()
+
+        elapsed = time.perf_counter() - start
+        self.stats["seconds"] = round(elapsed, 2)
+        self.stats["chunks_per_second"] = round(self.stats["chunks"] / elapsed, 1) if elapsed else 0.0
+        self.stats["embedded_per_second"] = round(self.stats["embedded"] / elapsed, 1) if elapsed else 0.0
+        return self.stats
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+        self.journal.close()
+
+    def _dispatch(self):
+        """Drop unchanged chunks from the buffer and send the rest to be embedded."""
+        batch, self._buffer = self._buffer, []
+        if not batch:
+            return
+
+        existing = self.collection.get(ids=[chunk.id for chunk in batch], include=["metadatas"])
+        stored = {
+            chunk_id: (metadata or {}).get("content_hash")
+            for chunk_id, metadata in zip(existing["ids"], existing["metadatas"])
+        }
+        unchanged = [chunk for chunk in batch if stored.get(chunk.id) == chunk.metadata["content_hash"]]
+        new = [chunk for chunk in batch if stored.get(chunk.id) != chunk.metadata["content_hash"]]
+        self.stats["unchanged"] += len(unchanged)
+        self._settle(unchanged)
+        if not new:
+            return
+
+        texts = [chunk.text for chunk in new]
+        if self._pool is None:
+            self._upsert(new, self._model.encode(texts, batch_size=self.batch_size, convert_to_numpy=True))
+            return
+
+        self._inflight.append((new, self._pool.apply_async(_encode, (texts, self.batch_size))))
+        # Bound memory: keep at most two batches queued per worker
+        while len(self._inflight) > 2 * self.workers:
+            self._complete_oldest()
+
+    def _complete_oldest(self):
+        chunks, result = self._inflight.pop(0)
+        self._upsert(chunks, result.get())
+
+    def _upsert(self, chunks: List[Chunk], embeddings: np.ndarray):
+        self.collection.upsert(
+            ids=[chunk.id for chunk in chunks],
+            embeddings=embeddings.tolist(),  # chromadb 0.4.x rejects numpy arrays
+            documents=[chunk.text for chunk in chunks],
+            metadatas=[chunk.metadata for chunk in chunks]
+        )
+        self.stats["embedded"] += len(chunks)
+        self._settle(chunks)
+
+    def _settle(self, chunks: List[Chunk]):
+        """Count chunks as stored and journal files that are completely written."""
+        for chunk in chunks:
+            self._files[chunk.source_file][1] -= 1
+        for name, (fingerprint, pending, total, read) in list(self._files.items()):
+            if read and pending == 0:
+                self.journal.mark_done(name, fingerprint, total)
+                del self._files[name]
+
+    def _delete_stale(self, doc_id: str, n_chunks: int):
+        """Remove chunks of an earlier, longer version of the document."""
+        current = {f"{doc_id}#{i}" for i in range(n_chunks)}
+        stored = self.collection.get(where={"doc_id": doc_id}, include=[])["ids"]
+        stale = [chunk_id for chunk_id in stored if chunk_id not in current]
+        if stale:
+            self.collection.delete(ids=stale)
+            self.stats["deleted"] += len(stale)
+
+    def _report_progress(self, elapsed: float):
+        s = self.stats
+        print(f"  {s['files']} files, {s['chunks']} chunks ({s['embedded']} embedded, "
+              f"{s['unchanged']} unchanged) - {s['chunks'] / elapsed:.1f} chunks/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="+", help="Source files or directories")
+    parser.add_argument("--persist-dir", default=str(DEFAULT_PERSIST_DIR))
+    parser.add_argument("--collection", default=COLLECTION)
+    parser.add_argument("--journal", help="Completed-file journal (default: <persist_dir>_ingest.jsonl)")
+    parser.add_argument("--workers", type=int, default=2, help="Embedding processes (0 = in-process)")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--chunk-words", type=int, default=DEFAULT_CHUNK_WORDS)
+    parser.add_argument("--overlap-words", type=int, default=DEFAULT_OVERLAP_WORDS)
+    parser.add_argument("--create", action="store_true",
+                        help=f"Create the collection (hnsw:space={HNSW_SPACE}) if it does not exist")
+    for field in METADATA_FIELDS:
+        parser.add_argument(f"--{field.replace('_', '-')}", default="unknown" if field != "category" else "general")
+    args = parser.parse_args()
+
+    try:
+        # Fail on colliding document ids before touching the database
+        list(iter_source_files(args.paths))
+    except ValueError as e:
+        parser.error(str(e))
+
+    import chromadb
+    from chromadb.config import Settings
+
+    if not args.create and not os.path.exists(args.persist_dir):
+        parser.error(f"ChromaDB persistence directory not found at {args.persist_dir} (pass --create to create it)")
+    client = chromadb.PersistentClient(path=args.persist_dir, settings=Settings(anonymized_telemetry=False))
+    existing = [col.name for col in client.list_collections()]
+    if args.collection in existing:
+        collection = client.get_collection(name=args.collection)
+    elif args.create:
+        collection = client.create_collection(name=args.collection, metadata={"hnsw:space": HNSW_SPACE})
+        print(f"✓ Created collection '{args.collection}' (hnsw:space={HNSW_SPACE})")
+    else:
+        parser.error(f"Collection '{args.collection}' not found in {args.persist_dir}. "
+                     f"Available: {existing} (pass --create to create it)")
+    space = (collection.metadata or {}).get("hnsw:space", "l2")
+    if space != HNSW_SPACE:
+        print(f"⚠ Collection '{args.collection}' ranks by hnsw:space={space}; the RAG backend expects {HNSW_SPACE}")
+    before = collection.count()
+    journal_path = args.journal or f"{str(args.persist_dir).rstrip('/')}_ingest.jsonl"
+
+    ingestor = Ingestor(
+        collection,
+        IngestJournal(journal_path),
+        workers=args.workers,
+        batch_size=args.batch_size,
+        chunk_words=args.chunk_words,
+        overlap_words=args.overlap_words,
+        defaults={field: getattr(args, field) for field in METADATA_FIELDS}
+    )
+    print(f"Ingesting into '{args.collection}' ({before} chunks, {args.workers} workers)...")
+    try:
+        stats = ingestor.run(args.paths)
+    finally:
+        ingestor.close()
+
+    print("\n" + "=" * 60)
+    print("Ingestion complete")
+    print("=" * 60)
+    print(f"Files:     {stats['files']} ingested, {stats['files_skipped']} unchanged (journal)")
+    print(f"Chunks:    {stats['chunks']} read, {stats['unchanged']} unchanged, "
+          f"{stats['embedded']} embedded, {stats['deleted']} stale deleted")
+    print(f"Time:      {stats['seconds']:.1f}s")
+    print(f"Throughput: {stats['chunks_per_second']:.1f} chunks/s read, "
+          f"{stats['embedded_per_second']:.1f} chunks/s embedded")
+    print(f"Collection: {before} -> {collection.count()} chunks")
+    if stats["embedded"] or stats["deleted"]:
+        print("⚠ Restart the RAG service to serve the new chunks (re-export the mmap index first "
+              "if RAG_VECTOR_STORE=mmap); the BM25 index and answer cache rebuild automatically.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+BM25 inverted index over the RAG knowledge-base chunks.
+
+Tokens use the same normalization as the intent model (``text_normalizer``:
+lowercasing, Arabic letter folding, tashkeel and elongation removal), plus
+light Arabic prefix stripping and Latin accent folding, so exact drug names,
+center names and transliterated Darija terms match across spellings.
+
+Postings are stored CSR-style with precomputed BM25 weights, so a query is a
+few array slices and one ``np.bincount``.
+"""
+
+import json
+import os
+import sys
+import unicodedata
+from pathlib import Path
+from typing import Dict, FrozenSet, Iterable, List, Tuple
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "intent_model"))
+from text_normalizer import normalize
+
+# Arabic article/conjunction prefixes, longest first
+_ARABIC_PREFIXES = ("وال", "بال", "كال", "فال", "لل", "ال")
+
+
+def _fold_latin(token: str) -> str:
+    """Drop accents from Latin tokens ('caféine' -> 'cafeine')."""
+    if token.isascii():
+        return token
+    return "".join(c for c in unicodedata.normalize("NFD", token) if not unicodedata.combining(c))
+
+
+def _strip_prefix(token: str) -> str:
+    for prefix in _ARABIC_PREFIXES:
+        if token.startswith(prefix) and len(token) - len(prefix) >= 2:
+            return token[len(prefix):]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """Index/query terms for a text."""
+    return [_strip_prefix(_fold_latin(token)) for token in normalize(text).cleaned.split()]
+
+
+class LexicalIndex:
+    """In-memory BM25 index with precomputed per-posting weights."""
+
+    K1 = 1.2
+    B = 0.75
+
+    # Terms found in at most this share of chunks count as content terms
+    # (substances, places, centers) rather than function words
+    MAX_CONTENT_DF = 0.05
+
+    def __init__(self, ids: List[str], vocab: Dict[str, int], offsets: np.ndarray,
+                 postings: np.ndarray, weights: np.ndarray, version: str = ""):
+        self.ids = ids
+        self.vocab = vocab
+        self.offsets = offsets
+        self.postings = postings
+        self.weights = weights
+        self.version = version
+
+    @classmethod
+    def build(cls, ids: List[str], documents: Iterable[str], version: str = "") -> "LexicalIndex":
+        """
+        Index ``documents`` (aligned with ``ids``).
+
+        Args:
+            ids: Chunk ids.
+            documents: Chunk texts.
+            version: Knowledge-base fingerprint stored with the index.
+        """
+        vocab: Dict[str, int] = {}
+        doc_terms: List[Dict[int, int]] = []
+        for document in documents:
+            counts: Dict[int, int] = {}
+            for token in tokenize(document or ""):
+                term = vocab.setdefault(token, len(vocab))
+                counts[term] = counts.get(term, 0) + 1
+            doc_terms.append(counts)
+
+        n_docs = len(doc_terms)
+        lengths = np.array([sum(counts.values()) for counts in doc_terms], dtype=np.float32)
+        avg_length = float(lengths.mean()) if n_docs else 0.0
+
+        # Document frequency -> CSR offsets
+        df = np.zeros(len(vocab), dtype=np.int64)
+        for counts in doc_terms:
+            for term in counts:
+                df[term] += 1
+        offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(df)
+
+        postings = np.empty(offsets[-1], dtype=np.int32)
+        tfs = np.empty(offsets[-1], dtype=np.float32)
+        cursor = offsets[:-1].copy()
+        for doc, counts in enumerate(doc_terms):
+            for term, tf in counts.items():
+                postings[cursor[term]] = doc
+                tfs[cursor[term]] = tf
+                cursor[term] += 1
+
+        idf = np.log(1.0 + (n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+        term_of_posting = np.repeat(np.arange(len(vocab)), df)
+        norm = cls.K1 * (1.0 - cls.B + cls.B * lengths[postings] / max(avg_length, 1e-9))
+        weights = (idf[term_of_posting] * tfs * (cls.K1 + 1.0) / (tfs + norm)).astype(np.float32)
+
+        return cls(list(ids), vocab, offsets, postings, weights, version)
+
+    def search(self, query: str, n_results: int = 20) -> List[Tuple[str, float]]:
+        """
+        Top chunks by BM25 score.
+
+        Returns:
+            List of (chunk id, score), best first; chunks without any query term are omitted.
+        """
+        terms = {self.vocab[token] for token in tokenize(query) if token in self.vocab}
+        if not terms:
+            return []
+
+        docs = np.concatenate([self.postings[self.offsets[t]:self.offsets[t + 1]] for t in terms])
+        weights = np.concatenate([self.weights[self.offsets[t]:self.offsets[t + 1]] for t in terms])
+        scores = np.bincount(docs, weights=weights, minlength=len(self.ids))
+
+        candidates = np.unique(docs)
+        k = min(n_results, len(candidates))
+        top = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        top = top[np.argsort(-scores[top])]
+        return [(self.ids[doc], float(scores[doc])) for doc in top]
+
+    def content_terms(self, text: str) -> FrozenSet[str]:
+        """Terms of ``text`` that are rare in the knowledge base or absent from it."""
+        limit = self.MAX_CONTENT_DF * max(len(self.ids), 1)
+        terms = set()
+        for token in tokenize(text):
+            term = self.vocab.get(token)
+            if term is None or self.offsets[term + 1] - self.offsets[term] <= limit:
+                terms.add(token)
+        return frozenset(terms)
+
+    def save(self, path: str):
+        """Write the index to one .npz file (atomically)."""
+        meta = json.dumps({"ids": self.ids, "vocab": self.vocab, "version": self.version}, ensure_ascii=False)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, offsets=self.offsets, postings=self.postings, weights=self.weights, meta=np.array(meta))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "LexicalIndex":
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+            return cls(meta["ids"], meta["vocab"], data["offsets"], data["postings"], data["weights"], meta["version"])
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[str]:
+    """
+    Fuse ranked id lists: score(id) = sum over lists of 1 / (k + rank).
+
+    Returns:
+        Ids ordered by fused score (ties keep first-seen order).
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, start=1):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
@@ -1,39 +1,100 @@
 import os
-import chromadb
-from chromadb.config import Settings
-from sentence_transformers import SentenceTransformer
-import google.generativeai as genai
-from typing import List, Dict, Tuple, Optional
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Dict, Tuple, Optional
 import time
 from dotenv import load_dotenv
 from pathlib import Path
 
+import numpy as np
+
+from context_builder import ContextBuilder, format_chunk, parse_budgets
+from embedding_service import EmbeddingService
+from lexical_index import LexicalIndex, reciprocal_rank_fusion, tokenize
+from resilient_llm import GeminiAsyncClient, HttpLLMClient, LLMError, make_policy
+from semantic_cache import SemanticCache
+
+# chromadb, sentence_transformers and google.generativeai are imported inside the
+# _init_* methods so importing this module stays cheap.
+
 class RAGBackend:
-    def __init__(self, persist_dir: str = "./full_database", collection_name: str = "improved_drug_research"):
+    # Embedding model used for both the knowledge base and queries
+    EMBEDDING_MODEL = 'paraphrase-multilingual-MiniLM-L12-v2'
+    
+    # Replies that must not be served from the answer cache
+    ERROR_PREFIXES = ("Error generating response", "Failed to generate response")
+    
+    # Seconds between checks that the knowledge base is unchanged
+    KB_CHECK_INTERVAL = 60.0
+
+    # Retrieval engines: ChromaDB, or the exported memory-mapped index (vector_index.py)
+    VECTOR_STORES = ("chroma", "mmap")
+    
+    # Ranking: dense embeddings, BM25 (lexical_index.py), or both fused with RRF
+    RETRIEVAL_MODES = ("dense", "lexical", "hybrid")
+    
+    # Candidates taken from each ranking before fusion
+    HYBRID_CANDIDATES = 20
+    
+    # Chunks retrieved per prompt slot, so the context builder can skip weak or duplicate ones
+    CONTEXT_POOL = 2
+    
+    # Threads for the async path's embedding/retrieval when the caller passes no executor
+    DEFAULT_ASYNC_WORKERS = 4
+
+    def __init__(
+        self,
+        persist_dir: str = "./full_database",
+        collection_name: str = "improved_drug_research",
+        vector_store: Optional[str] = None,
+        index_dir: Optional[str] = None
+    ):
         """
         Initialize the RAG Backend system.
         
         Args:
             persist_dir: Path to the persistent ChromaDB directory.
             collection_name: Name of the ChromaDB collection.
+            vector_store: 'chroma' or 'mmap'. Defaults to env RAG_VECTOR_STORE, else 'chroma'.
+            index_dir: Exported index for 'mmap'. Defaults to env RAG_INDEX_DIR,
+                else '<persist_dir>_mmap'.
         """
         # Load environment variables
         load_dotenv()
         
         self.persist_dir = persist_dir
         self.collection_name = collection_name
+        self.vector_store = vector_store or os.getenv("RAG_VECTOR_STORE", "chroma")
+        if self.vector_store not in self.VECTOR_STORES:
+            raise ValueError(f"vector_store must be one of {self.VECTOR_STORES}, got '{self.vector_store}'")
+        self.index_dir = index_dir or os.getenv("RAG_INDEX_DIR") or f"{str(persist_dir).rstrip('/')}_mmap"
+        # Local model directory in place of the default (e.g. load-test stand-ins)
+        self.embedding_model_name = os.getenv("RAG_EMBEDDING_MODEL", self.EMBEDDING_MODEL)
+        self.chroma_client = None
         
         # Initialize Google GenAI
         self._init_genai()
         
-        # Initialize Embedding Model
-        self._init_embedding_model()
+        # Embedding model and vector store are independent; load them concurrently
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            loads = [pool.submit(self._init_embedding_model), pool.submit(self._init_vector_store)]
+            for load in loads:
+                load.result()
         
-        # Initialize ChromaDB
-        self._init_chromadb()
+        self._init_lexical_index()
+        self._init_answer_cache()
+        self._init_context_builder()
+        
+        # Bounded pool for generate_response_async callers without their own executor
+        self._async_pool = ThreadPoolExecutor(
+            max_workers=int(os.getenv("RAG_ASYNC_WORKERS", self.DEFAULT_ASYNC_WORKERS)),
+            thread_name_prefix="rag-async"
+        )
         
     def _init_genai(self):
         """Configure the Google Gemini API."""
+        import google.generativeai as genai
+        
         api_key = os.getenv('GOOGLE_API_KEY')
         if not api_key:
             # Fallback or error - for backend integration better to raise error or rely on env
@@ -43,17 +104,49 @@ class RAGBackend:
             genai.configure(api_key=api_key)
             
         self.model = genai.GenerativeModel('gemini-2.5-flash')
-        print("✓ Gemini 2.5 Flash configured")
+        # Deadlines/retries/hedging for the async path (RAG_LLM_TIMEOUT, RAG_LLM_MAX_RETRIES, RAG_LLM_HEDGE).
+        # RAG_LLM_URL sends async calls to a plain JSON endpoint instead (fake_llm_server.py).
+        llm_url = os.getenv("RAG_LLM_URL")
+        self.async_llm = make_policy(HttpLLMClient(llm_url) if llm_url else GeminiAsyncClient(self.model))
+        print("✓ Gemini 2.5 Flash configured" + (f" (async calls go to {llm_url})" if llm_url else ""))
 
     def _init_embedding_model(self):
         """Load the SentenceTransformer embedding model."""
+        from sentence_transformers import SentenceTransformer
+        
         print("Loading embedding model...")
         # Using the same model as in the notebook
-        self.embedding_model = SentenceTransformer('paraphrase-multilingual-MiniLM-L12-v2')
+        self.embedding_model = SentenceTransformer(self.embedding_model_name)
+        # Batches concurrent query encodes and caches them (RAG_EMBED_WINDOW_MS=0 disables batching)
+        self.embedding_service = EmbeddingService(
+            self.embedding_model,
+            window_ms=float(os.getenv("RAG_EMBED_WINDOW_MS", EmbeddingService.DEFAULT_WINDOW_MS)),
+            cache_max_entries=int(os.getenv("RAG_EMBED_CACHE_SIZE", EmbeddingService.DEFAULT_CACHE_ENTRIES))
+        )
         print("✓ Embedding model loaded")
 
+    def _init_vector_store(self):
+        """Open the configured retrieval engine as ``self.collection``."""
+        if self.vector_store == "mmap":
+            self._init_mmap_index()
+        else:
+            self._init_chromadb()
+
+    def _init_mmap_index(self):
+        """Open the exported memory-mapped index (shared across worker processes)."""
+        from vector_index import MmapVectorIndex
+        
+        self.collection = MmapVectorIndex(
+            self.index_dir, nprobe=int(os.getenv("RAG_INDEX_NPROBE", MmapVectorIndex.DEFAULT_NPROBE))
+        )
+        print(f"✓ Opened vector index '{self.index_dir}' with {self.collection.count()} chunks "
+              f"({self.collection.manifest['dtype']}, {self.collection.manifest['n_lists']} lists)")
+
     def _init_chromadb(self):
         """Connect to the persistent ChromaDB."""
+        import chromadb
+        from chromadb.config import Settings
+        
         if not os.path.exists(self.persist_dir):
             raise FileNotFoundError(f"ChromaDB persistence directory not found at {self.persist_dir}")
 
@@ -71,23 +164,279 @@ class RAGBackend:
         self.collection = self.chroma_client.get_collection(name=self.collection_name)
         print(f"✓ Connected to collection '{self.collection_name}' with {self.collection.count()} chunks")
 
+    def _init_lexical_index(self):
+        """
+        Load (or build and save) the BM25 index used by 'lexical' and 'hybrid' retrieval.
+        
+        RAG_RETRIEVAL selects the mode (default 'hybrid'); RAG_LEXICAL_INDEX
+        overrides the index file. A stale index (different KB fingerprint) is rebuilt.
+        """
+        self.retrieval_mode = os.getenv("RAG_RETRIEVAL", "hybrid")
+        if self.retrieval_mode not in self.RETRIEVAL_MODES:
+            raise ValueError(f"RAG_RETRIEVAL must be one of {self.RETRIEVAL_MODES}, got '{self.retrieval_mode}'")
+        self.lexical_index = None
+        if self.retrieval_mode == "dense":
+            return
+        
+        path = os.getenv("RAG_LEXICAL_INDEX") or f"{str(self.persist_dir).rstrip('/')}_bm25.npz"
+        version = self._kb_version()
+        try:
+            if os.path.exists(path):
+                index = LexicalIndex.load(path)
+                if index.version == version:
+                    self.lexical_index = index
+            if self.lexical_index is None:
+                start = time.perf_counter()
+                ids, documents = [], []
+                for offset in range(0, self.collection.count(), 1000):
+                    page = self.collection.get(include=["documents"], limit=1000, offset=offset)
+                    ids.extend(page["ids"])
+                    documents.extend(page["documents"])
+                self.lexical_index = LexicalIndex.build(ids, documents, version)
+                self.lexical_index.save(path)
+                print(f"✓ Built BM25 index over {len(ids)} chunks in {time.perf_counter() - start:.1f}s")
+            print(f"✓ Lexical index ready ({len(self.lexical_index.vocab)} terms, mode={self.retrieval_mode})")
+        except Exception as e:
+            print(f"⚠ Lexical index unavailable, using dense retrieval: {e}")
+            self.retrieval_mode = "dense"
+
+    def _init_answer_cache(self):
+        """
+        Create the semantic answer cache from RAG_CACHE_* environment variables.
+        
+        Off unless RAG_CACHE_SIZE is set (a wrong cached medical answer is worse
+        than a slower right one); RAG_CACHE_PATH persists it across restarts.
+        """
+        max_entries = int(os.getenv("RAG_CACHE_SIZE", "0"))
+        self.answer_cache_path = os.getenv("RAG_CACHE_PATH")
+        self.answer_cache = None
+        if max_entries <= 0:
+            return
+        
+        self.answer_cache = SemanticCache(
+            max_entries=max_entries,
+            ttl_seconds=float(os.getenv("RAG_CACHE_TTL", SemanticCache.DEFAULT_TTL_SECONDS)),
+            threshold=float(os.getenv("RAG_CACHE_THRESHOLD", SemanticCache.DEFAULT_THRESHOLD)),
+            kb_version=self._kb_version(),
+            key_terms=self._content_terms
+        )
+        self._kb_checked_at = time.monotonic()
+        if self.answer_cache_path:
+            loaded = self.answer_cache.load(self.answer_cache_path)
+            print(f"✓ Loaded {loaded} cached answers from {self.answer_cache_path}")
+
+    def _init_context_builder(self):
+        """
+        Create the prompt context builder from RAG_CONTEXT_* environment variables.
+        
+        RAG_CONTEXT_TOKENS is one budget for all languages ('1200') or per
+        language ('ar=1800,dz=1800,fr=1200,en=1200').
+        """
+        budgets = os.getenv("RAG_CONTEXT_TOKENS")
+        self.context_builder = ContextBuilder(
+            budgets=parse_budgets(budgets) if budgets else None,
+            min_similarity=float(os.getenv("RAG_CONTEXT_MIN_SIMILARITY", ContextBuilder.DEFAULT_MIN_SIMILARITY)),
+            mmr_lambda=float(os.getenv("RAG_CONTEXT_MMR_LAMBDA", ContextBuilder.DEFAULT_MMR_LAMBDA))
+        )
+
+    def _kb_version(self) -> str:
+        """Fingerprint of the collection contents and embedding model."""
+        if self.vector_store == "mmap":
+            manifest = self.collection.manifest
+            return f"{manifest['source']}:{manifest['count']}:{manifest['created_at']:.0f}:{self.embedding_model_name}"
+        sqlite_path = os.path.join(self.persist_dir, "chroma.sqlite3")
+        mtime = os.path.getmtime(sqlite_path) if os.path.exists(sqlite_path) else 0.0
+        return f"{self.collection_name}:{self.collection.count()}:{mtime:.0f}:{self.embedding_model_name}"
+
+    def refresh_kb_version(self):
+        """Invalidate cached answers if the knowledge base changed (e.g. after ingestion)."""
+        if self.answer_cache is not None:
+            self.answer_cache.set_kb_version(self._kb_version())
+            self._kb_checked_at = time.monotonic()
+
+    def _content_terms(self, text: str) -> frozenset:
+        """Terms two queries must share to reuse an answer (rare KB terms; every term without the BM25 index)."""
+        if self.lexical_index is not None:
+            return self.lexical_index.content_terms(text)
+        return frozenset(tokenize(text))
+
+    def _cached_answer(self, query: str, embedding: np.ndarray, language: str) -> Optional[str]:
+        """Answer of a semantically equivalent earlier query, if any."""
+        if self.answer_cache is None:
+            return None
+        if time.monotonic() - self._kb_checked_at > self.KB_CHECK_INTERVAL:
+            self.refresh_kb_version()
+        hit = self.answer_cache.get(embedding, language, query)
+        return hit[0] if hit else None
+
+    def _cache_answer(self, query: str, embedding: np.ndarray, language: str, answer: str):
+        # Empty replies and errors would be served to every similar query until they expire
+        if self.answer_cache is not None and answer.strip() and not answer.startswith(self.ERROR_PREFIXES):
+            self.answer_cache.put(query, embedding, language, answer)
+
+    def save_answer_cache(self):
+        """Persist the answer cache to RAG_CACHE_PATH (no-op if unset)."""
+        if self.answer_cache is not None and self.answer_cache_path:
+            self.answer_cache.save(self.answer_cache_path)
+            print(f"✓ Saved answer cache to {self.answer_cache_path}")
+
+    def get_embedding_stats(self) -> Dict:
+        """Query embedding cache and batching counters."""
+        return self.embedding_service.get_stats()
+
+    def get_context_stats(self) -> Dict:
+        """Chunks retrieved vs used and estimated prompt tokens per request."""
+        return self.context_builder.get_stats()
+
+    def get_cache_stats(self) -> Optional[Dict]:
+        """Answer cache counters and similarity distribution (None if disabled)."""
+        return self.answer_cache.get_stats() if self.answer_cache is not None else None
+
+    def share_memory(self):
+        """Move embedding model weights into shared memory before forking workers."""
+        self.embedding_model.share_memory()
+
+    def reconnect(self):
+        """
+        Re-open fork-unsafe clients (ChromaDB/SQLite, Gemini gRPC) in a forked worker.
+        """
+        self._init_genai()
+        if self.chroma_client is not None:
+            # PersistentClient caches its system per path; drop the parent's copy
+            self.chroma_client.clear_system_cache()
+            self._init_chromadb()
+        # The memory-mapped index is read-only and safe to keep across fork()
+        self.refresh_kb_version()
+
     def retrieve_relevant_chunks(self, query: str, n_results: int = 5) -> Tuple[List[str], List[Dict]]:
         """
         Retrieve relevant chunks for a given query using semantic search.
         """
-        # Generate query embedding
-        query_embedding = self.embedding_model.encode([query])[0].tolist()
+        return self.retrieve_relevant_chunks_batch([query], n_results)[0]
+
+    def retrieve_relevant_chunks_batch(
+        self,
+        queries: List[str],
+        n_results: int = 5,
+        embeddings: Optional[np.ndarray] = None
+    ) -> List[Tuple[List[str], List[Dict]]]:
+        """
+        Retrieve relevant chunks for several queries with one encode and one vector store query.
+        
+        In 'hybrid' mode the dense and BM25 rankings are fused with reciprocal-rank
+        fusion; chunks found only lexically are fetched in one extra lookup.
+        
+        Args:
+            queries: The user questions.
+            n_results: Number of chunks per query.
+            embeddings: Precomputed query embeddings (skips encoding).
+        """
+        if not queries:
+            return []
+        
+        rankings, known = self._rank(queries, n_results, embeddings)
+        return [(documents, metadatas) for documents, metadatas, _ in self._chunks_by_id(rankings, known)]
+
+    def retrieve_context_batch(
+        self,
+        queries: List[str],
+        n_results: int = 5,
+        embeddings: Optional[np.ndarray] = None
+    ) -> List[Tuple[List[str], List[Dict], Optional[np.ndarray]]]:
+        """
+        Like ``retrieve_relevant_chunks_batch``, but also returns each chunk's
+        embedding (one row per document) for the context builder.
+        """
+        if not queries:
+            return []
+        
+        rankings, known = self._rank(queries, n_results, embeddings, with_embeddings=True)
+        return self._chunks_by_id(rankings, known, with_embeddings=True)
+
+    def rank_chunks(
+        self,
+        queries: List[str],
+        n_results: int = 5,
+        embeddings: Optional[np.ndarray] = None
+    ) -> List[List[str]]:
+        """Ranked chunk ids per query for the current retrieval mode (used for evaluation)."""
+        return self._rank(queries, n_results, embeddings)[0] if queries else []
+
+    def _rank(
+        self,
+        queries: List[str],
+        n_results: int,
+        embeddings: Optional[np.ndarray],
+        with_embeddings: bool = False
+    ) -> Tuple[List[List[str]], Dict[str, Tuple]]:
+        """Ranked ids per query, plus the chunks the vector store already returned."""
+        if self.retrieval_mode == "lexical":
+            return [[chunk_id for chunk_id, _ in self.lexical_index.search(query, n_results)] for query in queries], {}
+
+        # Generate query embeddings in a single batch
+        if embeddings is None:
+            embeddings = self.embed(queries)
         
-        # Query ChromaDB
+        hybrid = self.retrieval_mode == "hybrid"
+        
+        # Query the vector store (lists: chromadb 0.4.x rejects numpy embeddings)
+        include = ["documents", "metadatas", "distances"] + (["embeddings"] if with_embeddings else [])
         results = self.collection.query(
-            query_embeddings=[query_embedding],
-            n_results=n_results
+            query_embeddings=embeddings.tolist(),
+            n_results=max(n_results, self.HYBRID_CANDIDATES) if hybrid else n_results,
+            include=include
         )
         
-        documents = results['documents'][0] if results['documents'] else []
-        metadatas = results['metadatas'][0] if results['metadatas'] else []
+        known: Dict[str, Tuple] = {}
+        rankings = []
+        for i, query in enumerate(queries):
+            dense_ids = results['ids'][i]
+            chunk_embeddings = results['embeddings'][i] if with_embeddings else [None] * len(dense_ids)
+            for chunk_id, document, metadata, embedding in zip(
+                dense_ids, results['documents'][i], results['metadatas'][i], chunk_embeddings
+            ):
+                known[chunk_id] = (document, metadata, embedding)
+            if hybrid:
+                lexical_ids = [chunk_id for chunk_id, _ in self.lexical_index.search(query, self.HYBRID_CANDIDATES)]
+                rankings.append(reciprocal_rank_fusion([dense_ids, lexical_ids])[:n_results])
+            else:
+                rankings.append(dense_ids)
+        return rankings, known
+
+    def _chunks_by_id(
+        self,
+        rankings: List[List[str]],
+        known: Dict[str, Tuple],
+        with_embeddings: bool = False
+    ) -> List[Tuple[List[str], List[Dict], Optional[np.ndarray]]]:
+        """
+        Resolve ranked chunk ids to (documents, metadatas, embeddings), fetching
+        unknown ids in one call. Embeddings are None unless ``with_embeddings``.
+        """
+        missing = list({chunk_id for ranking in rankings for chunk_id in ranking if chunk_id not in known})
+        if missing:
+            include = ["documents", "metadatas"] + (["embeddings"] if with_embeddings else [])
+            fetched = self.collection.get(ids=missing, include=include)
+            fetched_embeddings = fetched['embeddings'] if with_embeddings else [None] * len(fetched['ids'])
+            for chunk_id, document, metadata, embedding in zip(
+                fetched['ids'], fetched['documents'], fetched['metadatas'], fetched_embeddings
+            ):
+                known[chunk_id] = (document, metadata, embedding)
         
-        return documents, metadatas
+        retrieved = []
+        for ranking in rankings:
+            chunks = [known[chunk_id] for chunk_id in ranking if chunk_id in known]
+            retrieved.append((
+                [document for document, _, _ in chunks],
+                [metadata or {} for _, metadata, _ in chunks],
+                np.asarray([embedding for _, _, embedding in chunks], dtype=np.float32)
+                if with_embeddings and chunks else None
+            ))
+        return retrieved
+
+    def embed(self, queries: List[str]) -> np.ndarray:
+        """Query embeddings, one row per query (cached, batched across callers)."""
+        return self.embedding_service.encode(queries)
 
     def generate_response(self, query: str, language: str = "ar", n_results: int = 5, max_retries: int = 3) -> str:
         """
@@ -102,29 +451,233 @@ class RAGBackend:
         Returns:
             The generated response string.
         """
-        # Retrieve relevant chunks
-        documents, metadatas = self.retrieve_relevant_chunks(query, n_results)
+        embeddings = self.embed([query])
+        cached = self._cached_answer(query, embeddings[0], language)
+        if cached is not None:
+            return cached
+        
+        # Retrieve candidate chunks and keep the ones worth their prompt tokens
+        retrieved = self.retrieve_context_batch([query], n_results * self.CONTEXT_POOL, embeddings)[0]
+        documents, metadatas = self._select_context(language, n_results, embeddings[0], retrieved)
+        answer = self._answer(query, language, documents, metadatas, max_retries)
+        self._cache_answer(query, embeddings[0], language, answer)
+        return answer
+
+    def generate_responses(
+        self,
+        queries: List[str],
+        languages: List[str],
+        n_results: int = 5,
+        max_retries: int = 3
+    ) -> List[str]:
+        """
+        Generate responses for several queries, retrieving context for all of them at once.
+        
+        Args:
+            queries: The user questions.
+            languages: Response language for each query.
+            n_results: Number of context chunks to retrieve per query.
+            max_retries: Number of retries for each LLM call.
+            
+        Returns:
+            Generated response strings, in the order of ``queries``.
+        """
+        if not queries:
+            return []
         
+        embeddings = self.embed(queries)
+        answers: List[Optional[str]] = [
+            self._cached_answer(query, embedding, language)
+            for query, embedding, language in zip(queries, embeddings, languages)
+        ]
+        
+        # Retrieve and generate only for cache misses
+        misses = [i for i, answer in enumerate(answers) if answer is None]
+        retrieved = self.retrieve_context_batch(
+            [queries[i] for i in misses], n_results * self.CONTEXT_POOL, embeddings[misses]
+        )
+        for i, chunks in zip(misses, retrieved):
+            documents, metadatas = self._select_context(languages[i], n_results, embeddings[i], chunks)
+            answers[i] = self._answer(queries[i], languages[i], documents, metadatas, max_retries)
+            self._cache_answer(queries[i], embeddings[i], languages[i], answers[i])
+        return answers
+
+    async def generate_response_async(
+        self,
+        query: str,
+        language: str = "ar",
+        n_results: int = 5,
+        executor=None
+    ) -> str:
+        """
+        Async ``generate_response``: embedding, the answer-cache lookup and
+        retrieval run in a bounded executor, and the Gemini call goes through
+        ``self.async_llm`` (per-attempt deadline, jittered non-blocking
+        backoff, optional hedging) without holding a thread.
+        
+        Args:
+            query: The user's question.
+            language: Response language ('ar', 'fr', 'en', 'dz').
+            n_results: Number of context chunks to retrieve.
+            executor: Object with ``async run(fn, *args)`` for the blocking work
+                (e.g. the API's inference ``StageExecutor``, whose overload
+                error propagates). Defaults to the backend's own pool
+                (RAG_ASYNC_WORKERS threads).
+            
+        Returns:
+            The generated response string.
+        """
+        embeddings, cached = await self._run_blocking(executor, self._embed_cached, query, language)
+        if cached is not None:
+            return cached
+        
+        prompt = await self._run_blocking(executor, self._retrieve_prompt, query, language, n_results, embeddings)
+        if prompt is None:
+            answer = self._no_info_message(language)
+        else:
+            try:
+                answer = await self.async_llm.generate(prompt)
+            except asyncio.TimeoutError:
+                return "Error generating response: LLM request timed out"
+            except Exception as e:
+                return f"Error generating response: {str(e)}"
+        
+        self._cache_answer(query, embeddings[0], language, answer)
+        return answer
+
+    async def _run_blocking(self, executor, fn, *args):
+        """Await ``fn(*args)`` in ``executor`` or, without one, the backend's bounded pool."""
+        if executor is not None:
+            return await executor.run(fn, *args)
+        return await asyncio.get_running_loop().run_in_executor(self._async_pool, fn, *args)
+
+    def _embed_cached(self, query: str, language: str) -> Tuple[np.ndarray, Optional[str]]:
+        """Query embedding and cached answer (the KB version check stats files and counts the collection)."""
+        embeddings = self.embed([query])
+        return embeddings, self._cached_answer(query, embeddings[0], language)
+
+    def _retrieve_prompt(self, query: str, language: str, n_results: int, embeddings: np.ndarray) -> Optional[str]:
+        """Retrieve, select and format the context; None when nothing relevant was found."""
+        retrieved = self.retrieve_context_batch([query], n_results * self.CONTEXT_POOL, embeddings)[0]
+        documents, metadatas = self._select_context(language, n_results, embeddings[0], retrieved)
+        return self._prompt(query, language, documents, metadatas) if documents else None
+
+    def generate_response_stream(
+        self,
+        query: str,
+        language: str = "ar",
+        n_results: int = 5,
+        max_retries: int = 3
+    ) -> Iterator[str]:
+        """
+        Stream a RAG response as Gemini produces it.
+        
+        Same prompt and retry policy as ``generate_response``, but text chunks are
+        yielded as they arrive. Retries only happen before the first chunk; an
+        error after that is raised so the caller can report a truncated answer.
+        A stream without any text counts as a failed attempt.
+        
+        Args:
+            query: The user's question.
+            language: Response language ('ar', 'fr', 'en', 'dz').
+            n_results: Number of context chunks to retrieve.
+            max_retries: Number of retries for the LLM call.
+            
+        Yields:
+            Response text chunks.
+        """
+        embeddings = self.embed([query])
+        cached = self._cached_answer(query, embeddings[0], language)
+        if cached is not None:
+            yield cached
+            return
+        
+        retrieved = self.retrieve_context_batch([query], n_results * self.CONTEXT_POOL, embeddings)[0]
+        documents, metadatas = self._select_context(language, n_results, embeddings[0], retrieved)
         if not documents:
-            no_info_messages = {
-                "ar": "لم يتم العثور على معلومات ذات صلة في قاعدة المعرفة.",
-                "fr": "Aucune information pertinente trouvée dans la base de connaissances.",
-                "en": "No relevant information found in the knowledge base.",
-                "dz": "ما لقيناش معلومات في قاعدة البيانات."
-            }
-            return no_info_messages.get(language, no_info_messages["en"])
+            yield self._no_info_message(language)
+            return
         
-        # Build enhanced context with metadata
-        context_parts = []
-        for doc, meta in zip(documents, metadatas):
-            context_part = f"**Context from {meta.get('category', 'Unknown')}:**\n{doc}"
-            if meta.get('geographic_context') and meta.get('geographic_context') != 'unknown':
-                context_part += f"\n- Geographic Context: {meta['geographic_context']}"
-            if meta.get('timeframe') and meta.get('timeframe') != 'unknown':
-                context_part += f"\n- Timeframe: {meta['timeframe']}"
-            context_parts.append(context_part)
+        prompt = self._prompt(query, language, documents, metadatas)
+        for attempt in range(max_retries):
+            parts = []
+            try:
+                for chunk in self.model.generate_content(prompt, stream=True):
+                    if chunk.text:
+                        parts.append(chunk.text)
+                        yield chunk.text
+                if not parts:
+                    # Nothing was yielded yet, so this retries like any failed attempt
+                    raise LLMError("LLM returned an empty response")
+                self._cache_answer(query, embeddings[0], language, "".join(parts))
+                return
+            except Exception as e:
+                if parts:
+                    raise
+                if attempt < max_retries - 1:
+                    time.sleep(self.async_llm.backoff_delay(attempt))
+                else:
+                    yield f"Error generating response: {str(e)}"
+
+    def _answer(self, query: str, language: str, documents: List[str], metadatas: List[Dict], max_retries: int) -> str:
+        """Build the prompt from retrieved chunks and query the LLM."""
+        if not documents:
+            return self._no_info_message(language)
+        
+        prompt = self._prompt(query, language, documents, metadatas)
         
-        context = "\n\n".join(context_parts)
+        # Query LLM with retries
+        for attempt in range(max_retries):
+            try:
+                response = self.model.generate_content(prompt)
+                if not response.text:
+                    raise LLMError("LLM returned an empty response")
+                return response.text
+            except Exception as e:
+                if attempt < max_retries - 1:
+                    # Same jittered backoff as the async path
+                    time.sleep(self.async_llm.backoff_delay(attempt))
+                else:
+                    return f"Error generating response: {str(e)}"
+        
+        return "Failed to generate response after retries."
+
+    def _select_context(
+        self,
+        language: str,
+        n_results: int,
+        query_embedding: np.ndarray,
+        retrieved: Tuple[List[str], List[Dict], Optional[np.ndarray]]
+    ) -> Tuple[List[str], List[Dict]]:
+        """Relevance cutoff, MMR de-duplication and token budget over the retrieved candidates."""
+        documents, metadatas, chunk_embeddings = retrieved
+        return self.context_builder.select(
+            language, documents, metadatas, n_results,
+            query_embedding=query_embedding, chunk_embeddings=chunk_embeddings
+        )
+
+    def _prompt(self, query: str, language: str, documents: List[str], metadatas: List[Dict]) -> str:
+        """Build the prompt and record its size."""
+        prompt = self._build_prompt(query, language, documents, metadatas)
+        self.context_builder.record_prompt(prompt)
+        return prompt
+
+    @staticmethod
+    def _no_info_message(language: str) -> str:
+        """Reply used when retrieval finds nothing for the query."""
+        no_info_messages = {
+            "ar": "لم يتم العثور على معلومات ذات صلة في قاعدة المعرفة.",
+            "fr": "Aucune information pertinente trouvée dans la base de connaissances.",
+            "en": "No relevant information found in the knowledge base.",
+            "dz": "ما لقيناش معلومات في قاعدة البيانات."
+        }
+        return no_info_messages.get(language, no_info_messages["en"])
+
+    @staticmethod
+    def _build_prompt(query: str, language: str, documents: List[str], metadatas: List[Dict]) -> str:
+        """Language-specific Gemini prompt with the retrieved chunks as context."""
+        # Build enhanced context with metadata
+        context = "\n\n".join(format_chunk(doc, meta) for doc, meta in zip(documents, metadatas))
         
         # Language-specific prompts
         prompts = {
@@ -169,21 +722,7 @@ Answer in English.""",
 جاوب بالدارجة الجزائرية (مزيج من العربية والفرنسية كيما يهدرو في الجزائر)."""
         }
         
-        prompt = prompts.get(language, prompts["en"])
-        
-        # Query LLM with retries
-        for attempt in range(max_retries):
-            try:
-                response = self.model.generate_content(prompt)
-                return response.text
-            except Exception as e:
-                if attempt < max_retries - 1:
-                    wait_time = 2 ** attempt
-                    time.sleep(wait_time)
-                else:
-                    return f"Error generating response: {str(e)}"
-        
-        return "Failed to generate response after retries."
+        return prompts.get(language, prompts["en"])
 
 if __name__ == "__main__":
     # Simple test when running the file directly
@@ -0,0 +1,240 @@
+"""
+Async LLM calls with per-attempt deadlines, jittered backoff and hedging.
+
+ResilientLLM wraps any ``async generate(prompt) -> str`` client:
+- each attempt is bounded by ``attempt_timeout``
+- failed attempts back off with full jitter (``asyncio.sleep``, never blocking a thread;
+  ``backoff_delay`` gives the same delays to blocking callers)
+- optionally, if an attempt is still running after the recent p95 latency,
+  a duplicate request is sent and the first answer wins
+"""
+
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+
+class LLMError(Exception):
+    """Raised by LLM clients for failed (non-timeout) calls."""
+
+
+class GeminiAsyncClient:
+    """Adapter for ``genai.GenerativeModel.generate_content_async``."""
+
+    def __init__(self, model):
+        self.model = model
+
+    async def generate(self, prompt: str) -> str:
+        response = await self.model.generate_content_async(prompt)
+        if not response.text:
+            raise LLMError("LLM returned an empty response")
+        return response.text
+
+
+class HttpLLMClient:
+    """
+    Minimal asyncio HTTP client for a plain JSON LLM endpoint (e.g. fake_llm_server.py).
+
+    POSTs ``{"prompt": ...}`` and expects ``{"text": ...}``. Uses raw asyncio
+    streams so a cancelled attempt really closes its connection.
+    """
+
+    def __init__(self, url: str):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 80
+        self.path = parsed.path or "/generate"
+
+    async def generate(self, prompt: str) -> str:
+        body = json.dumps({"prompt": prompt}).encode("utf-8")
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            writer.write(
+                f"POST {self.path} HTTP/1.1\r\n"
+                f"Host: {self.host}:{self.port}\r\n"
+                "Content-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                "Connection: close\r\n\r\n".encode("ascii") + body
+            )
+            await writer.drain()
+            raw = await reader.read()
+        finally:
+            writer.close()
+
+        head, _, payload = raw.partition(b"\r\n\r\n")
+        status = int(head.split(b" ", 2)[1])
+        if status != 200:
+            raise LLMError(f"LLM server returned HTTP {status}")
+        return json.loads(payload)["text"]
+
+
+class ResilientLLM:
+    """Deadline, retry and hedging policy around an async LLM client."""
+
+    DEFAULT_ATTEMPT_TIMEOUT = 15.0
+    DEFAULT_MAX_RETRIES = 3
+
+    def __init__(
+        self,
+        client,
+        attempt_timeout: float = DEFAULT_ATTEMPT_TIMEOUT,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        backoff_base: float = 0.5,
+        backoff_max: float = 4.0,
+        hedge: bool = False,
+        hedge_quantile: float = 95.0,
+        hedge_min_samples: int = 20,
+        hedge_max_ratio: float = 0.1,
+        latency_window: int = 500
+    ):
+        """
+        Initialize the policy.
+
+        Args:
+            client: Object with ``async generate(prompt) -> str``.
+            attempt_timeout: Seconds one attempt (including its hedge) may take.
+            max_retries: Total attempts before giving up.
+            backoff_base: Backoff cap for the first retry; doubles per retry.
+            backoff_max: Upper bound on the backoff cap.
+            hedge: Send a duplicate request when an attempt outlives the recent
+                ``hedge_quantile`` latency.
+            hedge_quantile: Latency percentile used as the hedge delay.
+            hedge_min_samples: Successful calls needed before hedging starts.
+            hedge_max_ratio: At most this fraction of calls may be hedged, so a
+                broad slowdown does not double upstream load.
+            latency_window: Recent successful latencies kept for the percentile.
+        """
+        if max_retries < 1:
+            raise ValueError("max_retries must be >= 1")
+
+        self.client = client
+        self.attempt_timeout = attempt_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_max_ratio = hedge_max_ratio
+
+        self._latencies: deque = deque(maxlen=latency_window)
+        self._lock = threading.Lock()
+        self._stats = {
+            "calls": 0, "attempts": 0, "timeouts": 0, "errors": 0,
+            "retries": 0, "hedges_sent": 0, "hedges_won": 0, "failed": 0
+        }
+
+    async def generate(self, prompt: str) -> str:
+        """
+        Generate text, retrying failed or timed-out attempts.
+
+        Raises:
+            asyncio.TimeoutError or the client's exception, from the last attempt.
+        """
+        self._count("calls")
+        for attempt in range(self.max_retries):
+            self._count("attempts")
+            try:
+                return await asyncio.wait_for(self._hedged_call(prompt), self.attempt_timeout)
+            except asyncio.TimeoutError:
+                self._count("timeouts")
+                if attempt == self.max_retries - 1:
+                    self._count("failed")
+                    raise
+            except Exception:
+                self._count("errors")
+                if attempt == self.max_retries - 1:
+                    self._count("failed")
+                    raise
+
+            self._count("retries")
+            await asyncio.sleep(self.backoff_delay(attempt))
+
+    def backoff_delay(self, attempt: int) -> float:
+        """
+        Seconds to wait after failed attempt ``attempt`` (0-based).
+
+        Full jitter keeps retries from synchronizing into bursts. Blocking
+        callers (the sync and streaming RAG paths) sleep the same delays.
+        """
+        cap = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return random.uniform(0, cap)
+
+    async def _hedged_call(self, prompt: str) -> str:
+        """One attempt: the primary request plus at most one delayed duplicate."""
+        start = time.perf_counter()
+        primary = asyncio.ensure_future(self.client.generate(prompt))
+        tasks = [primary]
+        try:
+            delay = self._hedge_delay()
+            if delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done and self._take_hedge_budget():
+                    tasks.append(asyncio.ensure_future(self.client.generate(prompt)))
+
+            pending = set(tasks)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self._count("hedges_won")
+                        self._record_latency(time.perf_counter() - start)
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def _hedge_delay(self) -> Optional[float]:
+        """Recent latency percentile, or None while hedging is off or warming up."""
+        if not self.hedge:
+            return None
+        with self._lock:
+            if len(self._latencies) < self.hedge_min_samples:
+                return None
+            ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(self.hedge_quantile / 100.0 * len(ordered)))]
+
+    def _take_hedge_budget(self) -> bool:
+        with self._lock:
+            if self._stats["hedges_sent"] >= self.hedge_max_ratio * self._stats["calls"]:
+                return False
+            self._stats["hedges_sent"] += 1
+            return True
+
+    def _record_latency(self, seconds: float):
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def _count(self, key: str):
+        with self._lock:
+            self._stats[key] += 1
+
+    def get_stats(self) -> Dict:
+        """Return call/attempt counters and the current hedge delay."""
+        with self._lock:
+            stats = dict(self._stats)
+        delay = self._hedge_delay()
+        stats["hedge_delay_ms"] = round(delay * 1000.0, 1) if delay is not None else None
+        return stats
+
+
+def make_policy(client, **overrides) -> ResilientLLM:
+    """Build a ResilientLLM configured from RAG_LLM_* environment variables."""
+    config = {
+        "attempt_timeout": float(os.getenv("RAG_LLM_TIMEOUT", ResilientLLM.DEFAULT_ATTEMPT_TIMEOUT)),
+        "max_retries": int(os.getenv("RAG_LLM_MAX_RETRIES", ResilientLLM.DEFAULT_MAX_RETRIES)),
+        "hedge": os.getenv("RAG_LLM_HEDGE", "0") == "1",
+    }
+    config.update(overrides)
+    return ResilientLLM(client, **config)
@@ -0,0 +1,248 @@
+"""
+Semantic answer cache for RAG responses.
+Answers are keyed on the query embedding plus the response language; a new
+query within ``threshold`` cosine similarity of a cached one reuses its answer,
+provided both queries have the same content terms (``key_terms``). The term
+check stops a question about one substance from reusing the answer to the
+same question about another, whose embeddings are nearly identical.
+Bounded by entry count and TTL, optionally persisted to disk, and tied to a
+knowledge-base version so answers are dropped when the collection changes.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, FrozenSet, List, Optional, Tuple
+
+import numpy as np
+
+
+class SemanticCache:
+    """Thread-safe nearest-neighbour answer cache with LRU/TTL eviction."""
+
+    DEFAULT_MAX_ENTRIES = 2000
+    DEFAULT_TTL_SECONDS = 24 * 3600.0
+    DEFAULT_THRESHOLD = 0.95
+
+    # Upper edges of the best-similarity histogram reported in stats
+    SIMILARITY_BUCKETS = (0.5, 0.7, 0.8, 0.85, 0.9, 0.95, 1.0)
+
+    def __init__(
+        self,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        ttl_seconds: Optional[float] = DEFAULT_TTL_SECONDS,
+        threshold: float = DEFAULT_THRESHOLD,
+        kb_version: Optional[str] = None,
+        key_terms: Optional[Callable[[str], FrozenSet[str]]] = None
+    ):
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries: Maximum number of cached answers.
+            ttl_seconds: Entry lifetime in seconds (None = no expiry).
+            threshold: Minimum cosine similarity for a hit.
+            kb_version: Fingerprint of the knowledge base the answers came from.
+            key_terms: Content terms of a query; a hit requires equal terms
+                (None = embedding similarity only).
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.threshold = threshold
+        self.kb_version = kb_version
+        self.key_terms = key_terms
+
+        # entry id -> (language, unit vector, query, answer, created_at wall clock, key terms)
+        self._entries: "OrderedDict[int, Tuple[str, np.ndarray, str, str, float, Optional[FrozenSet[str]]]]" = OrderedDict()
+        self._next_id = 0
+        # language -> (entry ids, stacked unit vectors); rebuilt lazily after changes
+        self._matrices: Dict[str, Tuple[List[int], np.ndarray]] = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "term_mismatches": 0, "evictions": 0, "expirations": 0,
+                       "invalidations": 0}
+        self._histogram = [0] * len(self.SIMILARITY_BUCKETS)
+
+    @staticmethod
+    def _unit(embedding: np.ndarray) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm > 0 else vector
+
+    def _expired(self, created_at: float) -> bool:
+        return bool(self.ttl_seconds) and created_at + self.ttl_seconds < time.time()
+
+    def _matrix(self, language: str) -> Tuple[List[int], np.ndarray]:
+        """Entry ids and vectors for one language (caller holds the lock)."""
+        if language not in self._matrices:
+            ids = [i for i, entry in self._entries.items() if entry[0] == language]
+            vectors = np.stack([self._entries[i][1] for i in ids]) if ids else np.empty((0, 0), np.float32)
+            self._matrices[language] = (ids, vectors)
+        return self._matrices[language]
+
+    def _remove(self, entry_id: int):
+        language = self._entries.pop(entry_id)[0]
+        self._matrices.pop(language, None)
+
+    def _record_similarity(self, similarity: float):
+        for i, edge in enumerate(self.SIMILARITY_BUCKETS):
+            if similarity <= edge or i == len(self.SIMILARITY_BUCKETS) - 1:
+                self._histogram[i] += 1
+                return
+
+    def _terms(self, query: Optional[str]) -> Optional[FrozenSet[str]]:
+        return self.key_terms(query) if self.key_terms is not None and query is not None else None
+
+    def get(self, embedding: np.ndarray, language: str, query: Optional[str] = None) -> Optional[Tuple[str, float]]:
+        """
+        Find the most similar cached query in ``language`` with the same content terms.
+
+        Args:
+            embedding: Query embedding.
+            language: Response language.
+            query: Query text, for the ``key_terms`` check.
+
+        Returns:
+            Tuple of (cached answer, similarity), or None if nothing is close enough.
+        """
+        vector = self._unit(embedding)
+        terms = self._terms(query)
+        with self._lock:
+            while True:
+                ids, vectors = self._matrix(language)
+                if not ids:
+                    self._stats["misses"] += 1
+                    return None
+
+                similarities = vectors @ vector
+                best = int(np.argmax(similarities))
+                entry_id, similarity = ids[best], float(similarities[best])
+
+                if self._expired(self._entries[entry_id][4]):
+                    self._remove(entry_id)
+                    self._stats["expirations"] += 1
+                    continue
+                break
+
+            self._record_similarity(similarity)
+
+            # Most similar first; skip entries that name different content terms
+            candidates = np.flatnonzero(similarities >= self.threshold)
+            for row in candidates[np.argsort(-similarities[candidates])]:
+                entry_id = ids[row]
+                entry = self._entries[entry_id]
+                if self._expired(entry[4]):
+                    continue
+                if terms is not None and entry[5] is not None and entry[5] != terms:
+                    self._stats["term_mismatches"] += 1
+                    continue
+                self._entries.move_to_end(entry_id)
+                self._stats["hits"] += 1
+                return entry[3], float(similarities[row])
+
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, query: str, embedding: np.ndarray, language: str, answer: str):
+        """Store an answer, evicting least-recently-used entries past ``max_entries``."""
+        if self.max_entries <= 0:
+            return
+        vector = self._unit(embedding)
+        terms = self._terms(query)
+        with self._lock:
+            self._entries[self._next_id] = (language, vector, query, answer, time.time(), terms)
+            self._next_id += 1
+            self._matrices.pop(language, None)
+
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._stats["evictions"] += 1
+
+    def set_kb_version(self, kb_version: str):
+        """Drop every answer if the knowledge base changed since they were cached."""
+        with self._lock:
+            changed = self.kb_version is not None and kb_version != self.kb_version
+            self.kb_version = kb_version
+        if changed:
+            self.clear()
+
+    def clear(self):
+        """Drop every entry (e.g. after re-ingesting the knowledge base)."""
+        with self._lock:
+            self._entries.clear()
+            self._matrices.clear()
+            self._stats["invalidations"] += 1
+
+    def save(self, path: str):
+        """Write live entries to ``path`` (.npz) atomically."""
+        with self._lock:
+            entries = [entry for entry in self._entries.values() if not self._expired(entry[4])]
+            kb_version = self.kb_version
+
+        meta = {
+            "kb_version": kb_version,
+            "entries": [
+                {"language": language, "query": query, "answer": answer, "created_at": created_at}
+                for language, _, query, answer, created_at, _ in entries
+            ]
+        }
+        vectors = np.stack([entry[1] for entry in entries]) if entries else np.empty((0, 0), np.float32)
+
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, vectors=vectors, meta=np.array(json.dumps(meta, ensure_ascii=False)))
+        os.replace(tmp_path, path)
+
+    def load(self, path: str) -> int:
+        """
+        Load entries saved by ``save``; skipped if the knowledge base version differs.
+
+        Returns:
+            Number of entries loaded.
+        """
+        if not os.path.exists(path):
+            return 0
+
+        with np.load(path, allow_pickle=False) as data:
+            vectors = data["vectors"]
+            meta = json.loads(str(data["meta"]))
+
+        if self.kb_version is not None and meta["kb_version"] != self.kb_version:
+            return 0
+
+        loaded = 0
+        for item, vector in zip(meta["entries"], vectors):
+            if self._expired(item["created_at"]):
+                continue
+            terms = self._terms(item["query"])
+            with self._lock:
+                self._entries[self._next_id] = (
+                    item["language"], vector.astype(np.float32), item["query"], item["answer"], item["created_at"],
+                    terms
+                )
+                self._next_id += 1
+                self._matrices.pop(item["language"], None)
+            loaded += 1
+
+        with self._lock:
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+        return loaded
+
+    def get_stats(self) -> Dict:
+        """Return counters, hit rate and the distribution of best-match similarities."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            histogram = list(self._histogram)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        stats["threshold"] = self.threshold
+
+        lower = -1.0
+        stats["similarity_histogram"] = {}
+        for edge, count in zip(self.SIMILARITY_BUCKETS, histogram):
+            stats["similarity_histogram"][f"{lower:g}-{edge:g}"] = count
+            lower = edge
+        return stats
@@ -0,0 +1,332 @@
+"""
+Memory-mapped IVF vector index for the RAG knowledge base.
+
+Exports a ChromaDB collection once into a compact directory:
+    manifest.json        metric, dtype, sizes, source fingerprint
+    vectors.npy          float16 or int8 embeddings, rows grouped by IVF list
+    scales.npy / norms.npy   int8 scales and exact squared norms (float32)
+    centroids.npy        IVF centroids (float32)
+    list_offsets.npy     row range of each IVF list
+    ids.json             chunk ids in row order
+    documents.bin / documents_offsets.npy   UTF-8 texts
+    metadatas.bin / metadatas_offsets.npy   JSON metadata
+
+Everything is opened with mmap, so forked or separate worker processes share
+the same page-cache pages. ``MmapVectorIndex.query`` returns the same structure
+as ``chromadb.Collection.query`` and can replace it in ``RAGBackend``.
+
+Usage:
+    python vector_index.py export --persist-dir ./full_database --out ./full_database_mmap
+    python vector_index.py export --dtype float16 --lists 64
+"""
+
+import argparse
+import json
+import mmap
+import os
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+DTYPES = ("int8", "float16")
+METRICS = ("cosine", "l2", "ip")
+
+
+def _kmeans(vectors: np.ndarray, n_lists: int, iterations: int = 20, seed: int = 0) -> np.ndarray:
+    """Plain Lloyd k-means on float32 rows; returns (n_lists, dim) centroids."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        # argmin ||x - c||^2 == argmax (x.c - ||c||^2 / 2)
+        assignment = np.argmax(vectors @ centroids.T - 0.5 * (centroids ** 2).sum(axis=1), axis=1)
+        for j in range(n_lists):
+            members = vectors[assignment == j]
+            # Re-seed empty lists from a random point
+            centroids[j] = members.mean(axis=0) if len(members) else vectors[rng.integers(len(vectors))]
+    return centroids
+
+
+def _write_blob(path: Path, items: List[str]):
+    """Concatenate UTF-8 strings and write their byte offsets next to them."""
+    offsets = np.zeros(len(items) + 1, dtype=np.int64)
+    with open(path.with_suffix(".bin"), "wb") as f:
+        for i, item in enumerate(items):
+            data = item.encode("utf-8")
+            f.write(data)
+            offsets[i + 1] = offsets[i] + len(data)
+    np.save(path.parent / f"{path.name}_offsets.npy", offsets)
+
+
+def build_index(
+    out_dir: str,
+    ids: List[str],
+    embeddings: np.ndarray,
+    documents: List[str],
+    metadatas: List[Optional[Dict]],
+    metric: str = "cosine",
+    dtype: str = "int8",
+    n_lists: Optional[int] = None,
+    source: Optional[str] = None
+) -> Path:
+    """
+    Write an index directory from in-memory vectors and texts.
+
+    Args:
+        out_dir: Destination directory (created if missing).
+        ids, embeddings, documents, metadatas: One entry per chunk.
+        metric: Distance of the source collection ('cosine', 'l2' or 'ip').
+        dtype: Stored vector precision ('int8' or 'float16').
+        n_lists: IVF lists (default ~sqrt(N); 1 = exact search only).
+        source: Fingerprint of the source collection, kept in the manifest.
+
+    Returns:
+        The index directory.
+    """
+    if metric not in METRICS or dtype not in DTYPES:
+        raise ValueError(f"metric must be one of {METRICS} and dtype one of {DTYPES}")
+
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    if metric == "cosine":
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+    n_lists = n_lists or max(1, int(np.sqrt(len(vectors))))
+    n_lists = min(n_lists, len(vectors))
+    centroids = _kmeans(vectors, n_lists) if n_lists > 1 else vectors.mean(axis=0, keepdims=True)
+    assignment = (
+        np.argmax(vectors @ centroids.T - 0.5 * (centroids ** 2).sum(axis=1), axis=1)
+        if n_lists > 1 else np.zeros(len(vectors), dtype=np.int64)
+    )
+
+    # Group rows by list so each list is one contiguous slice of the mapped file
+    order = np.argsort(assignment, kind="stable")
+    vectors = vectors[order]
+    list_offsets = np.zeros(n_lists + 1, dtype=np.int64)
+    list_offsets[1:] = np.cumsum(np.bincount(assignment, minlength=n_lists))
+
+    if dtype == "int8":
+        scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127.0
+        codes = np.round(vectors / scales[:, None]).astype(np.int8)
+        np.save(out / "scales.npy", scales.astype(np.float32))
+    else:
+        codes = vectors.astype(np.float16)
+    np.save(out / "vectors.npy", codes)
+    np.save(out / "norms.npy", (vectors ** 2).sum(axis=1).astype(np.float32))
+    np.save(out / "centroids.npy", centroids.astype(np.float32))
+    np.save(out / "list_offsets.npy", list_offsets)
+
+    with open(out / "ids.json", "w", encoding="utf-8") as f:
+        json.dump([ids[i] for i in order], f)
+    _write_blob(out / "documents", [documents[i] or "" for i in order])
+    _write_blob(out / "metadatas", [json.dumps(metadatas[i] or {}, ensure_ascii=False) for i in order])
+
+    manifest = {
+        "count": len(vectors), "dim": int(vectors.shape[1]), "metric": metric, "dtype": dtype,
+        "n_lists": n_lists, "source": source, "created_at": time.time()
+    }
+    with open(out / "manifest.json", "w") as f:
+        json.dump(manifest, f, indent=2)
+    return out
+
+
+def export_collection(
+    collection,
+    out_dir: str,
+    dtype: str = "int8",
+    n_lists: Optional[int] = None,
+    page_size: int = 1000,
+    source: Optional[str] = None
+) -> Path:
+    """Page through a ChromaDB collection and write it with ``build_index``."""
+    ids, embeddings, documents, metadatas = [], [], [], []
+    total = collection.count()
+    for offset in range(0, total, page_size):
+        page = collection.get(
+            include=["embeddings", "documents", "metadatas"], limit=page_size, offset=offset
+        )
+        ids.extend(page["ids"])
+        embeddings.extend(page["embeddings"])
+        documents.extend(page["documents"])
+        metadatas.extend(page["metadatas"])
+        print(f"  read {len(ids)}/{total} chunks", end="\r")
+    print()
+
+    metric = (collection.metadata or {}).get("hnsw:space", "l2")
+    return build_index(out_dir, ids, np.asarray(embeddings), documents, metadatas, metric, dtype, n_lists, source)
+
+
+class _Blob:
+    """Read-only mmap of a UTF-8 blob plus its offsets array."""
+
+    def __init__(self, path: Path):
+        self.offsets = np.load(path.parent / f"{path.name}_offsets.npy", mmap_mode="r")
+        with open(path.with_suffix(".bin"), "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def __getitem__(self, i: int) -> str:
+        return self._data[int(self.offsets[i]):int(self.offsets[i + 1])].decode("utf-8")
+
+
+class MmapVectorIndex:
+    """Collection-compatible reader over an exported index directory."""
+
+    DEFAULT_NPROBE = 8
+
+    def __init__(self, index_dir: str, nprobe: int = DEFAULT_NPROBE):
+        """
+        Open an index written by ``build_index`` / ``export_collection``.
+
+        Args:
+            index_dir: Index directory.
+            nprobe: IVF lists scanned per query (higher = better recall, slower).
+        """
+        self.index_dir = Path(index_dir)
+        manifest_path = self.index_dir / "manifest.json"
+        if not manifest_path.exists():
+            raise FileNotFoundError(
+                f"No vector index at {index_dir}. Run 'python vector_index.py export' first."
+            )
+        with open(manifest_path) as f:
+            self.manifest = json.load(f)
+
+        self.metric = self.manifest["metric"]
+        self.nprobe = nprobe
+        self.vectors = np.load(self.index_dir / "vectors.npy", mmap_mode="r")
+        self.norms = np.load(self.index_dir / "norms.npy", mmap_mode="r")
+        self.scales = (
+            np.load(self.index_dir / "scales.npy", mmap_mode="r") if self.manifest["dtype"] == "int8" else None
+        )
+        self.centroids = np.load(self.index_dir / "centroids.npy")
+        # Lists were assigned by L2 for every metric, so probes use it too
+        self._centroid_half_norms = 0.5 * (self.centroids ** 2).sum(axis=1)
+        self.list_offsets = np.load(self.index_dir / "list_offsets.npy")
+        with open(self.index_dir / "ids.json", encoding="utf-8") as f:
+            self.ids = json.load(f)
+        self.documents = _Blob(self.index_dir / "documents")
+        self.metadatas = _Blob(self.index_dir / "metadatas")
+        self._row_of: Optional[Dict[str, int]] = None
+
+    def count(self) -> int:
+        return self.manifest["count"]
+
+    def get(
+        self,
+        ids: Optional[List[str]] = None,
+        include: Optional[List[str]] = None,
+        limit: Optional[int] = None,
+        offset: int = 0
+    ) -> Dict:
+        """Chunks by id, or a page of all chunks, shaped like ``Collection.get``."""
+        if ids is not None:
+            if self._row_of is None:
+                self._row_of = {chunk_id: row for row, chunk_id in enumerate(self.ids)}
+            rows = [self._row_of[chunk_id] for chunk_id in ids if chunk_id in self._row_of]
+        else:
+            end = self.count() if limit is None else min(self.count(), offset + limit)
+            rows = range(offset, end)
+
+        include = include or ["documents", "metadatas"]
+        return {
+            "ids": [self.ids[row] for row in rows],
+            "documents": [self.documents[row] for row in rows] if "documents" in include else None,
+            "metadatas": [json.loads(self.metadatas[row]) for row in rows] if "metadatas" in include else None,
+            "embeddings": self._embeddings(list(rows)) if "embeddings" in include else None,
+        }
+
+    def _embeddings(self, rows: List[int]) -> np.ndarray:
+        """Dequantized stored vectors (unit-normalized for the 'cosine' metric)."""
+        vectors = self.vectors[rows].astype(np.float32)
+        if self.scales is not None:
+            vectors *= np.asarray(self.scales[rows], dtype=np.float32)[:, None]
+        return vectors
+
+    def _scan(self, query: np.ndarray, start: int, end: int) -> np.ndarray:
+        """Distances from ``query`` to rows [start, end)."""
+        dots = self.vectors[start:end].astype(np.float32) @ query
+        if self.scales is not None:
+            dots *= self.scales[start:end]
+        if self.metric == "l2":
+            return self.norms[start:end] - 2.0 * dots + float(query @ query)
+        return 1.0 - dots
+
+    def _probe(self, query: np.ndarray) -> List[int]:
+        n_lists = len(self.centroids)
+        if self.nprobe >= n_lists:
+            return list(range(n_lists))
+        # Same criterion as the list assignment in build_index: argmin ||q - c||^2.
+        # Ranking by q.c alone would favour long (tight-cluster) centroids for cosine/ip.
+        scores = self.centroids @ query - self._centroid_half_norms
+        return np.argpartition(-scores, self.nprobe)[:self.nprobe].tolist()
+
+    def query(self, query_embeddings, n_results: int = 5, include: Optional[List[str]] = None) -> Dict:
+        """
+        Nearest chunks for each query embedding, shaped like ``Collection.query``.
+
+        Returns:
+            Dict with 'ids', 'documents', 'metadatas' and 'distances' (one list per query),
+            plus 'embeddings' when requested in ``include``.
+        """
+        queries = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        if self.metric == "cosine":
+            queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+
+        with_embeddings = include is not None and "embeddings" in include
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": [],
+                   "embeddings": [] if with_embeddings else None}
+        for query in queries:
+            rows, distances = [], []
+            for j in self._probe(query):
+                start, end = int(self.list_offsets[j]), int(self.list_offsets[j + 1])
+                if end > start:
+                    rows.append(np.arange(start, end))
+                    distances.append(self._scan(query, start, end))
+            rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+            distances = np.concatenate(distances) if distances else np.empty(0, dtype=np.float32)
+
+            k = min(n_results, len(rows))
+            top = np.argpartition(distances, k - 1)[:k] if k else np.empty(0, dtype=np.int64)
+            top = top[np.argsort(distances[top])]
+            results["ids"].append([self.ids[rows[i]] for i in top])
+            results["documents"].append([self.documents[rows[i]] for i in top])
+            results["metadatas"].append([json.loads(self.metadatas[rows[i]]) for i in top])
+            results["distances"].append([float(distances[i]) for i in top])
+            if with_embeddings:
+                results["embeddings"].append(self._embeddings([int(rows[i]) for i in top]))
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    export_cmd = sub.add_parser("export", help="Export a ChromaDB collection")
+    export_cmd.add_argument("--persist-dir", default=str(Path(__file__).parent / "full_database"))
+    export_cmd.add_argument("--collection", default="improved_drug_research")
+    export_cmd.add_argument("--out", default=str(Path(__file__).parent / "full_database_mmap"))
+    export_cmd.add_argument("--dtype", choices=DTYPES, default="int8")
+    export_cmd.add_argument("--lists", type=int, help="IVF lists (default ~sqrt(N))")
+    args = parser.parse_args()
+
+    import chromadb
+    from chromadb.config import Settings
+
+    client = chromadb.PersistentClient(path=args.persist_dir, settings=Settings(anonymized_telemetry=False))
+    collection = client.get_collection(name=args.collection)
+
+    start = time.perf_counter()
+    print(f"Exporting '{args.collection}' ({collection.count()} chunks)...")
+    out = export_collection(
+        collection, args.out, dtype=args.dtype, n_lists=args.lists,
+        source=f"{args.collection}:{collection.count()}"
+    )
+    size_mb = sum(p.stat().st_size for p in out.iterdir()) / (1024 * 1024)
+    print(f"✓ Index written to {out} ({size_mb:.1f} MiB) in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()